@@ -0,0 +1,127 @@
+'''
+Helpers shared by the benchmarks.
+
+The benchmarks don't need a display - they use the headless backend, with a screen surface in the
+same pixel format as a real display.
+'''
+import os, sys, time
+
+os.environ.setdefault('TB_DISPLAY', 'headless')
+
+import pygame
+from tingbot import graphics
+from tingbot.platform_specific import headless
+
+
+def setup_display(depth=32):
+    '''
+    Sets up an offscreen display with a bit depth of `depth` and uses it as the tingbot screen.
+    Pass 16 to match the Tingbot's LCD.
+    '''
+    graphics.screen.surface = headless.create_main_surface(depth)
+    return graphics.screen
+
+
+def time_per_call(func, min_time=0.2):
+    '''
+    Calls `func` repeatedly for at least `min_time` seconds, and returns the average time per call,
+    in seconds.
+    '''
+    # warm up, so one-off costs (e.g. caches) aren't counted
+    func()
+
+    calls = 0
+    start_time = time.time()
+    end_time = start_time
+
+    while end_time - start_time < min_time:
+        func()
+        calls += 1
+        end_time = time.time()
+
+    return (end_time - start_time) / calls
+
+
+def compare_time_per_call(funcs, repeats=7, min_time=0.2):
+    '''
+    Times each function in `funcs` with time_per_call, `repeats` times over, taking turns so a
+    change in the machine's speed (e.g. CPU frequency scaling) affects them all alike. Each is
+    warmed up first. Returns a list of the (median, fastest, slowest) times per call of each
+    function, in seconds.
+    '''
+    for func in funcs:
+        time_per_call(func, min_time=min_time)
+
+    times = [[] for func in funcs]
+
+    for repeat in range(repeats):
+        for func, func_times in zip(funcs, times):
+            func_times.append(time_per_call(func, min_time=min_time))
+
+    return [(sorted(t)[len(t) // 2], min(t), max(t)) for t in times]
+
+
+class count_surface_allocations(object):
+    '''
+    A context manager that counts the pygame Surfaces created with pygame.Surface(...), or by the
+    functions in pygame.transform and pygame.image, while it's active. The count is in the `count`
+    attribute.
+
+    Surfaces made by the methods of other objects (e.g. Surface.copy() or Font.render()) aren't
+    counted.
+    '''
+    counted_functions = (
+        (pygame.transform, ('scale', 'smoothscale', 'rotate', 'rotozoom', 'flip')),
+        (pygame.image, ('load', 'fromstring', 'frombuffer')),
+    )
+
+    def __enter__(self):
+        self.count = 0
+        self.original_surface_class = pygame.Surface
+        self.original_functions = []
+        counter = self
+
+        class CountingSurface(pygame.Surface):
+            def __init__(self, *args, **kwargs):
+                counter.count += 1
+                super(CountingSurface, self).__init__(*args, **kwargs)
+
+        def counting(function):
+            def wrapper(*args, **kwargs):
+                counter.count += 1
+                return function(*args, **kwargs)
+            return wrapper
+
+        pygame.Surface = CountingSurface
+
+        for module, names in self.counted_functions:
+            for name in names:
+                function = getattr(module, name)
+                self.original_functions.append((module, name, function))
+                setattr(module, name, counting(function))
+
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        pygame.Surface = self.original_surface_class
+
+        for module, name, function in self.original_functions:
+            setattr(module, name, function)
+
+
+def print_results(title, rows):
+    '''
+    Prints `rows`, a list of (name, seconds per call) tuples, with the speedup of each row compared
+    to the first.
+    '''
+    print title
+    print '-' * len(title)
+
+    baseline = rows[0][1]
+
+    for name, seconds in rows:
+        print '%-40s %10.1f us %8.0f ops/s %6.2fx' % (
+            name, seconds * 1e6, 1 / seconds, baseline / seconds)
+
+    print
+    sys.stdout.flush()
@@ -0,0 +1,52 @@
+'''
+Measures the latency of a screen update through the mmap framebuffer backend, for a whole screen
+and for a small changed area, against pygame.display.update().
+
+By default the framebuffer is a temporary file and SDL uses its dummy driver, whose update does
+nothing. On a Tingbot, compare against the real SDL path with:
+
+    SDL_VIDEODRIVER=fbcon SDL_FBDEV=/dev/fb1 python -m benchmarks.framebuffer_update --path /dev/fb1
+'''
+import argparse, os, tempfile
+
+from .common import setup_display, time_per_call, print_results
+import pygame
+from tingbot.platform_specific.framebuffer import Framebuffer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--path', help='the framebuffer device, defaults to a temporary file')
+    args = parser.parse_args()
+
+    if args.path:
+        path = args.path
+    else:
+        handle, path = tempfile.mkstemp()
+        os.write(handle, b'\0' * 320 * 240 * 2)
+        os.close(handle)
+
+    try:
+        framebuffer = Framebuffer(path)
+        small_rect = pygame.Rect(0, 0, 40, 20)
+
+        for depth in (16, 32):
+            screen = setup_display(depth=depth)
+            surface = screen.surface
+
+            print_results('Updating a %i-bit screen' % depth, [
+                ('SDL, whole screen', time_per_call(lambda: pygame.display.update())),
+                ('SDL, 40x20 area', time_per_call(lambda: pygame.display.update([small_rect]))),
+                ('framebuffer, whole screen', time_per_call(lambda: framebuffer.update(surface))),
+                ('framebuffer, 40x20 area',
+                    time_per_call(lambda: framebuffer.update(surface, [small_rect]))),
+            ])
+
+        framebuffer.close()
+    finally:
+        if not args.path:
+            os.remove(path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+'''
+Compares the time to draw images in the format they're loaded in, against images converted to the
+screen's pixel format.
+
+    python -m benchmarks.image_formats [--depth 16]
+'''
+import argparse
+
+from .common import setup_display, time_per_call, print_results
+import pygame
+from PIL import Image as PILImage
+from tingbot import graphics
+
+
+def make_photo(size):
+    ''' An opaque RGB image, like a decoded JPEG '''
+    pil_image = PILImage.radial_gradient('L').resize(size).convert('RGB')
+    return pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
+
+
+def make_gif_frame(size):
+    ''' A palettized frame with a colorkey, like a frame of a GIF '''
+    pil_image = PILImage.radial_gradient('L').resize(size).quantize(64)
+    surface = pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
+    palette = pil_image.getpalette()
+    surface.set_palette([palette[i:i+3] for i in range(0, len(palette), 3)])
+    surface.set_colorkey(0)
+    return surface
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=32)
+    args = parser.parse_args()
+
+    screen = setup_display(depth=args.depth)
+
+    for name, make_surface in (('photo', make_photo), ('GIF frame', make_gif_frame)):
+        for size in ((64, 64), (320, 240)):
+            loaded = make_surface(size)
+            converted = graphics._convert_to_display_format(loaded)
+
+            print_results('Drawing a %ix%i %s to a %i-bit screen' % (size + (name, args.depth)), [
+                ('as loaded (%i-bit)' % loaded.get_bitsize(),
+                    time_per_call(lambda: screen.surface.blit(loaded, (0, 0)))),
+                ('display format (%i-bit)' % converted.get_bitsize(),
+                    time_per_call(lambda: screen.surface.blit(converted, (0, 0)))),
+            ])
+
+
+if __name__ == '__main__':
+    main()
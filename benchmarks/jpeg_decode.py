@@ -0,0 +1,89 @@
+'''
+Compares loading a large camera-sized JPEG at full resolution against loading it with fit_to,
+which decodes it at a reduced size. Reports the decode time and the peak memory of a process that
+does nothing but load the image.
+
+    python -m benchmarks.jpeg_decode [--size 3264x2448]
+'''
+import argparse, os, resource, subprocess, sys, tempfile
+
+from .common import setup_display, time_per_call, print_results
+from PIL import Image as PILImage
+from tingbot import graphics
+
+
+def make_jpeg(filename, size):
+    ''' A noisy image, so the JPEG takes a realistic amount of work to decode '''
+    noise = PILImage.effect_noise((size[0] // 8, size[1] // 8), 64).resize(size)
+    gradient = PILImage.radial_gradient('L').resize(size)
+    PILImage.merge('RGB', (noise, gradient, noise)).save(filename, quality=90)
+
+
+def load(filename, fit_to):
+    if fit_to is None:
+        # the loader a large JPEG would use without fit_to
+        return graphics.Image.load(filename)
+    else:
+        return graphics.Image.load(filename, fit_to=fit_to)
+
+
+def peak_memory(filename, fit_to):
+    '''
+    Loads the image in a new process, and returns the peak resident memory of that process in
+    bytes.
+    '''
+    output = subprocess.check_output([
+        sys.executable, '-m', 'benchmarks.jpeg_decode', '--child', filename,
+        '--fit-to', 'none' if fit_to is None else '%ix%i' % fit_to])
+    return int(output.split()[-1])
+
+
+def parse_size(string):
+    if string == 'none':
+        return None
+    return tuple(int(n) for n in string.split('x'))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--size', type=parse_size, default=(3264, 2448))
+    parser.add_argument('--child', metavar='FILENAME')
+    parser.add_argument('--fit-to', type=parse_size)
+    args = parser.parse_args()
+
+    setup_display()
+
+    if args.child:
+        if args.child != 'none':
+            load(args.child, args.fit_to)
+        # ru_maxrss is in kilobytes on Linux
+        print resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        return
+
+    handle, filename = tempfile.mkstemp(suffix='.jpg')
+    os.close(handle)
+
+    try:
+        make_jpeg(filename, args.size)
+
+        rows = []
+        memory = []
+
+        for name, fit_to in (('full resolution', None), ('fit_to=(320, 240)', (320, 240))):
+            image = load(filename, fit_to)
+            rows.append(('%s -> %ix%i' % ((name,) + image.size),
+                         time_per_call(lambda: load(filename, fit_to), min_time=1)))
+            memory.append((name, peak_memory(filename, fit_to)))
+
+        print_results('Loading a %ix%i JPEG' % args.size, rows)
+
+        print 'Peak memory of a process loading the JPEG'
+        memory.insert(0, ('(not loading anything)', peak_memory('none', None)))
+        for name, peak in memory:
+            print '%-40s %10.1f MB' % (name, peak / 1e6)
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
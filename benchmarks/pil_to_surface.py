@@ -0,0 +1,45 @@
+'''
+Compares converting PIL images to screen surfaces by copying the pixels with fromstring (the old
+method) against graphics._surface_from_pil_image, which reads them in place with frombuffer, or
+has PIL write them in the screen's format.
+
+    python -m benchmarks.pil_to_surface [--depth 16]
+'''
+import argparse
+
+from .common import setup_display, time_per_call, print_results
+import pygame
+from PIL import Image as PILImage
+from tingbot import graphics
+
+
+def fromstring_surface(pil_image):
+    ''' The old method, which copies the pixels twice before the conversion '''
+    if pil_image.mode not in ('RGB', 'RGBA'):
+        pil_image = pil_image.convert('RGB')
+
+    surface = pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
+    return graphics._convert_to_display_format(surface)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=32)
+    args = parser.parse_args()
+
+    setup_display(depth=args.depth)
+
+    for mode in ('RGB', 'L'):
+        for size in ((320, 240), (1632, 1224)):
+            pil_image = PILImage.radial_gradient('L').resize(size).convert(mode)
+
+            print_results('Converting a %ix%i %s image to a %i-bit surface' % (
+                size + (mode, args.depth)), [
+                ('fromstring', time_per_call(lambda: fromstring_surface(pil_image))),
+                ('_surface_from_pil_image',
+                    time_per_call(lambda: graphics._surface_from_pil_image(pil_image))),
+            ])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+'''
+Times each of the drawing primitives at a few representative sizes, on a headless screen.
+
+    python -m benchmarks [--depth 16] [--output results.json] [--baseline baseline.json]
+
+Results are printed as microseconds per call, calls per second, and pygame Surfaces allocated per
+call. With --output, they're saved as JSON, which can be passed as --baseline to a later run to
+see what changed. A case is marked as a regression when it's more than --tolerance slower than
+the baseline, and then the exit status is 1.
+'''
+import argparse, io, itertools, json, platform, sys, time
+
+from .common import setup_display, time_per_call, count_surface_allocations
+import pygame
+from tingbot import graphics
+
+
+def make_gif(frame_count, size):
+    ''' An animated GIF, as a GIFImage '''
+    from PIL import Image as PILImage
+
+    frames = [PILImage.radial_gradient('L').resize(size).point(lambda v, i=i: (v + i * 16) % 256)
+              for i in range(frame_count)]
+
+    gif_file = io.BytesIO()
+    frames[0].save(gif_file, 'GIF', save_all=True, append_images=frames[1:], duration=100,
+                   loop=0)
+    gif_file.seek(0)
+
+    gif = graphics.GIFImage(gif_file)
+    # move the animation on one frame every time it's drawn
+    frame_times = itertools.count(0, 0.1)
+    gif.clock = lambda: next(frame_times)
+    return gif
+
+
+def make_photo(size):
+    from PIL import Image as PILImage
+    return graphics.Image.from_pil_image(PILImage.radial_gradient('L').resize(size).convert('RGB'))
+
+
+def make_cases(screen):
+    '''
+    Returns a list of (name, func) tuples, where func draws something once.
+    '''
+    cases = []
+    translucent = (255, 0, 0, 128)
+    paragraph = ' '.join(['The quick brown fox jumps over the lazy dog.'] * 6)
+
+    cases.append(('fill opaque', lambda: screen.fill(color='black')))
+    cases.append(('fill translucent', lambda: screen.fill(color=translucent)))
+
+    for size in ((20, 20), (100, 100), (320, 240)):
+        for color_name, color in (('opaque', 'red'), ('translucent', translucent)):
+            for shape in ('rectangle', 'oval'):
+                draw = getattr(screen, shape)
+                cases.append((
+                    '%s %s %ix%i' % (shape, color_name, size[0], size[1]),
+                    lambda draw=draw, size=size, color=color: draw(size=size, color=color)))
+
+    cases.append(('line 1px', lambda: screen.line((0, 0), (320, 240))))
+    cases.append(('line 5px', lambda: screen.line((0, 0), (320, 240), width=5)))
+
+    cases.append(('text short', lambda: screen.text('12:34', color='white')))
+    cases.append(('text short uncached',
+                  lambda: screen.text('12:34', color='white', cache=False)))
+    clock_times = itertools.cycle('%02i:%02i' % (m, s) for m in range(60) for s in range(60))
+    cases.append(('text changing glyphs',
+                  lambda: screen.text(next(clock_times), color='white', cache='glyphs')))
+    cases.append(('text paragraph', lambda: screen.text(paragraph, font_size=14,
+                                                        max_width=300)))
+    cases.append(('text paragraph uncached',
+                  lambda: screen.text(paragraph, font_size=14, max_width=300, cache=False)))
+    rich_paragraph = [paragraph[:100], (paragraph[100:150], {'color': 'red', 'font_size': 20}),
+                      paragraph[150:]]
+    cases.append(('rich text paragraph uncached',
+                  lambda: screen.rich_text(rich_paragraph, font_size=14, max_width=300,
+                                           cache=False)))
+
+    console = graphics.Console(size=(320, 240))
+    log_lines = itertools.cycle('%i: GET /api/status 200 OK (%i ms)' % (i, i % 97)
+                                for i in range(1000))
+    cases.append(('console write line', lambda: console.writeline(next(log_lines))))
+
+    for size in ((64, 64), (320, 240)):
+        photo = make_photo(size)
+        cases.append(('image %ix%i' % size, lambda photo=photo: screen.image(photo)))
+        cases.append(('image %ix%i scaled 0.5' % size,
+                      lambda photo=photo: screen.image(photo, scale=0.5)))
+        cases.append(('image %ix%i alpha 0.5' % size,
+                      lambda photo=photo: screen.image(photo, alpha=0.5)))
+
+    cases.append(('image file scaled 2 (cached)',
+                  lambda: screen.image(graphics.broken_image_file, scale=2)))
+
+    for size in ((64, 64), (320, 240)):
+        gif = make_gif(8, size)
+        cases.append(('GIF %ix%i playback' % size, lambda gif=gif: screen.image(gif)))
+
+    import numpy
+    xy = numpy.random.RandomState(0).randint(0, 240, size=(1000, 2))
+    cases.append(('points 1000', lambda: screen.points(xy, color='white')))
+    cases.append(('polyline 1000', lambda: screen.polyline(xy, color='white')))
+
+    with screen.record() as background:
+        background.fill(color='black')
+        background.rectangle(size=(300, 40), color='blue')
+        background.text('Weather', xy=(160, 20), color='white')
+    cases.append(('display list draw', background.draw))
+
+    def update_small():
+        screen.rectangle(xy=(10, 10), size=(20, 20), color='red')
+        screen.update()
+
+    def update_full():
+        screen.fill(color='black')
+        screen.update()
+
+    cases.append(('update after 20x20 change', update_small))
+    cases.append(('update after full fill', update_full))
+
+    return cases
+
+
+def run_cases(cases, min_time, allocation_calls=100):
+    results = {}
+
+    for name, func in cases:
+        seconds = time_per_call(func, min_time=min_time)
+
+        with count_surface_allocations() as allocations:
+            for i in range(allocation_calls):
+                func()
+
+        results[name] = {
+            'seconds_per_call': seconds,
+            'ops_per_second': 1 / seconds,
+            'allocations_per_call': allocations.count / float(allocation_calls),
+        }
+
+        print_result(name, results[name])
+
+    return results
+
+
+def print_result(name, result, baseline=None, tolerance=None):
+    line = '%-36s %10.1f us %9.0f ops/s %6.2f allocs' % (
+        name, result['seconds_per_call'] * 1e6, result['ops_per_second'],
+        result['allocations_per_call'])
+
+    if baseline is not None:
+        change = result['seconds_per_call'] / baseline['seconds_per_call'] - 1
+        line += ' %+7.1f%%' % (change * 100)
+
+        if change > tolerance:
+            line += '  REGRESSION'
+
+    print line
+    sys.stdout.flush()
+
+
+def compare(results, baseline, tolerance):
+    '''
+    Prints the results next to the baseline's, and returns the names of the cases that are more
+    than `tolerance` (a fraction) slower.
+    '''
+    title = 'Compared with baseline (%s)' % baseline['meta']['date']
+    print title
+    print '-' * len(title)
+
+    regressions = []
+
+    for name, result in sorted(results.items()):
+        base_result = baseline['results'].get(name)
+
+        if base_result is None:
+            print_result(name, result)
+            continue
+
+        print_result(name, result, base_result, tolerance)
+
+        if result['seconds_per_call'] / base_result['seconds_per_call'] - 1 > tolerance:
+            regressions.append(name)
+
+    print
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--depth', type=int, default=32)
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='seconds to spend timing each case')
+    parser.add_argument('--filter', default='', help='only run cases containing this text')
+    parser.add_argument('--output', help='save the results to this JSON file')
+    parser.add_argument('--baseline', help='compare with results saved by --output')
+    parser.add_argument('--tolerance', type=float, default=0.1,
+                        help='fraction slower than the baseline that counts as a regression')
+    args = parser.parse_args()
+
+    screen = setup_display(depth=args.depth)
+
+    cases = [(name, func) for name, func in make_cases(screen) if args.filter in name]
+
+    title = 'Drawing to a %i-bit screen' % args.depth
+    print title
+    print '-' * len(title)
+    results = run_cases(cases, args.min_time)
+    print
+
+    data = {
+        'meta': {
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'depth': args.depth,
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'machine': platform.machine(),
+        },
+        'results': results,
+    }
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+        if baseline['meta']['depth'] != args.depth:
+            print 'Warning: the baseline was measured on a %i-bit screen' % baseline['meta']['depth']
+
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
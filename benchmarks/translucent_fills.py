@@ -0,0 +1,75 @@
+'''
+Compares drawing translucent rectangles and ovals with a new surface allocated for each call (the
+old method) against drawing them with the shared scratch surface.
+
+Each is timed in steady state - warmed up, then timed several times, taking turns - and the median
+is shown, with the range of the repeats. The difference in time per call is small, and can be
+within the noise of the machine, so compare the ranges before reading anything into it. The
+reliable difference is in the allocations.
+
+    python -m benchmarks.translucent_fills [--repeats 7]
+'''
+import argparse
+
+from .common import (setup_display, compare_time_per_call, count_surface_allocations,
+                     print_results)
+import pygame
+from tingbot import graphics
+
+
+class AllocatingScratchSurface(object):
+    ''' Has the same interface as graphics.ScratchSurface, but allocates a surface every call '''
+    def filled(self, size, color):
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        surface.fill(color)
+        return surface
+
+    def with_oval(self, size, oval_rect, color):
+        surface = pygame.Surface(size, pygame.SRCALPHA)
+        pygame.draw.ellipse(surface, color, oval_rect, 0)
+        return surface
+
+
+def with_scratch_surface(scratch_surface, func):
+    def wrapper():
+        graphics.scratch_surface = scratch_surface
+        func()
+    return wrapper
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeats', type=int, default=7)
+    args = parser.parse_args()
+
+    screen = setup_display()
+    color = (255, 0, 0, 128)
+    calls = 1000
+    scratch_surfaces = (('new surfaces', AllocatingScratchSurface()),
+                        ('scratch surface', graphics.ScratchSurface()))
+
+    for size in ((20, 20), (100, 100), (320, 240)):
+        for shape, draw in (('rectangle', screen.rectangle), ('oval', screen.oval)):
+            draw_shape = lambda: draw(xy=(0, 0), size=size, color=color, align='topleft')
+            names = []
+            funcs = []
+
+            for name, scratch_surface in scratch_surfaces:
+                func = with_scratch_surface(scratch_surface, draw_shape)
+
+                with count_surface_allocations() as allocations:
+                    for i in range(calls):
+                        func()
+
+                names.append('%s, %i allocs' % (name, allocations.count))
+                funcs.append(func)
+
+            times = compare_time_per_call(funcs, repeats=args.repeats)
+            rows = [('%s, %.0f-%.0f us' % (name, fastest * 1e6, slowest * 1e6), median)
+                    for name, (median, fastest, slowest) in zip(names, times)]
+            print_results('Translucent %ix%i %s, %i calls, median of %i' % (
+                size + (shape, calls, args.repeats)), rows)
+
+
+if __name__ == '__main__':
+    main()
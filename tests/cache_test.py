@@ -238,3 +238,160 @@ class TestImageCache(TimeControlCase):
         time.time.tm=1400
         b = c.get_image("http://example.com/x/1.png")
 
+
+class TestImageCacheAsync(TimeControlCase):
+    def setUp(self):
+        super(TestImageCacheAsync,self).setUp()
+        httpretty.enable()
+        self.image_content = open("tingbot/resources/broken_image.png",'r').read()
+        httpretty.register_uri(httpretty.GET,re.compile("http://example.com/..png"), body=self.image_content, max_age="300")
+        self.cache = cache.ImageCache()
+
+    def tearDown(self):
+        httpretty.disable()
+        super(TestImageCacheAsync,self).tearDown()
+
+    def finish_loading(self):
+        from tingbot.run_loop import RunLoop
+        self.cache.load_queue.join()
+        RunLoop.empty_call_after_queue()
+
+    def test_returns_none_while_loading(self):
+        self.assertIsNone(self.cache.get_image_async("http://example.com/a.png"))
+        self.assertIn("http://example.com/a.png", self.cache.pending)
+        self.finish_loading()
+
+    def test_returns_image_when_loaded(self):
+        self.cache.get_image_async("http://example.com/a.png")
+        self.finish_loading()
+        image = self.cache.get_image_async("http://example.com/a.png")
+        self.assertIsInstance(image, graphics.Image)
+        self.assertEqual(self.cache.pending, set())
+
+    def test_sets_up_display_on_main_thread(self):
+        import threading
+        setup_threads = []
+
+        def ensure_display_setup():
+            setup_threads.append(threading.current_thread())
+
+        with mock.patch.object(graphics.screen, 'ensure_display_setup',
+                               side_effect=ensure_display_setup):
+            self.cache.get_image_async("http://example.com/a.png")
+            self.finish_loading()
+
+        self.assertEqual(setup_threads[0], threading.current_thread())
+
+    def test_loads_once(self):
+        with mock.patch.object(self.cache, 'load_entry', wraps=self.cache.load_entry) as load_entry:
+            self.cache.get_image_async("http://example.com/a.png")
+            self.cache.get_image_async("http://example.com/a.png")
+            self.finish_loading()
+            self.cache.get_image_async("http://example.com/a.png")
+        self.assertEqual(load_entry.call_count, 1)
+
+    def test_failure_is_raised_on_main_thread(self):
+        httpretty.register_uri(httpretty.GET, "http://example.com/missing.png", status=404)
+        self.cache.get_image_async("http://example.com/missing.png")
+        self.finish_loading()
+        with self.assertRaises(IOError):
+            self.cache.get_image_async("http://example.com/missing.png")
+
+    def test_failure_is_retried_later(self):
+        httpretty.register_uri(httpretty.GET, "http://example.com/missing.png", status=404)
+        self.cache.get_image_async("http://example.com/missing.png")
+        self.finish_loading()
+        time.time.tm += self.cache.failure_retry_interval
+        self.assertIsNone(self.cache.get_image_async("http://example.com/missing.png"))
+        self.finish_loading()
+
+    def test_stale_image_is_returned_while_refreshing(self):
+        self.cache.get_image_async("http://example.com/a.png")
+        self.finish_loading()
+        old_image = self.cache.get_image_async("http://example.com/a.png")
+        httpretty.register_uri(httpretty.HEAD,re.compile("http://example.com/..png"), etag="b", max_age="300")
+        time.time.tm += 400
+
+        self.assertIs(self.cache.get_image_async("http://example.com/a.png"), old_image)
+        self.finish_loading()
+        self.assertIsNot(self.cache.get_image_async("http://example.com/a.png"), old_image)
+
+
+class TestFontCache(unittest.TestCase):
+    def setUp(self):
+        self.font_file = 'tingbot/resources/Geneva.ttf'
+
+    def test_returns_same_font(self):
+        c = cache.FontCache()
+        a = c.get_font(self.font_file, 12)
+        b = c.get_font(self.font_file, 12)
+        self.assertIs(a, b)
+        self.assertEqual(c.misses, 1)
+        self.assertEqual(c.hits, 1)
+
+    def test_different_sizes_are_different_fonts(self):
+        c = cache.FontCache()
+        a = c.get_font(self.font_file, 12)
+        b = c.get_font(self.font_file, 13)
+        self.assertIsNot(a, b)
+        self.assertEqual(c.misses, 2)
+
+    def test_removes_least_recently_used_font_when_full(self):
+        c = cache.FontCache(max_fonts=2)
+        c.get_font(self.font_file, 10)
+        c.get_font(self.font_file, 11)
+        c.get_font(self.font_file, 10)
+        c.get_font(self.font_file, 12)
+        self.assertEqual(list(c.fonts), [(self.font_file, 10), (self.font_file, 12)])
+
+class TestLRUCache(unittest.TestCase):
+    def test_creates_missing_items_once(self):
+        c = cache.LRUCache(max_items=2)
+        create = mock.Mock(return_value='a')
+
+        self.assertEqual(c.get('key', create), 'a')
+        self.assertEqual(c.get('key', create), 'a')
+        self.assertEqual(create.call_count, 1)
+        self.assertEqual((c.hits, c.misses), (1, 1))
+
+    def test_removes_least_recently_used_when_full(self):
+        c = cache.LRUCache(max_items=2)
+        for key in ('a', 'b', 'a', 'c'):
+            c.get(key, lambda: key.upper())
+        self.assertEqual(list(c), ['a', 'c'])
+
+    def test_unhashable_key(self):
+        c = cache.LRUCache(max_items=2)
+        with self.assertRaises(TypeError):
+            c.get([], lambda: None)
+        self.assertEqual(len(c), 0)
+
+class TestRenderCache(unittest.TestCase):
+    def make_image(self):
+        import pygame
+        return graphics.Image(surface=pygame.Surface((10, 10)))
+
+    def test_returns_added_image(self):
+        c = cache.RenderCache()
+        image = self.make_image()
+        c.add_image('a', image)
+        self.assertIs(c.get_image('a'), image)
+
+    def test_returns_none_if_missing(self):
+        c = cache.RenderCache()
+        self.assertIsNone(c.get_image('a'))
+
+    def test_removes_least_recently_used_image_when_full(self):
+        image_size = self.make_image().get_memory_usage()
+        c = cache.RenderCache(cache_size=image_size*2)
+        c.add_image('a', self.make_image())
+        c.add_image('b', self.make_image())
+        c.get_image('a')
+        c.add_image('c', self.make_image())
+        self.assertEqual(sorted(c.images), ['a', 'c'])
+        self.assertEqual(c.size, image_size*2)
+
+    def test_keeps_one_massive_image(self):
+        c = cache.RenderCache(cache_size=1)
+        c.add_image('a', self.make_image())
+        self.assertEqual(list(c.images), ['a'])
@@ -0,0 +1,46 @@
+import sys
+import unittest
+import mock
+import pygame
+
+from tingbot import error, graphics
+
+
+class TestErrorScreen(unittest.TestCase):
+    def setUp(self):
+        self.screen = graphics.Screen()
+        self.screen.surface = pygame.Surface((320, 240), 0, 32)
+        self.screen.has_surface = True
+
+        patcher = mock.patch('tingbot.graphics.screen', self.screen)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def raise_error(self):
+        try:
+            raise ValueError('oops')
+        except ValueError:
+            return sys.exc_info()
+
+    @mock.patch('tingbot.platform_specific.update_display')
+    def test_updates_through_platform_backend(self, update_display):
+        error.error_screen(self.raise_error())
+
+        update_display.assert_called_once_with(self.screen.surface, None)
+        self.assertEqual(self.screen.surface.get_at((0, 0)), (0, 0, 0, 255))
+
+    def test_reaches_scaled_simulator_window(self):
+        from tingbot.platform_specific import sdl_wrapper
+
+        simulator = sdl_wrapper.Simulator(scale=2)
+        simulator.window.fill((255, 255, 255))
+        self.screen.surface = simulator.screen
+
+        with mock.patch.object(sdl_wrapper, 'simulator', simulator), \
+                mock.patch('tingbot.platform_specific.update_display',
+                           sdl_wrapper.update_display):
+            error.error_screen(self.raise_error())
+
+        # the top-left of the screen, in the window
+        black = simulator.window.unmap_rgb(simulator.window.map_rgb((0, 0, 0)))
+        self.assertEqual(simulator.window.get_at((172, 108)), black)
@@ -0,0 +1,53 @@
+import unittest
+import tempfile
+import struct
+import pygame
+
+from tingbot.platform_specific.framebuffer import Framebuffer
+
+
+class TestFramebuffer(unittest.TestCase):
+    def setUp(self):
+        self.file = tempfile.NamedTemporaryFile()
+        self.file.write(b'\0' * 320 * 240 * 2)
+        self.file.flush()
+        self.framebuffer = Framebuffer(self.file.name)
+        self.addCleanup(self.file.close)
+        self.addCleanup(self.framebuffer.close)
+
+    def pixel_in_file(self, xy):
+        x, y = xy
+        self.file.seek((y * 320 + x) * 2)
+        return struct.unpack('<H', self.file.read(2))[0]
+
+    def test_converts_32_bit_surface(self):
+        surface = pygame.Surface((320, 240), 0, 32)
+        surface.fill((255, 0, 0), (0, 0, 1, 1))
+        surface.fill((0, 255, 0), (1, 0, 1, 1))
+        surface.fill((0, 0, 255), (0, 1, 1, 1))
+
+        self.framebuffer.update(surface)
+
+        self.assertEqual(self.pixel_in_file((0, 0)), 0xf800)
+        self.assertEqual(self.pixel_in_file((1, 0)), 0x07e0)
+        self.assertEqual(self.pixel_in_file((0, 1)), 0x001f)
+
+    def test_copies_16_bit_surface(self):
+        surface = pygame.Surface((320, 240), 0, 16, (0xf800, 0x07e0, 0x001f, 0))
+        surface.fill((255, 255, 255), (100, 50, 1, 1))
+
+        self.framebuffer.update(surface)
+
+        self.assertEqual(self.pixel_in_file((100, 50)), 0xffff)
+
+    def test_only_writes_rects(self):
+        surface = pygame.Surface((320, 240), 0, 32)
+        surface.fill((255, 255, 255))
+
+        self.framebuffer.update(surface, [pygame.Rect(10, 20, 30, 40)])
+
+        self.assertEqual(self.pixel_in_file((10, 20)), 0xffff)
+        self.assertEqual(self.pixel_in_file((39, 59)), 0xffff)
+        self.assertEqual(self.pixel_in_file((40, 59)), 0)
+        self.assertEqual(self.pixel_in_file((9, 20)), 0)
+        self.assertEqual(self.pixel_in_file((10, 60)), 0)
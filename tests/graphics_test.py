@@ -0,0 +1,990 @@
+from __future__ import division
+import unittest
+import io
+import sys
+import mock
+import pygame
+
+from tingbot import cache, graphics
+from tingbot.graphics import Surface, Screen, Image, GIFImage
+from tingbot.typesetter import Typesetter, FontMetrics
+
+
+class TestScreenDirtyRects(unittest.TestCase):
+    def setUp(self):
+        self.screen = Screen()
+        self.screen.surface = pygame.Surface((320, 240))
+
+    def test_records_drawn_area(self):
+        self.screen.rectangle(xy=(10, 20), size=(30, 40), align='topleft')
+        self.assertEqual(self.screen.dirty_rects, [pygame.Rect(10, 20, 30, 40)])
+        self.assertTrue(self.screen.needs_update)
+
+    def test_merges_overlapping_rects(self):
+        self.screen.rectangle(xy=(10, 10), size=(20, 20), align='topleft')
+        self.screen.rectangle(xy=(100, 100), size=(10, 10), align='topleft')
+        self.screen.rectangle(xy=(20, 20), size=(20, 20), align='topleft')
+
+        self.assertEqual(len(self.screen.dirty_rects), 2)
+        self.assertIn(pygame.Rect(10, 10, 30, 30), self.screen.dirty_rects)
+        self.assertIn(pygame.Rect(100, 100, 10, 10), self.screen.dirty_rects)
+
+    def test_merge_can_join_existing_rects(self):
+        self.screen.rectangle(xy=(0, 0), size=(10, 10), align='topleft')
+        self.screen.rectangle(xy=(50, 0), size=(10, 10), align='topleft')
+        self.screen.line((5, 5), (55, 5))
+
+        self.assertEqual(self.screen.dirty_rects, [pygame.Rect(0, 0, 60, 10)])
+
+    def test_clips_to_screen(self):
+        self.screen.rectangle(xy=(310, 230), size=(30, 30), align='topleft')
+        self.assertEqual(self.screen.dirty_rects, [pygame.Rect(310, 230, 10, 10)])
+
+    @mock.patch('tingbot.platform_specific.update_display')
+    def test_update_only_pushes_dirty_rects(self, update_display):
+        self.screen.circle(xy=(160, 120), size=20)
+        dirty_rects = list(self.screen.dirty_rects)
+
+        self.screen.update()
+
+        update_display.assert_called_once_with(self.screen.surface, dirty_rects)
+        self.assertEqual(self.screen.dirty_rects, [])
+        self.assertFalse(self.screen.needs_update)
+
+    @mock.patch('tingbot.platform_specific.update_display')
+    def test_update_falls_back_to_full_update(self, update_display):
+        self.screen.fill(color='black')
+        self.screen.update()
+        update_display.assert_called_once_with(self.screen.surface, None)
+
+    @mock.patch('tingbot.platform_specific.update_display')
+    def test_update_with_nothing_drawn_is_full_update(self, update_display):
+        self.screen.update()
+        update_display.assert_called_once_with(self.screen.surface, None)
+
+    @mock.patch('tingbot.platform_specific.update_display')
+    def test_many_separate_areas_is_full_update(self, update_display):
+        for x in range(0, 320, 4):
+            self.screen.points([(x, 0)], color='white')
+
+        self.assertEqual(self.screen.dirty_rects, [pygame.Rect(0, 0, 320, 240)])
+
+        self.screen.update()
+        update_display.assert_called_once_with(self.screen.surface, None)
+
+    def test_separate_areas_up_to_the_limit_are_kept(self):
+        for x in range(0, self.screen.max_dirty_rects * 4, 4):
+            self.screen.points([(x, 0)], color='white')
+
+        self.assertEqual(len(self.screen.dirty_rects), self.screen.max_dirty_rects)
+
+
+class UnhashableFile(io.BytesIO):
+    ''' A font file opened from memory, which can't be used as a dict key '''
+    __hash__ = None
+
+    def __init__(self):
+        with open('tingbot/resources/Geneva.ttf', 'rb') as f:
+            super(UnhashableFile, self).__init__(f.read())
+
+
+class TestTextCache(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((100, 100)))
+        self.render_calls = []
+
+        def from_text(string, **kwargs):
+            self.render_calls.append(string)
+            return Image(surface=pygame.Surface((10, 10)))
+
+        patcher = mock.patch.object(Image, 'from_text', side_effect=from_text)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('tingbot.graphics.text_cache', cache.RenderCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_rendered_text(self):
+        self.image.text('Hello')
+        self.image.text('Hello')
+        self.assertEqual(self.render_calls, ['Hello'])
+
+    def test_different_color_renders_again(self):
+        self.image.text('Hello', color='white')
+        self.image.text('Hello', color='black')
+        self.assertEqual(self.render_calls, ['Hello', 'Hello'])
+
+    def test_cache_can_be_disabled(self):
+        self.image.text('Hello', cache=False)
+        self.image.text('Hello', cache=False)
+        self.assertEqual(self.render_calls, ['Hello', 'Hello'])
+
+    def test_unhashable_font_is_not_cached(self):
+        self.image.text('Hello', font=UnhashableFile())
+        self.image.text('Hello', font=UnhashableFile())
+        self.assertEqual(self.render_calls, ['Hello', 'Hello'])
+
+
+class TestGlyphText(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((200, 100), 0, 32))
+        self.image.fill('black')
+
+        for name, value in (('glyph_atlas_cache', cache.GlyphAtlasCache()),
+                            ('font_metrics_cache', cache.FontMetricsCache())):
+            patcher = mock.patch('tingbot.graphics.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.font, _ = graphics._font(None, 20, None)
+        self.font_metrics = graphics.font_metrics_cache.get_metrics(self.font)
+        self.atlas = graphics.glyph_atlas_cache.get_atlas(self.font, True, (255, 255, 255),
+                                                          self.font_metrics)
+
+    def test_renders_each_character_once(self):
+        with mock.patch.object(self.atlas, 'font', wraps=self.font) as font:
+            self.image.text('12:34', color='white', antialias=True, font_size=20, cache='glyphs')
+            self.image.text('12:35', color='white', antialias=True, font_size=20, cache='glyphs')
+
+        rendered = [c[0][0] for c in font.render.call_args_list]
+        self.assertEqual(sorted(rendered), sorted(set(u'12:345')))
+
+    def test_draws_text(self):
+        self.image.text('Hello', color='white', antialias=True, font_size=20, cache='glyphs')
+
+        bounding_rect = self.image.surface.get_bounding_rect()
+        self.assertGreater(bounding_rect.width, 20)
+        self.assertGreater(bounding_rect.height, 5)
+        # centered by default
+        self.assertAlmostEqual(bounding_rect.centerx, 100, delta=3)
+
+    def test_matches_text(self):
+        for string in ('jump', 'fjord', 'a jump fjord'):
+            expected = Image(surface=pygame.Surface((200, 100), 0, 32))
+            expected.fill('black')
+            expected.text(string, xy=(10, 10), align='topleft', color='white', font_size=40,
+                          antialias=False, cache=False)
+
+            self.image.fill('black')
+            self.image.text(string, xy=(10, 10), align='topleft', color='white', font_size=40,
+                            antialias=False, cache='glyphs')
+
+            self.assertEqual(pygame.image.tostring(self.image.surface, 'RGB'),
+                             pygame.image.tostring(expected.surface, 'RGB'))
+
+    def test_lines_match_render_text(self):
+        string = u'The quick brown fox jumps over the lazy dog'
+        lines = self.font_metrics.lines(string, max_lines=2, max_width=120)
+
+        expected = Typesetter(string, self.font.metrics(string)).lines(
+            max_lines=2, max_width=120, ellipsis=u'\u2026',
+            ellipsis_metrics=self.font.metrics(u'\u2026'))
+
+        self.assertEqual([l.string for l in lines], [l.string for l in expected])
+        self.assertTrue(lines[-1].string.endswith(u'\u2026'))
+
+
+class TestTextSize(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((320, 240), 0, 32))
+
+    def test_single_line(self):
+        font, _ = graphics._font(None, 20, None)
+        self.assertEqual(self.image.text_size('Hello', font_size=20),
+                         (font.size(u'Hello')[0], font.get_height()))
+
+    def test_matches_rendered_lines(self):
+        string = u'The quick brown fox jumps over the lazy dog'
+        font, _ = graphics._font(None, 20, None)
+
+        for max_width, max_lines in ((sys.maxsize, sys.maxsize), (150, sys.maxsize), (150, 2)):
+            lines = Typesetter(string, font.metrics(string)).lines(
+                max_lines=max_lines, max_width=max_width, ellipsis=u'\u2026',
+                ellipsis_metrics=font.metrics(u'\u2026'))
+
+            self.assertEqual(
+                self.image.text_size(string, font_size=20, max_width=max_width,
+                                     max_lines=max_lines),
+                (max(font.size(l.string)[0] for l in lines), font.get_height() * len(lines)))
+
+    def test_matches_italic_text(self):
+        # italic characters overhang their advance, and the font places them at fractional
+        # positions, so adding up the character metrics doesn't give the rendered width
+        font = pygame.font.Font(None, 36)
+        font.set_italic(True)
+        font_metrics = FontMetrics(font)
+
+        for string in (u'zoCboDHppoEt', u'Waffle', u'jiffy', u'AVATAR', u'f'):
+            lines = font_metrics.lines(string, max_lines=sys.maxsize, max_width=sys.maxsize)
+            self.assertEqual(font_metrics.size(lines),
+                             font.render(string, False, (255, 255, 255)).get_size())
+
+    def test_max_height(self):
+        font, _ = graphics._font(None, 20, None)
+        size = self.image.text_size('The quick brown fox jumps over the lazy dog', font_size=20,
+                                    max_width=100, max_height=font.get_linesize() * 2)
+        self.assertEqual(size[1], font.get_height() * 2)
+
+    def test_does_not_render(self):
+        font, _ = graphics._font(None, 20, None)
+        wrapped_font = mock.Mock(wraps=font)
+
+        with mock.patch.object(graphics.font_cache, 'get_font', return_value=wrapped_font):
+            self.image.text_size('Not drawn', font_size=20)
+
+        self.assertTrue(wrapped_font.metrics.called)
+        self.assertFalse(wrapped_font.render.called)
+
+
+class TestRichText(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((320, 240), 0, 32))
+        self.image.fill('black')
+
+        patcher = mock.patch('tingbot.graphics.text_cache', cache.RenderCache())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_draws_each_span_in_its_color(self):
+        self.image.rich_text([('Red', {'color': (255, 0, 0)}), ' and ',
+                              ('blue', {'color': (0, 0, 255), 'font_size': 40})],
+                             color=(0, 255, 0), font_size=20, antialias=False)
+
+        colors = set(tuple(self.image.surface.get_at((x, y)))
+                     for x in range(320) for y in range(240))
+        self.assertTrue(set([(255, 0, 0, 255), (0, 255, 0, 255), (0, 0, 255, 255)]) <= colors)
+
+    def test_single_span_matches_text_size(self):
+        image = Image.from_spans(['Hello world'], font_size=20)
+        self.assertEqual(image.size, self.image.text_size('Hello world', font_size=20))
+
+    def test_splitting_into_spans_matches_text(self):
+        string = 'a jump fjord'
+        expected = Image.from_text(string, color='white', font_size=40, antialias=False)
+
+        for spans in (['a ju', 'mp fjord'], ['a jum', 'p fjord'], ['a jump ', 'f', 'jord']):
+            image = Image.from_spans(spans, color='white', font_size=40, antialias=False)
+
+            self.assertEqual(image.size, expected.size)
+            self.assertEqual(pygame.image.tostring(image.surface, 'RGBA'),
+                             pygame.image.tostring(expected.surface, 'RGBA'))
+
+    def test_reuses_rendered_text(self):
+        spans = [('Hello ', {'color': 'red'}), 'world']
+
+        with mock.patch.object(Image, 'from_spans', wraps=Image.from_spans) as from_spans:
+            self.image.rich_text(spans)
+            self.image.rich_text(spans)
+            self.image.rich_text([('Hello ', {'color': 'blue'}), 'world'])
+
+        self.assertEqual(from_spans.call_count, 2)
+
+    def test_unhashable_font(self):
+        self.image.rich_text([('Hello ', {'font': UnhashableFile()}), 'world'],
+                             font=UnhashableFile())
+        self.assertNotEqual(pygame.transform.average_color(self.image.surface)[:3], (0, 0, 0))
+
+    def test_unknown_style(self):
+        with self.assertRaises(TypeError):
+            self.image.rich_text([('Hello', {'colour': 'red'})])
+
+
+class TestSurfaceScroll(unittest.TestCase):
+    def test_moves_contents(self):
+        image = Image(surface=pygame.Surface((100, 100), 0, 32))
+        image.fill('black')
+        image.rectangle(xy=(10, 20), size=(1, 1), color=(255, 0, 0), align='topleft')
+
+        image.scroll(dx=5, dy=-10)
+
+        self.assertEqual(image.surface.get_at((15, 10)), (255, 0, 0, 255))
+        self.assertEqual(image.surface.get_at((10, 20)), (0, 0, 0, 255))
+
+
+class TestConsole(unittest.TestCase):
+    def setUp(self):
+        self.console = graphics.Console(size=(200, 100), font_size=14)
+
+    def assertMatchesFullRedraw(self):
+        incremental = pygame.image.tostring(self.console.surface, 'RGB')
+        self.console._redraw()
+        self.assertEqual(incremental, pygame.image.tostring(self.console.surface, 'RGB'))
+
+    def test_lines(self):
+        self.console.write('one\ntwo\n')
+        self.console.writeline('three')
+        self.assertEqual(list(self.console.rows), ['one', 'two', 'three'])
+
+    def test_partial_lines(self):
+        self.console.write('one')
+        self.console.write(' two')
+        self.assertEqual(list(self.console.rows), ['one two'])
+
+        self.console.write('\nthree')
+        self.assertEqual(list(self.console.rows), ['one two', 'three'])
+        self.assertMatchesFullRedraw()
+
+    def test_wraps_long_lines(self):
+        self.console.writeline(' '.join(['word'] * 30))
+
+        self.assertGreater(len(self.console.rows), 1)
+        for row in self.console.rows:
+            self.assertLessEqual(self.console.font.size(row)[0], 200)
+
+    def test_scrollback_is_limited(self):
+        console = graphics.Console(size=(200, 100), scrollback=10)
+
+        for i in range(100):
+            console.writeline('line %i' % i)
+
+        self.assertEqual(list(console.rows), ['line %i' % i for i in range(90, 100)])
+
+    def test_only_renders_new_rows(self):
+        for i in range(20):
+            self.console.writeline('line %i' % i)
+
+        with mock.patch.object(self.console, 'font', wraps=self.console.font) as font:
+            self.console.writeline('new line')
+
+        self.assertEqual([c[0][0] for c in font.render.call_args_list], ['new line'])
+        self.assertMatchesFullRedraw()
+
+    def test_scrolls_up(self):
+        for i in range(20):
+            self.console.writeline('line %i' % i)
+
+        row_height = self.console.row_height
+        second_row = pygame.Rect(0, row_height, 200, row_height)
+        before = pygame.image.tostring(self.console.surface.subsurface(second_row), 'RGB')
+
+        self.console.writeline('new line')
+
+        top_row = pygame.Rect(0, 0, 200, row_height)
+        after = pygame.image.tostring(self.console.surface.subsurface(top_row), 'RGB')
+        self.assertEqual(before, after)
+
+    def test_scroll_back(self):
+        for i in range(20):
+            self.console.writeline('line %i' % i)
+
+        visible_rows = self.console.visible_rows
+
+        self.console.scroll_up(3)
+        self.assertEqual(self.console.first_row, 20 - visible_rows - 3)
+        self.assertMatchesFullRedraw()
+
+        # new text doesn't move the rows being looked at
+        self.console.writeline('new line')
+        self.assertEqual(self.console.first_row, 20 - visible_rows - 3)
+        self.assertMatchesFullRedraw()
+
+        self.console.scroll_up(1000)
+        self.assertEqual(self.console.first_row, 0)
+        self.assertMatchesFullRedraw()
+
+        self.console.scroll_to_bottom()
+        self.assertEqual(self.console.first_row, 21 - visible_rows)
+        self.assertMatchesFullRedraw()
+
+    def test_scrolled_back_with_full_scrollback(self):
+        console = graphics.Console(size=(200, 100), scrollback=20)
+        self.console = console
+
+        for i in range(30):
+            console.writeline('line %i' % i)
+
+        console.scroll_up(1000)
+        console.writeline('x')
+        self.assertMatchesFullRedraw()
+
+        console.scroll_down(2)
+        console.writeline('y')
+        self.assertMatchesFullRedraw()
+
+    def test_scroll_down_after_filling_scrollback_while_scrolled_back(self):
+        console = graphics.Console(size=(200, 100), scrollback=20)
+        self.console = console
+
+        for i in range(20):
+            console.writeline('line %i' % i)
+
+        console.scroll_up(1000)
+
+        for i in range(10):
+            console.writeline('more %i' % i)
+
+        # still showing the oldest rows that are left
+        self.assertEqual(console.scroll_offset, 20 - console.visible_rows)
+        first_row = console.first_row
+
+        console.scroll_down(1)
+        self.assertEqual(console.first_row, first_row + 1)
+        self.assertMatchesFullRedraw()
+
+    def test_clear(self):
+        self.console.writeline('hello')
+        self.console.clear()
+        self.console.writeline('world')
+
+        self.assertEqual(list(self.console.rows), ['world'])
+        self.assertMatchesFullRedraw()
+
+
+class TestTransformedImageCache(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((320, 240)))
+        self.image_cache = cache.ImageCache()
+        self.image_cache.delete_callbacks.append(graphics._image_cache_did_delete)
+
+        for name, value in (('image_cache', self.image_cache),
+                            ('transformed_image_cache', cache.RenderCache())):
+            patcher = mock.patch('tingbot.graphics.' + name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        patcher = mock.patch('tingbot.graphics.pygame.transform.smoothscale',
+                             wraps=pygame.transform.smoothscale)
+        self.smoothscale = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_reuses_scaled_image(self):
+        self.image.image(graphics.broken_image_file, scale=2)
+        self.image.image(graphics.broken_image_file, scale=2)
+        self.assertEqual(self.smoothscale.call_count, 1)
+
+    def test_different_scale_is_scaled_again(self):
+        self.image.image(graphics.broken_image_file, scale=2)
+        self.image.image(graphics.broken_image_file, scale=3)
+        self.assertEqual(self.smoothscale.call_count, 2)
+
+    def test_scaled_image_is_removed_with_source(self):
+        self.image.image(graphics.broken_image_file, scale=2, alpha=0.5)
+        self.assertEqual(len(graphics.transformed_image_cache.images), 1)
+
+        self.image_cache.del_image(graphics.broken_image_file)
+        self.assertEqual(len(graphics.transformed_image_cache.images), 0)
+
+    def test_image_objects_are_not_cached(self):
+        source = Image(surface=pygame.Surface((10, 10)))
+        self.image.image(source, scale=2)
+        self.image.image(source, scale=2)
+        self.assertEqual(self.smoothscale.call_count, 2)
+
+
+class TestAsyncImage(unittest.TestCase):
+    def setUp(self):
+        self.surface = Image(surface=pygame.Surface((320, 240), 0, 32))
+        self.surface.fill(color='black')
+
+        patcher = mock.patch('tingbot.graphics.image_cache')
+        self.image_cache = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.image_cache.get_image_async.return_value = None
+
+    def test_draws_nothing_while_loading(self):
+        with mock.patch.object(self.surface, '_mark_dirty') as mark_dirty:
+            self.surface.image('http://example.com/a.png', async_load=True)
+        self.assertFalse(mark_dirty.called)
+        self.assertFalse(self.image_cache.get_image.called)
+
+    def test_draws_placeholder_while_loading(self):
+        placeholder = Image(surface=pygame.Surface((10, 10), 0, 32))
+        placeholder.fill(color='white')
+        self.surface.image('http://example.com/a.png', xy=(0, 0), align='topleft',
+                           async_load=True, placeholder=placeholder)
+        self.assertEqual(self.surface.surface.get_at((0, 0)), (255, 255, 255, 255))
+
+    def test_draws_loaded_image(self):
+        loaded = Image(surface=pygame.Surface((10, 10), 0, 32))
+        loaded.fill(color='white')
+        self.image_cache.get_image_async.return_value = loaded
+        self.surface.image('http://example.com/a.png', xy=(0, 0), align='topleft',
+                           async_load=True)
+        self.assertEqual(self.surface.surface.get_at((0, 0)), (255, 255, 255, 255))
+
+
+def make_gif(durations, size=(8, 8)):
+    from PIL import Image as PILImage
+
+    frames = [PILImage.new('P', size, i) for i in range(len(durations))]
+    for frame in frames:
+        frame.putpalette([c for i in range(256) for c in (i, 255 - i, 0)])
+
+    gif_file = io.BytesIO()
+    frames[0].save(gif_file, format='GIF', save_all=True, append_images=frames[1:],
+                   duration=[int(d * 1000) for d in durations], loop=0)
+    gif_file.seek(0)
+    return gif_file
+
+
+class TestGIFImage(unittest.TestCase):
+    def setUp(self):
+        self.gif = GIFImage(make_gif([0.1, 0.2, 0.05, 0.3]))
+        self.time = 1000.0
+        self.gif.clock = lambda: self.time
+
+    def linear_frame_at(self, position):
+        frame_time = 0
+        for surface, duration in self.gif.frames:
+            frame_time += duration
+            if frame_time >= position:
+                return surface
+
+    def test_frame_at_matches_linear_search(self):
+        steps = 200
+        for i in range(steps):
+            position = self.gif.total_duration * i / steps
+            self.assertIs(self.gif.frame_at(position), self.linear_frame_at(position))
+
+    def test_frame_at_wraps_around(self):
+        self.assertIs(self.gif.frame_at(self.gif.total_duration + 0.01), self.gif.frame_at(0.01))
+
+    def test_animation_follows_clock(self):
+        first_frame = self.gif.surface
+        self.time += self.gif.frame_end_times[0] + 0.001
+        self.assertIs(self.gif.surface, self.gif.frames[1][0])
+        self.assertIsNot(self.gif.surface, first_frame)
+
+    def test_pause_and_play(self):
+        self.gif.surface
+        self.gif.pause()
+        self.time += self.gif.frame_end_times[0] + 0.001
+        self.assertIs(self.gif.surface, self.gif.frames[0][0])
+
+        self.gif.play()
+        self.assertIs(self.gif.surface, self.gif.frames[0][0])
+        self.time += self.gif.frame_end_times[0]
+        self.assertIs(self.gif.surface, self.gif.frames[1][0])
+
+    def test_seek(self):
+        self.gif.position = self.gif.frame_end_times[1] + 0.001
+        self.assertIs(self.gif.surface, self.gif.frames[2][0])
+
+
+class TestStreamingGIFImage(unittest.TestCase):
+    def setUp(self):
+        self.durations = [0.1, 0.2, 0.05, 0.3, 0.1, 0.1]
+        self.gif = GIFImage(make_gif(self.durations), streaming=True)
+        self.gif.streaming_frame_window = 2
+
+    def test_reads_durations_without_decoding(self):
+        self.assertTrue(self.gif.is_streaming)
+        self.assertEqual(self.gif.durations, GIFImage(make_gif(self.durations)).durations)
+
+    def test_frames_match_decoded_gif(self):
+        decoded_gif = GIFImage(make_gif(self.durations), streaming=False)
+        # go through the animation twice, to check rewinding
+        for frame_index in range(len(self.durations)) * 2:
+            streamed = self.gif.frame_at(self.gif.frame_end_times[frame_index] - 0.01)
+            decoded = decoded_gif.frames[frame_index][0]
+            self.assertEqual(pygame.image.tostring(streamed, 'RGB'),
+                             pygame.image.tostring(decoded, 'RGB'))
+
+    def test_keeps_a_window_of_frames(self):
+        for end_time in self.gif.frame_end_times:
+            self.gif.frame_at(end_time - 0.01)
+        self.assertEqual(list(self.gif.decoded_frames), [4, 5])
+
+    def test_memory_usage_is_stable(self):
+        memory_usage = self.gif.get_memory_usage()
+        for end_time in self.gif.frame_end_times:
+            self.gif.frame_at(end_time - 0.01)
+        self.assertEqual(self.gif.get_memory_usage(), memory_usage)
+
+    def test_memory_usage_includes_pil_buffers(self):
+        data = make_gif(self.durations, size=(100, 50)).getvalue()
+        gif = GIFImage(io.BytesIO(data), streaming=True)
+        decoded_frame_count = min(len(self.durations), gif.streaming_frame_window)
+
+        # the compressed data, and PIL's decoded frame and its copy for disposal
+        self.assertEqual(gif.get_memory_usage(),
+                         len(data) + 2 * 100 * 50 + decoded_frame_count * gif.frame_memory_usage)
+        self.assertFalse(hasattr(gif, 'data'))
+
+    def test_large_gifs_stream_automatically(self):
+        self.assertFalse(GIFImage(make_gif(self.durations)).is_streaming)
+        self.assertTrue(GIFImage(make_gif(self.durations, size=(400, 400))).is_streaming)
+
+
+class TestConvertToDisplayFormat(unittest.TestCase):
+    def setUp(self):
+        graphics.screen.ensure_display_setup()
+
+    def test_opaque_images_lose_alpha(self):
+        surface = pygame.Surface((10, 10), pygame.SRCALPHA, 32)
+        surface.fill((255, 0, 0, 255))
+        result = graphics._convert_to_display_format(surface)
+        self.assertFalse(result.get_flags() & pygame.SRCALPHA)
+
+    def test_transparent_images_keep_alpha(self):
+        surface = pygame.Surface((10, 10), pygame.SRCALPHA, 32)
+        surface.fill((255, 0, 0, 255))
+        surface.fill((255, 0, 0, 128), (0, 0, 1, 1))
+        result = graphics._convert_to_display_format(surface)
+        self.assertTrue(result.get_flags() & pygame.SRCALPHA)
+
+    def test_colorkeyed_images_are_rle_accelerated(self):
+        surface = pygame.Surface((10, 10), 0, 8)
+        surface.set_colorkey(0)
+        result = graphics._convert_to_display_format(surface)
+        self.assertIsNotNone(result.get_colorkey())
+        self.assertTrue(result.get_flags() & pygame.RLEACCELOK)
+
+
+class TestSixteenBitFormat(unittest.TestCase):
+    def setUp(self):
+        graphics.screen.ensure_display_setup()
+        self.format_surface = pygame.Surface((1, 1), 0, 16)
+
+    def test_opaque_images_are_converted_to_16_bit(self):
+        surface = pygame.Surface((10, 10), pygame.SRCALPHA, 32)
+        surface.fill((10, 20, 30, 255))
+        result = graphics._convert_to_display_format(surface, self.format_surface)
+        self.assertEqual(result.get_bitsize(), 16)
+
+    def test_dithering_keeps_average_color(self):
+        import numpy
+        surface = pygame.Surface((16, 16), 0, 32)
+        surface.fill((100, 150, 200))
+        result = graphics._convert_to_display_format(surface, self.format_surface)
+        pixels = pygame.surfarray.array3d(result)
+
+        self.assertGreater(len(numpy.unique(pixels[..., 0])), 1)
+        # the low bits of the 16-bit channels are filled in when they're read back, ignore them
+        for channel, value, bits in zip(range(3), (100, 150, 200), (5, 6, 5)):
+            shown_values = pixels[..., channel] >> (8 - bits) << (8 - bits)
+            self.assertAlmostEqual(shown_values.mean(), value, delta=1)
+
+    def test_exact_colors_are_not_dithered(self):
+        surface = pygame.Surface((16, 16), 0, 32)
+        surface.fill((8, 4, 248))
+        result = graphics._convert_to_display_format(surface, self.format_surface)
+        pixels = pygame.surfarray.array3d(result)
+        self.assertEqual(len(set(map(tuple, pixels.reshape(-1, 3)))), 1)
+
+    def test_source_is_not_modified(self):
+        surface = pygame.Surface((16, 16), 0, 32)
+        surface.fill((100, 150, 200))
+        graphics._dithered(surface, self.format_surface)
+        self.assertEqual(surface.get_at((1, 0)), (100, 150, 200, 255))
+
+    def test_16_bit_images_are_smoothly_scaled(self):
+        surface = pygame.Surface((2, 1), 0, 16)
+        surface.fill((255, 255, 255), (1, 0, 1, 1))
+        result = graphics._transform(surface, (8, 1), 1.0)
+        self.assertEqual(result.get_bitsize(), 16)
+        grey = result.get_at((4, 0))
+        self.assertTrue(0 < grey[0] < 255)
+
+
+class TestLoadFitTo(unittest.TestCase):
+    def setUp(self):
+        graphics.screen.ensure_display_setup()
+
+    def make_jpeg(self, size):
+        from PIL import Image as PILImage
+        jpeg_file = io.BytesIO()
+        PILImage.new('RGB', size, (255, 0, 0)).save(jpeg_file, 'JPEG')
+        jpeg_file.seek(0)
+        return jpeg_file
+
+    def test_reduction_factor(self):
+        self.assertEqual(graphics._reduction_factor((3264, 2448), (320, 240)), 10)
+        self.assertEqual(graphics._reduction_factor((640, 240), (320, 240)), 1)
+        self.assertEqual(graphics._reduction_factor((100, 100), (320, 240)), 1)
+
+    def test_large_jpeg_is_reduced(self):
+        image = Image.load_file(self.make_jpeg((1600, 1200)), 'photo.jpg', fit_to=(320, 240))
+        self.assertEqual(image.size, (400, 300))
+
+    def test_reduced_jpeg_still_fills_area(self):
+        image = Image.load_file(self.make_jpeg((1000, 500)), 'photo.jpg', fit_to=(320, 240))
+        self.assertGreaterEqual(image.size[0], 320)
+        self.assertGreaterEqual(image.size[1], 240)
+        self.assertLess(image.size[0], 1000)
+
+    def test_small_jpeg_is_not_changed(self):
+        image = Image.load_file(self.make_jpeg((100, 80)), 'photo.jpg', fit_to=(320, 240))
+        self.assertEqual(image.size, (100, 80))
+
+    def test_without_fit_to_loads_full_size(self):
+        image = Image.load_file(self.make_jpeg((1600, 1200)), 'photo.jpg')
+        self.assertEqual(image.size, (1600, 1200))
+
+    def test_greyscale_pil_image(self):
+        from PIL import Image as PILImage
+        image = Image.from_pil_image(PILImage.new('L', (10, 10), 128))
+        self.assertEqual(image.size, (10, 10))
+
+    def test_cmyk_pil_image(self):
+        from PIL import Image as PILImage
+        image = Image.from_pil_image(PILImage.new('CMYK', (10, 10)))
+        self.assertEqual(image.size, (10, 10))
+
+
+class TestSurfaceFromPILImage(unittest.TestCase):
+    def setUp(self):
+        graphics.screen.ensure_display_setup()
+        # the test display is 8-bit, so check the surfaces before they're converted to it
+        patcher = mock.patch('tingbot.graphics._convert_to_display_format',
+                             side_effect=lambda surface: surface.copy())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_rgb(self):
+        from PIL import Image as PILImage
+        surface = graphics._surface_from_pil_image(PILImage.new('RGB', (4, 3), (10, 20, 30)))
+        self.assertEqual(surface.get_size(), (4, 3))
+        self.assertEqual(surface.get_at((3, 2)), (10, 20, 30, 255))
+
+    def test_rgba(self):
+        from PIL import Image as PILImage
+        surface = graphics._surface_from_pil_image(PILImage.new('RGBA', (4, 3), (10, 20, 30, 40)))
+        self.assertEqual(surface.get_at((3, 2)), (10, 20, 30, 40))
+
+    def test_greyscale_is_read_as_palette(self):
+        from PIL import Image as PILImage
+        surface = graphics._surface_from_pil_image(PILImage.new('L', (4, 3), 128))
+        self.assertEqual(surface.get_bitsize(), 8)
+        self.assertEqual(surface.get_at((3, 2)), (128, 128, 128, 255))
+
+    def test_rgb_is_written_in_screen_format(self):
+        from PIL import Image as PILImage
+        screen_surface = pygame.Surface((320, 240), 0, 32)
+
+        with mock.patch.object(graphics.screen, 'surface', screen_surface):
+            surface = graphics._surface_from_pil_image(PILImage.new('RGB', (4, 3), (10, 20, 30)))
+
+        self.assertEqual(surface.get_masks(), screen_surface.get_masks())
+        self.assertEqual(surface.get_at((3, 2)), (10, 20, 30, 255))
+
+    def test_pil_raw_mode(self):
+        self.assertEqual(graphics._pil_raw_mode(
+            pygame.Surface((1, 1), 0, 32, (0xff0000, 0xff00, 0xff, 0))), 'BGRX')
+        self.assertEqual(graphics._pil_raw_mode(
+            pygame.Surface((1, 1), 0, 32, (0xff, 0xff00, 0xff0000, 0))), 'RGBX')
+        self.assertIsNone(graphics._pil_raw_mode(pygame.Surface((1, 1), 0, 16)))
+
+    def test_palette_transparency_is_colorkey(self):
+        from PIL import Image as PILImage
+        pil_image = PILImage.new('P', (4, 3), 1)
+        pil_image.putpalette([0, 0, 0, 255, 0, 0] * 128)
+        pil_image.info['transparency'] = 1
+        surface = graphics._surface_from_pil_image(pil_image)
+        self.assertEqual(surface.get_at((0, 0))[:3], (255, 0, 0))
+        self.assertEqual(surface.get_colorkey()[:3], (255, 0, 0))
+
+
+class TestTranslucentDrawing(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((50, 50), 0, 32))
+        self.image.fill(color='white')
+
+    def expected_blend(self, draw):
+        expected = pygame.Surface((50, 50), 0, 32)
+        expected.fill((255, 255, 255))
+        overlay = pygame.Surface((50, 50), pygame.SRCALPHA, 32)
+        draw(overlay)
+        expected.blit(overlay, (0, 0))
+        return pygame.image.tostring(expected, 'RGB')
+
+    def assertImageEqual(self, expected):
+        self.assertEqual(pygame.image.tostring(self.image.surface, 'RGB'), expected)
+
+    def test_translucent_rectangles(self):
+        self.image.rectangle(xy=(5, 5), size=(20, 20), color=(255, 0, 0, 128), align='topleft')
+        self.image.rectangle(xy=(15, 15), size=(10, 10), color=(0, 0, 255, 64), align='topleft')
+
+        expected = pygame.Surface((50, 50), 0, 32)
+        expected.fill((255, 255, 255))
+        for rect, color in (((5, 5, 20, 20), (255, 0, 0, 128)), ((15, 15, 10, 10), (0, 0, 255, 64))):
+            overlay = pygame.Surface((rect[2], rect[3]), pygame.SRCALPHA, 32)
+            overlay.fill(color)
+            expected.blit(overlay, rect)
+
+        self.assertImageEqual(pygame.image.tostring(expected, 'RGB'))
+
+    def test_translucent_rectangle_off_the_edge(self):
+        self.image.rectangle(xy=(40, 40), size=(20, 20), color=(255, 0, 0, 128), align='topleft')
+        self.assertImageEqual(self.expected_blend(
+            lambda overlay: overlay.fill((255, 0, 0, 128), (40, 40, 10, 10))))
+
+    def test_translucent_shapes_entirely_off_the_surface(self):
+        # a new scratch surface, like the first drawing in a fresh process
+        with mock.patch('tingbot.graphics.scratch_surface', graphics.ScratchSurface()):
+            self.image.rectangle(xy=(500, 500), size=(10, 10), color=(255, 0, 0, 128))
+            self.image.oval(xy=(500, 500), size=(10, 10), color=(255, 0, 0, 128))
+
+        self.assertImageEqual(self.expected_blend(lambda overlay: None))
+
+    def test_translucent_oval(self):
+        self.image.oval(xy=(10, 10), size=(30, 20), color=(255, 0, 0, 128), align='topleft')
+        self.assertImageEqual(self.expected_blend(
+            lambda overlay: pygame.draw.ellipse(overlay, (255, 0, 0, 128), (10, 10, 30, 20))))
+
+    def test_translucent_oval_off_the_edge(self):
+        self.image.oval(xy=(-10, 30), size=(30, 40), color=(0, 255, 0, 100), align='topleft')
+        self.assertImageEqual(self.expected_blend(
+            lambda overlay: pygame.draw.ellipse(overlay, (0, 255, 0, 100), (-10, 30, 30, 40))))
+
+
+class TestDisplayList(unittest.TestCase):
+    def setUp(self):
+        self.target = Image(surface=pygame.Surface((50, 50), 0, 32))
+        self.expected = Image(surface=pygame.Surface((50, 50), 0, 32))
+
+    def draw_scene(self, surface):
+        surface.fill(color='white')
+        surface.circle(xy=(25, 25), size=20, color='red')
+        surface.rectangle(xy=(0, 0), size=(10, 10), color=(0, 0, 255, 128), align='topleft')
+
+    def assertTargetEqual(self, expected):
+        self.assertEqual(pygame.image.tostring(self.target.surface, 'RGB'),
+                         pygame.image.tostring(expected.surface, 'RGB'))
+
+    def test_draws_when_recording_finishes(self):
+        with self.target.record() as layer:
+            self.draw_scene(layer)
+
+        self.draw_scene(self.expected)
+        self.assertTargetEqual(self.expected)
+
+    def test_records_top_level_calls(self):
+        with self.target.record() as layer:
+            self.draw_scene(layer)
+
+        self.assertEqual([c[0] for c in layer.calls], ['fill', 'circle', 'rectangle'])
+
+    def test_replays_over_other_drawing(self):
+        with self.target.record() as layer:
+            layer.rectangle(xy=(0, 0), size=(20, 20), color='red', align='topleft')
+
+        self.target.fill(color='black')
+        layer.draw()
+
+        self.expected.fill(color='black')
+        self.expected.rectangle(xy=(0, 0), size=(20, 20), color='red', align='topleft')
+        self.assertTargetEqual(self.expected)
+
+    def test_invalidate_redraws_from_calls(self):
+        with self.target.record() as layer:
+            self.draw_scene(layer)
+
+        with mock.patch.object(Surface, 'circle', wraps=Surface.circle) as circle:
+            layer.draw()
+            self.assertEqual(circle.call_count, 0)
+
+            layer.invalidate()
+            layer.draw()
+            self.assertEqual(circle.call_count, 1)
+
+        self.draw_scene(self.expected)
+        self.assertTargetEqual(self.expected)
+
+    def draw_translucent_scene(self, surface):
+        surface.rectangle(xy=(5, 5), size=(30, 30), color=(255, 0, 0, 128), align='topleft')
+        surface.oval(xy=(30, 30), size=(30, 30), color=(0, 0, 255, 100))
+        surface.text('x', xy=(25, 25), color=(0, 255, 0, 150), font_size=30)
+
+    def assertTargetClose(self, expected, tolerance=2):
+        import numpy
+        difference = numpy.abs(
+            pygame.surfarray.array3d(self.target.surface).astype(int)
+            - pygame.surfarray.array3d(expected.surface).astype(int))
+        self.assertLessEqual(difference.max(), tolerance)
+
+    def test_overlapping_translucent_drawing_matches_direct_drawing(self):
+        self.target.fill(color='white')
+
+        with self.target.record() as layer:
+            self.draw_translucent_scene(layer)
+
+        self.expected.fill(color='white')
+        self.draw_translucent_scene(self.expected)
+        self.assertTargetClose(self.expected)
+
+    def test_redrawn_translucent_drawing_matches_direct_drawing(self):
+        with self.target.record() as layer:
+            self.draw_translucent_scene(layer)
+
+        self.target.fill(color='black')
+        layer.invalidate()
+        layer.draw()
+
+        self.expected.fill(color='black')
+        self.draw_translucent_scene(self.expected)
+        self.assertTargetClose(self.expected)
+
+        # where the rectangle and the oval overlap
+        self.assertEqual(self.target.surface.get_at((34, 34))[:3], (77, 0, 99))
+
+    @mock.patch('tingbot.graphics.pygame.display.update')
+    def test_screen_target_marks_drawn_area_dirty(self, display_update):
+        screen = Screen()
+        screen.surface = pygame.Surface((320, 240), 0, 32)
+
+        with screen.record() as layer:
+            layer.rectangle(xy=(10, 10), size=(20, 20), color='red', align='topleft')
+
+        self.assertEqual(screen.dirty_rects, [pygame.Rect(10, 10, 20, 20)])
+
+
+class TestBulkDrawing(unittest.TestCase):
+    def setUp(self):
+        self.image = Image(surface=pygame.Surface((50, 50), 0, 32))
+        self.image.fill(color='black')
+
+    def test_points(self):
+        import numpy
+        xy = numpy.array([(1, 2), (10, 20), (49, 49)])
+        self.image.points(xy, color=(255, 0, 0))
+
+        for point in xy:
+            self.assertEqual(self.image.surface.get_at(tuple(point)), (255, 0, 0, 255))
+        self.assertEqual(self.image.surface.get_at((2, 2)), (0, 0, 0, 255))
+
+    def test_points_off_the_surface_are_ignored(self):
+        self.image.points([(-1, 0), (50, 10), (5, 5)], color='white')
+        self.assertEqual(self.image.surface.get_at((5, 5)), (255, 255, 255, 255))
+        self.assertFalse(self.image.surface.get_locked())
+
+    def test_points_mark_bounding_rect_dirty(self):
+        screen = Screen()
+        screen.surface = pygame.Surface((320, 240), 0, 32)
+        screen.points([(10, 20), (30, 25)], color='white')
+        self.assertEqual(screen.dirty_rects, [pygame.Rect(10, 20, 21, 6)])
+
+    def test_polyline(self):
+        import numpy
+        self.image.polyline(numpy.array([(0, 0), (10, 0), (10, 10)]), color='white')
+        self.assertEqual(self.image.surface.get_at((5, 0)), (255, 255, 255, 255))
+        self.assertEqual(self.image.surface.get_at((10, 5)), (255, 255, 255, 255))
+
+    def test_pixels(self):
+        with self.image.pixels() as pixels:
+            self.assertEqual(pixels.shape, (50, 50, 3))
+            pixels[:, 10] = (0, 255, 0)
+
+        self.assertEqual(self.image.surface.get_at((25, 10)), (0, 255, 0, 255))
+        self.assertFalse(self.image.surface.get_locked())
+
+        with self.assertRaises(ValueError):
+            pixels[0, 0]
+
+    def test_pixels_16_bit(self):
+        image = Image(surface=pygame.Surface((50, 50), 0, 16, (0xf800, 0x07e0, 0x001f, 0)))
+        image.fill((255, 0, 0))
+        image.rectangle(xy=(0, 20), size=(50, 1), color=(0, 0, 255), align='topleft')
+
+        with image.pixels() as pixels:
+            self.assertEqual(pixels.shape, (50, 50, 3))
+            self.assertEqual(tuple(pixels[5, 5]), (255, 0, 0))
+            self.assertEqual(tuple(pixels[5, 20]), (0, 0, 255))
+            pixels[:, 10] = (0, 255, 0)
+
+        self.assertEqual(image.surface.get_at((25, 10)), (0, 255, 0, 255))
+        # unchanged pixels are the same
+        self.assertEqual(image.surface.get_at((25, 5)), (255, 0, 0, 255))
+        self.assertEqual(image.surface.get_at((25, 20)), (0, 0, 255, 255))
+        self.assertFalse(image.surface.get_locked())
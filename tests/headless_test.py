@@ -0,0 +1,36 @@
+import unittest
+import os
+import shutil
+import tempfile
+import mock
+import pygame
+
+from tingbot.platform_specific import headless
+
+
+class TestHeadless(unittest.TestCase):
+    def test_creates_offscreen_surface(self):
+        surface = headless.create_main_surface(depth=16)
+        self.assertEqual(surface.get_size(), (320, 240))
+        self.assertEqual(surface.get_bitsize(), 16)
+
+    def test_depth_from_environment(self):
+        with mock.patch.dict(os.environ, {'TB_HEADLESS_DEPTH': '32'}):
+            surface = headless.create_main_surface()
+        self.assertEqual(surface.get_bitsize(), 32)
+
+    def test_update_captures_frames(self):
+        capture_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, capture_dir)
+        surface = pygame.Surface((320, 240), 0, 32)
+        surface.fill((255, 0, 0))
+
+        with mock.patch.dict(os.environ, {'TB_CAPTURE_DIR': capture_dir}):
+            headless.update_display(surface)
+            headless.update_display(surface, [pygame.Rect(0, 0, 10, 10)])
+
+        frames = sorted(os.listdir(capture_dir))
+        self.assertEqual(len(frames), 2)
+
+        frame = pygame.image.load(os.path.join(capture_dir, frames[0]))
+        self.assertEqual(frame.get_at((0, 0))[:3], (255, 0, 0))
@@ -0,0 +1,102 @@
+import unittest
+import os
+import shutil
+import tempfile
+import mock
+import pygame
+
+from tingbot.graphics import Screen
+from tingbot import mirror
+from tingbot.mirror import MirrorServer, MirrorClient, parse_address
+
+
+class TestMirror(unittest.TestCase):
+    def setUp(self):
+        self.screen = Screen()
+        self.screen.surface = pygame.Surface((320, 240), 0, 32)
+        self.screen.fill(color=(255, 0, 0))
+
+        patcher = mock.patch('tingbot.platform_specific.update_display')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def start_server(self, address):
+        server = MirrorServer(address)
+        server.start(self.screen)
+        self.addCleanup(server.stop)
+
+        client = MirrorClient(server.address)
+        client.socket.settimeout(5)
+        self.addCleanup(client.close)
+        return server, client
+
+    def test_first_frame_is_whole_screen(self):
+        server, client = self.start_server(('127.0.0.1', 0))
+
+        rects = client.read_frame()
+
+        self.assertEqual(len(rects), len(server.tile_rects))
+        self.assertEqual(client.surface.get_at((319, 239))[:3], (255, 0, 0))
+
+    def test_only_changed_tiles_are_sent(self):
+        server, client = self.start_server(('127.0.0.1', 0))
+        client.read_frame()
+
+        self.screen.rectangle(xy=(40, 40), size=(10, 10), color=(0, 0, 255), align='topleft')
+        self.screen.update()
+        rects = client.read_frame()
+
+        self.assertEqual(rects, [pygame.Rect(32, 32, 32, 32)])
+        self.assertEqual(client.surface.get_at((45, 45))[:3], (0, 0, 255))
+
+    def test_unchanged_tiles_are_not_sent(self):
+        server, client = self.start_server(('127.0.0.1', 0))
+        client.read_frame()
+
+        # drawn over with the same color, so nothing changes
+        self.screen.rectangle(xy=(0, 0), size=(100, 100), color=(255, 0, 0), align='topleft')
+        self.screen.update()
+        self.screen.rectangle(xy=(200, 200), size=(10, 10), color=(0, 0, 255), align='topleft')
+        self.screen.update()
+
+        self.assertEqual(client.read_frame(), [pygame.Rect(192, 192, 32, 32)])
+
+    def test_unix_socket(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+
+        server, client = self.start_server(os.path.join(directory, 'mirror.sock'))
+
+        client.read_frame()
+        self.assertEqual(client.surface.get_at((0, 0))[:3], (255, 0, 0))
+
+    def test_read_frame_timeout(self):
+        server, client = self.start_server(('127.0.0.1', 0))
+        client.read_frame()
+
+        # nothing has changed, so no frame is sent
+        self.assertEqual(client.read_frame(timeout=0.01), [])
+
+        self.screen.rectangle(xy=(40, 40), size=(10, 10), color=(0, 0, 255), align='topleft')
+        self.screen.update()
+        self.assertEqual(client.read_frame(timeout=5), [pygame.Rect(32, 32, 32, 32)])
+
+    @mock.patch('pygame.display')
+    @mock.patch('pygame.event.get')
+    @mock.patch('tingbot.mirror.MirrorClient')
+    def test_viewer_handles_events_without_frames(self, client_class, get_events, display):
+        client_class.return_value.read_frame.return_value = []
+        client_class.return_value.surface.get_size.return_value = (320, 240)
+        # the window is closed while the screen isn't changing
+        get_events.side_effect = [[], [pygame.event.Event(pygame.QUIT)]]
+
+        with mock.patch('sys.argv', ['mirror', 'tingbot.local:4242']):
+            mirror.main()
+
+        self.assertEqual(get_events.call_count, 2)
+        self.assertFalse(display.update.called)
+        client_class.return_value.close.assert_called_once_with()
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('tingbot.local:4242'), ('tingbot.local', 4242))
+        self.assertEqual(parse_address('/tmp/mirror.sock'), '/tmp/mirror.sock')
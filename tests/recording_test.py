@@ -0,0 +1,159 @@
+import unittest
+import os
+import shutil
+import tempfile
+import mock
+import pygame
+
+from tingbot.graphics import Screen
+from tingbot import recording
+from tingbot.recording import Recorder, _GIFWriter
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.time = 0.0
+
+    def __call__(self):
+        return self.time
+
+
+class TestRecorder(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.clock = FakeClock()
+        self.surface = pygame.Surface((320, 240), 0, 32)
+
+    def load_frame(self, number):
+        return pygame.image.load(os.path.join(self.directory, 'frame-%05i.png' % number))
+
+    def test_png_sequence_applies_changed_rects(self):
+        recorder = Recorder(self.directory, fps=10, clock=self.clock)
+        recorder.start()
+
+        self.surface.fill((255, 0, 0))
+        recorder.capture(self.surface)
+
+        self.clock.time += 0.1
+        self.surface.fill((0, 0, 255))
+        recorder.capture(self.surface, [pygame.Rect(0, 0, 10, 10)])
+        recorder.stop()
+
+        frame = self.load_frame(2)
+        self.assertEqual(frame.get_at((0, 0))[:3], (0, 0, 255))
+        # outside the changed rect, the frame still shows the first one
+        self.assertEqual(frame.get_at((20, 20))[:3], (255, 0, 0))
+
+    def test_skips_frames_faster_than_fps(self):
+        recorder = Recorder(self.directory, fps=10, clock=self.clock)
+        recorder.start()
+
+        recorder.capture(self.surface)
+        self.clock.time += 0.05
+        self.surface.fill((0, 255, 0), (0, 0, 10, 10))
+        recorder.capture(self.surface, [pygame.Rect(0, 0, 10, 10)])
+        self.clock.time += 0.05
+        recorder.capture(self.surface, [pygame.Rect(100, 100, 10, 10)])
+        recorder.stop()
+
+        self.assertEqual(recorder.frame_count, 2)
+        # the change from the skipped update is in the next frame
+        self.assertEqual(self.load_frame(2).get_at((0, 0))[:3], (0, 255, 0))
+
+    def test_drops_frames_when_queue_is_full(self):
+        recorder = Recorder(self.directory, fps=10, queue_size=1, clock=self.clock)
+
+        recorder.capture(self.surface)
+        self.clock.time += 0.1
+        recorder.capture(self.surface, [pygame.Rect(0, 0, 10, 10)])
+
+        self.assertEqual(recorder.frame_count, 1)
+        self.assertEqual(recorder.dropped_frames, 1)
+        # the next frame has to be the whole screen
+        self.assertIsNone(recorder.changed_rects)
+
+    def test_gif(self):
+        from PIL import Image as PILImage
+        path = os.path.join(self.directory, 'recording.gif')
+        recorder = Recorder(path, fps=10, clock=self.clock)
+        recorder.start()
+
+        for color in ((255, 0, 0), (0, 255, 0), (0, 0, 255)):
+            self.surface.fill(color)
+            recorder.capture(self.surface)
+            self.clock.time += 0.2
+
+        recorder.stop()
+
+        gif = PILImage.open(path)
+        self.assertEqual(gif.n_frames, 3)
+        self.assertEqual(gif.info['duration'], 200)
+        self.assertEqual(gif.info['loop'], 0)
+
+        for frame_number, color in enumerate(((255, 0, 0), (0, 255, 0), (0, 0, 255))):
+            gif.seek(frame_number)
+            self.assertEqual(gif.convert('RGB').getpixel((0, 0)), color)
+
+        # the last frame is shown for one frame interval
+        self.assertEqual(gif.info['duration'], 100)
+
+    def test_gif_frames_are_written_as_they_arrive(self):
+        from PIL import Image as PILImage
+        path = os.path.join(self.directory, 'recording.gif')
+        writer = _GIFWriter(path)
+
+        writer.add_frame(0.0, PILImage.new('P', (10, 10)))
+        writer.add_frame(0.1, PILImage.new('P', (10, 10)))
+        writer.add_frame(0.2, PILImage.new('P', (10, 10)))
+
+        # only the last frame is waiting for its duration
+        self.assertEqual(writer.pending_frame[0], 0.2)
+        self.assertGreater(writer.file.tell(), 0)
+
+        writer.close(0.1)
+        self.assertEqual(PILImage.open(path).n_frames, 3)
+
+    def test_gif_is_removed_after_an_error(self):
+        path = os.path.join(self.directory, 'recording.gif')
+        recorder = Recorder(path, fps=10, clock=self.clock)
+        pil_images = [recording._pil_image_from_surface(self.surface)] * 2
+
+        def pil_image_from_surface(surface):
+            if not pil_images:
+                raise IOError('disk full')
+            return pil_images.pop()
+
+        with mock.patch('tingbot.recording._pil_image_from_surface',
+                        side_effect=pil_image_from_surface):
+            recorder.start()
+
+            # the first frame is written when the second arrives, then the third fails
+            for i in range(3):
+                recorder.capture(self.surface)
+                self.clock.time += 0.1
+
+            self.assertRaises(IOError, recorder.stop)
+
+        self.assertFalse(os.path.exists(path))
+
+
+class TestScreenRecording(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.screen = Screen()
+        self.screen.surface = pygame.Surface((320, 240), 0, 32)
+
+        patcher = mock.patch('tingbot.platform_specific.update_display')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_records_updates(self):
+        self.screen.start_recording(self.directory)
+        self.screen.fill(color='red')
+        self.screen.update()
+        self.screen.stop_recording()
+
+        self.assertEqual(os.listdir(self.directory), ['frame-00001.png'])
+        self.assertEqual(self.screen.update_listeners, [])
@@ -0,0 +1,54 @@
+import unittest
+import mock
+import pygame
+
+from tingbot.platform_specific import sdl_wrapper
+
+
+class TestSimulator(unittest.TestCase):
+    def setUp(self):
+        patcher = mock.patch.object(sdl_wrapper, 'simulator', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create_simulator(self, scale):
+        sdl_wrapper.simulator = sdl_wrapper.Simulator(scale=scale)
+        return sdl_wrapper.simulator
+
+    @mock.patch('pygame.display.update')
+    def test_full_update_is_only_the_screen(self, display_update):
+        simulator = self.create_simulator(scale=1)
+
+        sdl_wrapper.update_display(simulator.screen)
+
+        display_update.assert_called_with([pygame.Rect(86, 54, 320, 240)])
+
+    @mock.patch('pygame.display.update')
+    def test_rects_are_translated_to_window(self, display_update):
+        simulator = self.create_simulator(scale=1)
+
+        sdl_wrapper.update_display(simulator.screen, [pygame.Rect(10, 10, 20, 20)])
+
+        display_update.assert_called_with([pygame.Rect(96, 64, 20, 20)])
+
+    def test_scaled_window(self):
+        simulator = self.create_simulator(scale=2)
+        self.assertEqual(simulator.window.get_size(), (990, 754))
+        self.assertEqual(simulator.screen.get_size(), (320, 240))
+
+    @mock.patch('pygame.display.update')
+    def test_scaled_update(self, display_update):
+        simulator = self.create_simulator(scale=2)
+        simulator.screen.fill((255, 255, 255), (0, 0, 1, 1))
+
+        sdl_wrapper.update_display(simulator.screen, [pygame.Rect(0, 0, 10, 10)])
+
+        display_update.assert_called_with([pygame.Rect(172, 108, 20, 20)])
+        window_color = simulator.window.get_at((173, 109))
+        self.assertEqual(window_color, simulator.window.get_at((172, 108)))
+        self.assertEqual(window_color, simulator.window.unmap_rgb(
+            simulator.window.map_rgb((255, 255, 255))))
+
+    def test_mouse_position_is_scaled(self):
+        self.create_simulator(scale=3)
+        self.assertEqual(sdl_wrapper.from_window_coordinates((300, 150)), (100, 50))
@@ -1,6 +1,6 @@
 # coding: utf8
-import unittest, sys
-from tingbot.typesetter import Typesetter
+import unittest, sys, random
+from tingbot.typesetter import Typesetter, Line, FontMetrics, Span, layout_spans
 
 character_metrics = (0, 1, 0, 1, 1)
 def metrics_for_string(string):
@@ -55,3 +55,259 @@ class TypesetterTestCase(unittest.TestCase):
 
     def test_truncate_whitespace_single_line(self):
         self.assertRenders('abc       ', ['abc  ...'], max_width=8, max_lines=1)
+
+
+def reference_suggest_line_break(string, string_metrics, start_i, max_width):
+    ''' The original character-by-character Typesetter.suggest_line_break '''
+    line_width = 0
+    last_split_point = None
+    char = None
+
+    for string_i in xrange(start_i, len(string)):
+        prev_char = char
+        char = string[string_i]
+
+        if char == '\n':
+            return string_i + 1
+
+        line_width += string_metrics[string_i][4]
+
+        if char.isspace():
+            continue
+
+        if prev_char in (' ', '-', '\t'):
+            last_split_point = string_i
+
+        if line_width > max_width:
+            if last_split_point is None:
+                if string_i == start_i:
+                    return string_i + 1
+                else:
+                    return string_i
+            else:
+                return last_split_point
+
+    return len(string)
+
+
+def reference_truncate(string, string_metrics, max_width, ellipsis, ellipsis_metrics):
+    ''' The original character-by-character Line.truncate, returning a string '''
+    if sum(m[4] for m in string_metrics) <= max_width:
+        return string
+
+    string_max_width = max_width - sum(m[4] for m in ellipsis_metrics)
+    line_width = 0
+
+    for string_i in xrange(len(string)):
+        line_width += string_metrics[string_i][4]
+
+        if line_width > string_max_width:
+            return string[:string_i] + ellipsis
+
+
+def reference_lines(string, string_metrics, max_lines, max_width, ellipsis, ellipsis_metrics):
+    lines = []
+    line_start_i = 0
+
+    for line_i in xrange(max_lines):
+        final_line = (line_i == max_lines - 1)
+
+        if final_line:
+            line_end_i = len(string)
+        else:
+            line_end_i = reference_suggest_line_break(string, string_metrics, line_start_i,
+                                                      max_width)
+
+        line = string[line_start_i:line_end_i]
+        line_metrics = string_metrics[line_start_i:line_end_i]
+
+        if not final_line and line_end_i != len(string):
+            line = line.rstrip()
+            line_metrics = line_metrics[:len(line)]
+
+        if final_line:
+            line = reference_truncate(line, line_metrics, max_width, ellipsis, ellipsis_metrics)
+
+        lines.append(line)
+
+        if line_end_i == len(string):
+            break
+
+        line_start_i = line_end_i
+
+    return lines
+
+
+class LargeInputTestCase(unittest.TestCase):
+    ''' Compares the Typesetter with the original algorithm on long, random strings '''
+    alphabet = u'abcdefghij      --\t\n.,'
+
+    def random_string(self, rng, length):
+        string = u''.join(rng.choice(self.alphabet) for i in xrange(length))
+        # some zero-width characters, and some wide ones
+        string_metrics = [(0, 1, 0, 1, rng.choice((0, 3, 5, 6, 7, 8, 30)))
+                          for char in string]
+        return string, string_metrics
+
+    def test_suggest_line_break(self):
+        rng = random.Random(1)
+
+        for trial in xrange(20):
+            string, string_metrics = self.random_string(rng, 2000)
+            typesetter = Typesetter(string, string_metrics)
+
+            for start_i in range(0, len(string), 7):
+                max_width = rng.choice((-1, 0, 5, 40, 100, 320, sys.maxsize))
+                self.assertEqual(
+                    typesetter.suggest_line_break(start_i, max_width),
+                    reference_suggest_line_break(string, string_metrics, start_i, max_width))
+
+    def test_truncate(self):
+        rng = random.Random(2)
+        ellipsis = u'...'
+
+        for trial in xrange(200):
+            string, string_metrics = self.random_string(rng, rng.randint(0, 500))
+            ellipsis_metrics = [(0, 1, 0, 1, rng.choice((0, 2, 5)))] * len(ellipsis)
+            max_width = rng.randint(0, 1000)
+
+            line = Line(string, string_metrics).truncate(max_width, ellipsis, ellipsis_metrics)
+
+            self.assertEqual(
+                line.string,
+                reference_truncate(string, string_metrics, max_width, ellipsis, ellipsis_metrics))
+            self.assertEqual(line.width, sum(m[4] for m in line.string_metrics))
+
+    def test_lines(self):
+        rng = random.Random(3)
+        ellipsis = u'\u2026'
+        ellipsis_metrics = [(0, 1, 0, 1, 4)]
+
+        for trial in xrange(50):
+            string, string_metrics = self.random_string(rng, 10000)
+            max_width = rng.choice((0, 10, 100, 320, 1000))
+            max_lines = rng.choice((1, 2, 10, 100, sys.maxsize))
+
+            lines = Typesetter(string, string_metrics).lines(
+                max_lines=max_lines,
+                max_width=max_width,
+                ellipsis=ellipsis,
+                ellipsis_metrics=ellipsis_metrics)
+
+            self.assertEqual(
+                [l.string for l in lines],
+                reference_lines(string, string_metrics, max_lines, max_width, ellipsis,
+                                ellipsis_metrics))
+
+            for line in lines:
+                self.assertEqual(line.width, sum(m[4] for m in line.string_metrics))
+
+
+class FakeFont(object):
+    ''' Characters are 10 pixels wide by default, and 'x' is missing from the font '''
+    def __init__(self, char_width=10, height=12, ascent=10):
+        self.char_width = char_width
+        self.height = height
+        self.ascent = ascent
+        self.measured = []
+
+    def get_height(self):
+        return self.height
+
+    def get_ascent(self):
+        return self.ascent
+
+    def metrics(self, string):
+        self.measured.append(string)
+        char_metrics = (0, self.char_width, 0, self.height, self.char_width)
+        return [None if char == 'x' else char_metrics for char in string]
+
+    def size(self, string):
+        # missing characters are 8 pixels wide
+        return (sum(8 if char == 'x' else self.char_width for char in string), self.height)
+
+
+class FontMetricsTestCase(unittest.TestCase):
+    def test_measures_each_character_once(self):
+        font = FakeFont()
+        font_metrics = FontMetrics(font)
+
+        font_metrics.metrics(u'hello')
+        font_metrics.metrics(u'hello')
+        font_metrics.metrics(u'help')
+
+        self.assertEqual(sorted(u''.join(font.measured)), sorted(u'helop'))
+
+    def test_missing_character(self):
+        font_metrics = FontMetrics(FakeFont())
+        self.assertEqual(font_metrics.metrics(u'ax'), [(0, 10, 0, 12, 10), (0, 8, 0, 12, 8)])
+
+    def test_size(self):
+        font_metrics = FontMetrics(FakeFont())
+        lines = font_metrics.lines(u'abc abcdef', max_lines=sys.maxsize, max_width=60)
+
+        self.assertEqual([l.string for l in lines], [u'abc', u'abcdef'])
+        self.assertEqual(font_metrics.size(lines), (60, 24))
+        self.assertEqual(font_metrics.size([]), (0, 0))
+
+
+class SpanLayoutTestCase(unittest.TestCase):
+    def setUp(self):
+        self.font = FakeFont()
+        self.big_font = FakeFont(char_width=20, height=24, ascent=20)
+
+    def span(self, string, font=None):
+        return Span(string, font or self.font, True, (255, 255, 255))
+
+    def assertRuns(self, line, expected):
+        self.assertEqual([(span.font, string, x) for span, string, x in line.runs], expected)
+
+    def test_breaks_across_spans(self):
+        lines = layout_spans([self.span(u'abc '), self.span(u'de', self.big_font),
+                              self.span(u'f ghi')], max_lines=sys.maxsize, max_width=100)
+
+        self.assertEqual(len(lines), 2)
+        self.assertRuns(lines[0], [(self.font, u'abc ', 0), (self.big_font, u'de', 40),
+                                   (self.font, u'f', 80)])
+        self.assertRuns(lines[1], [(self.font, u'ghi', 0)])
+        self.assertEqual(lines[0].width, 90)
+
+    def test_same_lines_as_one_span(self):
+        string = u'The quick brown fox jumps over the lazy dog'
+        lines = layout_spans([self.span(string[:7]), self.span(string[7:20]),
+                              self.span(string[20:])], max_lines=3, max_width=120)
+
+        expected = Typesetter(string, metrics_for_string(string)).lines(
+            max_lines=3, max_width=12, ellipsis=u'\u2026',
+            ellipsis_metrics=metrics_for_string(u'\u2026'))
+
+        self.assertEqual([u''.join(string for _, string, _ in line.runs) for line in lines],
+                         [line.string for line in expected])
+
+    def test_runs_reaching_back_past_their_origin(self):
+        # 'j' reaches 3 pixels left of where it's drawn
+        font = FakeFont()
+        font.metrics = lambda string: [(-3, 10, 0, 12, 10) if char == 'j' else
+                                       (0, 10, 0, 12, 10) for char in string]
+        font.size = lambda string: (10 * len(string) + (3 if string.startswith('j') else 0), 12)
+        lines = layout_spans([self.span(u'oj', font), self.span(u'jo', font)],
+                             max_lines=sys.maxsize, max_width=1000)
+
+        # the second run is rendered starting at the left of its 'j'
+        self.assertRuns(lines[0], [(font, u'oj', 0), (font, u'jo', 17)])
+        self.assertEqual(lines[0].width, 40)
+
+    def test_line_height(self):
+        lines = layout_spans([self.span(u'ab'), self.span(u'CD', self.big_font),
+                              self.span(u'\nef')], max_lines=sys.maxsize, max_width=1000)
+
+        self.assertEqual((lines[0].ascent, lines[0].height), (20, 24))
+        self.assertEqual((lines[1].ascent, lines[1].height), (10, 12))
+
+    def test_ellipsis_takes_style_of_text_before(self):
+        lines = layout_spans([self.span(u'abc'), self.span(u'defghijkl', self.big_font)],
+                             max_lines=1, max_width=100)
+
+        self.assertRuns(lines[0], [(self.font, u'abc', 0), (self.big_font, u'de', 30),
+                                   (self.big_font, u'\u2026', 70)])
+        self.assertLessEqual(lines[0].width, 100)
@@ -7,6 +7,9 @@ import requests
 import io
 import os
 import threading
+import collections
+import functools
+import Queue
 from urlparse import urlparse
 
 
@@ -74,16 +77,20 @@ class ImageEntry(object):
     def get_size(self):
         return self.image.get_memory_usage()
 
+    def might_be_stale(self):
+        """quick check to see if is_fresh() needs calling, without any network I/O"""
+        return not self.is_fresh()
+
 
 class WebImage(ImageEntry):
-    def __init__(self, url):
+    def __init__(self, url, fit_to=None):
         import graphics
         self.url = url
         response = requests.get(url)
         response.raise_for_status()  # raise exception if url not appropriate
         self.set_attributes(response)
         image_file = io.BytesIO(response.content)
-        self.image = graphics.Image.load_file(image_file, url)
+        self.image = graphics.Image.load_file(image_file, url, fit_to=fit_to)
         self.last_accessed = time.time()  # local time
         self.retrieved = time.time()  # local time
 
@@ -92,6 +99,9 @@ class WebImage(ImageEntry):
         self.max_age = get_max_age(response, self.last_modified)  # seconds unit, no timeframe
         self.etag = get_etag(response)
 
+    def might_be_stale(self):
+        return (time.time()-self.retrieved) >= self.max_age
+
     def is_fresh(self):
         now = time.time()
         if (now-self.retrieved) < self.max_age:  # local time - local time
@@ -113,10 +123,10 @@ class WebImage(ImageEntry):
 
 
 class FileImage(ImageEntry):
-    def __init__(self, filename):
+    def __init__(self, filename, fit_to=None):
         import graphics
         self.filename = filename
-        self.image = graphics.Image.load_filename(filename)
+        self.image = graphics.Image.load_filename(filename, fit_to=fit_to)
         self.last_modified = os.path.getmtime(filename)
         self.last_accessed = time.time()
 
@@ -127,24 +137,118 @@ class FileImage(ImageEntry):
             return False
 
 
+class RenderedImage(ImageEntry):
+    def __init__(self, image):
+        self.image = image
+        self.last_accessed = time.time()
+
+
 class ImageCache(object):
-    def __init__(self, cache_size=2*10**6):
+    def __init__(self, cache_size=2*10**6, fit_to=(320, 240)):
         self.images = {}
         self.size = 0
         self.cache_size = cache_size
+        # large images are decoded at a lower resolution, just big enough to fill this size
+        self.fit_to = fit_to
         self.lock = threading.RLock()
+        # functions called with the location of each image that is removed from the cache
+        self.delete_callbacks = []
+        # locations being loaded by the background thread, see get_image_async
+        self.pending = set()
+        # (exception, time) of the last failed background load of each location
+        self.failures = {}
+        self.failure_retry_interval = 10
+        self.load_queue = Queue.Queue()
+        self.load_thread = None
 
     def get_image(self, location):
         image = self.images.get(location)
         if image and image.is_fresh():
             return image.image
-        if is_url(location):
-            image = WebImage(location)
-        else:
-            image = FileImage(location)
+        image = self.load_entry(location)
         self.add_image(location, image)
         return image.image
 
+    def get_image_async(self, location):
+        """
+        Like get_image, but doesn't wait for the network or disk. Images that aren't in the cache
+        are loaded on a background thread, and None is returned until they're ready. Stale images
+        are returned while they're refreshed in the background.
+
+        If a background load fails, the exception is raised by calls in the next
+        failure_retry_interval seconds, then the image is tried again.
+        """
+        with self.lock:
+            entry = self.images.get(location)
+            failure = self.failures.get(location)
+            recently_failed = (failure is not None
+                               and time.time() - failure[1] < self.failure_retry_interval)
+
+            if location not in self.pending and not recently_failed:
+                if entry is None or entry.might_be_stale():
+                    self.load_in_background(location, entry)
+
+        if entry is not None:
+            return entry.get_image()
+        if recently_failed:
+            raise failure[0]
+        return None
+
+    def load_entry(self, location):
+        if is_url(location):
+            return WebImage(location, fit_to=self.fit_to)
+        else:
+            return FileImage(location, fit_to=self.fit_to)
+
+    def load_in_background(self, location, entry=None):
+        """
+        Loads location on the background thread, then adds it to the cache on the main thread,
+        using RunLoop.call_after. If entry is given, it's only replaced if it's not fresh.
+        """
+        from run_loop import RunLoop
+        import graphics
+
+        # the loaded image is converted to the screen's pixel format, so the display has to be
+        # set up first - SDL only supports doing that on the main thread
+        graphics.screen.ensure_display_setup()
+
+        with self.lock:
+            self.pending.add(location)
+            self.load_queue.put((location, entry, RunLoop.call_after))
+
+            if self.load_thread is None:
+                self.load_thread = threading.Thread(target=self._load_thread_main,
+                                                    name='ImageCache loader')
+                self.load_thread.daemon = True
+                self.load_thread.start()
+
+    def _load_thread_main(self):
+        while True:
+            location, entry, call_after = self.load_queue.get()
+
+            try:
+                if entry is None or not entry.is_fresh():
+                    entry = self.load_entry(location)
+            except Exception as e:
+                call_after(functools.partial(self._background_load_failed, location, e))
+            else:
+                call_after(functools.partial(self._background_load_finished, location, entry))
+            finally:
+                self.load_queue.task_done()
+
+    def _background_load_finished(self, location, entry):
+        with self.lock:
+            self.pending.discard(location)
+            self.failures.pop(location, None)
+
+            if self.images.get(location) is not entry:
+                self.add_image(location, entry)
+
+    def _background_load_failed(self, location, exception):
+        with self.lock:
+            self.pending.discard(location)
+            self.failures[location] = (exception, time.time())
+
     def add_image(self, location, image):
         with self.lock:
             # delete image if already in cache and being over-written
@@ -165,3 +269,154 @@ class ImageCache(object):
         with self.lock:
             self.size -= self.images[location].get_size()
             del self.images[location]
+
+        for callback in self.delete_callbacks:
+            callback(location)
+
+
+class RenderCache(object):
+    """
+    Keeps images that have been drawn by the library (e.g. text), so they can be reused rather
+    than drawn again. When the images use more than cache_size bytes, the least recently used
+    are removed.
+    """
+    def __init__(self, cache_size=2*10**6):
+        self.images = collections.OrderedDict()
+        self.size = 0
+        self.cache_size = cache_size
+        self.lock = threading.RLock()
+
+    def get_image(self, key):
+        with self.lock:
+            image = self.images.pop(key, None)
+            if image is None:
+                return None
+            # move to the end, the least recently used images are at the start
+            self.images[key] = image
+            return image.get_image()
+
+    def add_image(self, key, image):
+        with self.lock:
+            # delete image if already in cache and being over-written
+            if key in self.images:
+                self.del_image(key)
+            entry = RenderedImage(image)
+            self.images[key] = entry
+            self.size += entry.get_size()
+
+            # clean out cache if too big
+            for old_key in list(self.images):
+                if self.size <= self.cache_size:
+                    break
+                elif old_key != key:
+                    self.del_image(old_key)
+
+    def del_image(self, key):
+        with self.lock:
+            self.size -= self.images[key].get_size()
+            del self.images[key]
+
+    def del_images_where(self, condition):
+        """
+        Removes the images whose key passes `condition(key)`.
+        """
+        with self.lock:
+            for key in [k for k in self.images if condition(k)]:
+                self.del_image(key)
+
+
+class LRUCache(object):
+    """
+    Keeps up to max_items objects, made as they're needed. When it's full, the least recently
+    used object is removed. Iterating gives the keys, least recently used first.
+    """
+    def __init__(self, max_items):
+        self.items = collections.OrderedDict()
+        self.max_items = max_items
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.RLock()
+
+    def get(self, key, create):
+        """
+        Returns the object for key, calling create() to make it if it's not in the cache. Raises
+        TypeError if key is unhashable.
+        """
+        with self.lock:
+            try:
+                item = self.items.pop(key)
+            except KeyError:
+                item = create()
+                self.misses += 1
+            else:
+                self.hits += 1
+
+            # (re)insert the item at the end, so the least recently used items are at the start
+            self.items[key] = item
+
+            while len(self.items) > self.max_items:
+                self.items.popitem(last=False)
+
+        return item
+
+    def __iter__(self):
+        with self.lock:
+            return iter(list(self.items))
+
+    def __len__(self):
+        return len(self.items)
+
+
+class FontCache(object):
+    """
+    Keeps recently used pygame Font objects, so the font file doesn't have to be reopened and
+    parsed every time some text is drawn.
+    """
+    def __init__(self, max_fonts=32):
+        self.fonts = LRUCache(max_fonts)
+
+    @property
+    def hits(self):
+        return self.fonts.hits
+
+    @property
+    def misses(self):
+        return self.fonts.misses
+
+    def get_font(self, filename, size):
+        import pygame.font
+        create = lambda: pygame.font.Font(filename, size)
+
+        try:
+            return self.fonts.get((filename, size), create)
+        except TypeError:
+            # filename is unhashable (maybe a file-like object), so it can't be cached
+            return create()
+
+
+class GlyphAtlasCache(object):
+    """
+    Keeps recently used GlyphAtlas objects, one for each font, color and antialias setting.
+    """
+    def __init__(self, max_atlases=32):
+        self.atlases = LRUCache(max_atlases)
+
+    def get_atlas(self, font, antialias, color, font_metrics=None):
+        from typesetter import GlyphAtlas
+
+        return self.atlases.get(
+            (font, bool(antialias), tuple(color)),
+            lambda: GlyphAtlas(font, antialias, color, font_metrics))
+
+
+class FontMetricsCache(object):
+    """
+    Keeps the FontMetrics of recently used fonts, so characters are only measured once.
+    """
+    def __init__(self, max_fonts=32):
+        self.fonts = LRUCache(max_fonts)
+
+    def get_metrics(self, font):
+        from typesetter import FontMetrics
+
+        return self.fonts.get(font, lambda: FontMetrics(font))
@@ -62,7 +62,8 @@ def error_screen(exc_info):
         screen.text(line1, xy=(320/2, 135), color='white', align='center', font=font, font_size=16)
         screen.text(line2, xy=(320/2, 155), color='white', align='center', font=font, font_size=16)
 
-        pygame.display.update()
+        # through the platform backend, which might not draw to the pygame display
+        screen.update()
 
 
 def get_app_frame(traceback):
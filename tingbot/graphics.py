@@ -1,7 +1,7 @@
 # coding: utf8
 from __future__ import division
-import os, time, numbers, math, io, warnings, sys
-import pygame
+import os, time, numbers, math, io, warnings, sys, bisect, collections, contextlib
+import pygame, pygame.mask
 import requests
 import cache
 from .utils import cached_property, get_resource
@@ -97,7 +97,62 @@ def _font(font, font_size, antialias):
     if antialias is None:
         antialias = True
 
-    return pygame.font.Font(font, font_size), antialias
+    return font_cache.get_font(font, font_size), antialias
+
+def _max_lines(font, max_lines, max_height):
+    if max_height != sys.maxsize:
+        line_height = font.get_linesize()
+        max_lines_by_height = int(max_height//line_height)
+
+        if max_lines_by_height < 1:
+            # never collapse the text to zero lines because of the height restriction
+            max_lines_by_height = 1
+
+        max_lines = min(max_lines, max_lines_by_height)
+
+    return max_lines
+
+def _spans(spans, color, font, font_size, antialias):
+    '''
+    Converts the spans passed to rich_text to typesetter Spans, filling in the default style.
+    '''
+    from .typesetter import Span
+
+    result = []
+
+    for span in spans:
+        if isinstance(span, basestring):
+            string, style = span, {}
+        else:
+            string, style = span
+
+        unknown_keys = set(style).difference(('color', 'font', 'font_size', 'antialias'))
+        if unknown_keys:
+            raise TypeError('unknown style %s' % ', '.join(sorted(unknown_keys)))
+
+        span_font, span_antialias = _font(style.get('font', font),
+                                          style.get('font_size', font_size),
+                                          style.get('antialias', antialias))
+        result.append(Span(unicode(string), span_font, span_antialias,
+                           _color(style.get('color', color)),
+                           font_metrics_cache.get_metrics(span_font)))
+
+    return result
+
+def _spans_cache_key(spans):
+    key = []
+
+    for span in spans:
+        if isinstance(span, basestring):
+            key.append((unicode(span), ()))
+        else:
+            string, style = span
+            style = dict(style)
+            if 'color' in style:
+                style['color'] = tuple(_color(style['color']))
+            key.append((unicode(string), tuple(sorted(style.items()))))
+
+    return tuple(key)
 
 def _anchor(align):
     mapping = {
@@ -124,7 +179,361 @@ def _topleft_from_aligned_xy(xy, align, size, surface_size):
     anchor_offset = _xy_multiply(_anchor(align), size)
     return _xy_subtract(xy, anchor_offset)
 
+def _transform(surface, size, alpha):
+    '''
+    Returns `surface` scaled to `size`, with its opacity multiplied by `alpha`. The original
+    surface is not modified.
+    '''
+    # result is a temporary variable to minimise copying on each tranformation
+    result = surface
+
+    if size != surface.get_size():
+        if surface.get_bitsize() == 16 and surface.get_colorkey() is None:
+            # smoothscale only works with 24 and 32-bit surfaces, so scale a 32-bit copy and
+            # convert it back
+            scaled = pygame.transform.smoothscale(surface.convert(32), size)
+            result = _convert_to_display_format(scaled, format_surface=surface)
+        else:
+            try:
+                result = pygame.transform.smoothscale(surface, size)
+            except ValueError:
+                result = pygame.transform.scale(surface, size)
+
+    if alpha < 1.0:
+        # only copy the surface if required
+        if result is surface:
+            result = surface.copy()
+
+        # multipling the pixels' color components with white does nothing, so this only
+        # changes the alpha of the image
+        result.fill((255, 255, 255, alpha*255), None, pygame.BLEND_RGBA_MULT)
+
+    return result
+
+def _has_transparent_pixels(surface):
+    # a mask with the threshold 254 only contains the fully opaque pixels
+    opaque_pixel_count = pygame.mask.from_surface(surface, 254).count()
+    return opaque_pixel_count < surface.get_width() * surface.get_height()
+
+# a 4x4 ordered dither matrix
+_bayer_matrix = [[ 0,  8,  2, 10],
+                 [12,  4, 14,  6],
+                 [ 3, 11,  1,  9],
+                 [15,  7, 13,  5]]
+
+def _dithered(surface, format_surface):
+    '''
+    Returns a copy of `surface` with ordered dithering applied, so that there's less banding when
+    it's converted to the lower color depth of `format_surface`. Returns `surface` itself if the
+    conversion doesn't lose colors, or if NumPy isn't installed.
+    '''
+    if format_surface.get_bitsize() > 16 or surface.get_bitsize() < 24:
+        return surface
+
+    try:
+        import numpy, pygame.surfarray
+    except ImportError:
+        return surface
+
+    # the difference between the colors that each channel of the format can show
+    steps = numpy.array([1 << max(0, 8 - bin(mask).count('1'))
+                         for mask in format_surface.get_masks()[:3]])
+
+    width, height = surface.get_size()
+    threshold = numpy.tile(_bayer_matrix, (width // 4 + 1, height // 4 + 1))[:width, :height]
+    # the conversion drops the low bits of each channel, adding a value between 0 and step-1
+    # first rounds some pixels up instead, in a pattern
+    offsets = (threshold[..., numpy.newaxis] * steps) // 16
+
+    result = surface.copy()
+    pixels = pygame.surfarray.pixels3d(result)
+    pixels[...] = numpy.minimum(pixels + offsets, 255)
+    del pixels
+
+    return result
+
+def _convert_to_display_format(surface, format_surface=None):
+    '''
+    Returns a copy of `surface` in the pixel format of the screen (or of `format_surface`, if
+    given), so that drawing it doesn't need a conversion for every pixel. Per-pixel alpha is only
+    kept if the surface has transparent pixels. Opaque images are dithered when the format has
+    fewer colors, e.g. on the Tingbot's 16-bit screen.
+    '''
+    if format_surface is None:
+        format_args = ()
+        format_surface = screen.surface
+    else:
+        format_args = (format_surface,)
+
+    if surface.get_flags() & pygame.SRCALPHA and _has_transparent_pixels(surface):
+        return surface.convert_alpha(*format_args)
+
+    result = _dithered(surface, format_surface).convert(*format_args)
+
+    if result.get_flags() & pygame.SRCALPHA:
+        # convert() keeps the alpha flag, this removes it
+        result.set_alpha(None)
+
+    colorkey = result.get_colorkey()
+
+    if colorkey is not None:
+        # run-length encoding makes colorkeyed surfaces much quicker to draw
+        result.set_colorkey(colorkey, pygame.RLEACCEL)
+
+    return result
+
+def _surface_from_pil_image(pil_image):
+    '''
+    Returns a surface in the screen's pixel format with the contents of `pil_image`.
+
+    The pixels are copied out of PIL once, into a buffer that pygame reads in place, and then
+    once more by the conversion to the screen's format.
+    '''
+    screen.ensure_display_setup()
+
+    if pil_image.mode == '1':
+        pil_image = pil_image.convert('L')
+    elif pil_image.mode == 'P' and not isinstance(pil_image.info.get('transparency', 0), int):
+        # per-palette-entry alpha (from a PNG) can't be a colorkey
+        pil_image = pil_image.convert('RGBA')
+
+    if pil_image.mode in ('P', 'L'):
+        # these are stored as one byte per pixel, pygame reads them as a palettized surface
+        if pil_image.mode == 'P':
+            palette_data = pil_image.getpalette()
+            palette = [palette_data[i:i+3] for i in range(0, len(palette_data), 3)]
+        else:
+            palette = [(i, i, i) for i in range(256)]
+
+        surface = pygame.image.frombuffer(_pil_image_bytes(pil_image), pil_image.size, 'P')
+        surface.set_palette(palette)
+
+        if 'transparency' in pil_image.info:
+            surface.set_colorkey(pil_image.info['transparency'])
+    else:
+        if pil_image.mode not in ('RGB', 'RGBA', 'RGBX'):
+            # pygame can't read other modes (e.g. CMYK), so they have to be converted
+            has_alpha = 'A' in pil_image.mode or 'transparency' in pil_image.info
+            pil_image = pil_image.convert('RGBA' if has_alpha else 'RGB')
+
+        raw_mode = _pil_raw_mode(screen.surface)
+
+        if pil_image.mode in ('RGB', 'RGBX') and raw_mode is not None:
+            # PIL can write the pixels in the screen's format, so no conversion is needed
+            surface = pygame.Surface(pil_image.size, 0, screen.surface)
+
+            if surface.get_pitch() == surface.get_width() * 4:
+                surface.get_buffer().write(pil_image.tobytes('raw', raw_mode), 0)
+                return surface
+
+        surface = pygame.image.frombuffer(_pil_image_bytes(pil_image), pil_image.size,
+                                          pil_image.mode)
+
+    # the conversion copies the pixels, so the buffer can be freed afterwards
+    return _convert_to_display_format(surface)
+
+def _pil_raw_mode(surface):
+    '''
+    Returns the PIL raw mode that packs RGB pixels in the same layout as the pixels of `surface`,
+    or None if PIL can't.
+    '''
+    if surface.get_bitsize() != 32:
+        return None
+
+    channels = dict(zip(surface.get_masks()[:3], 'RGB'))
+    raw_mode = ''.join(channels.get(0xff << (8 * byte), 'X') for byte in range(4))
+
+    if sys.byteorder == 'big':
+        raw_mode = raw_mode[::-1]
+
+    if raw_mode not in ('RGBX', 'BGRX', 'XRGB', 'XBGR'):
+        return None
+
+    return raw_mode
+
+def _pil_image_bytes(pil_image):
+    try:  # account for different versions of Pillow
+        return pil_image.tobytes()
+    except AttributeError:
+        return pil_image.tostring()
+
+def _reduction_factor(image_size, fit_to):
+    '''
+    Returns the largest whole number that `image_size` can be divided by, so that the result still
+    fills `fit_to`.
+    '''
+    fill_scale = max(fit_to[0] / image_size[0], fit_to[1] / image_size[1])
+
+    if fill_scale >= 1:
+        return 1
+
+    return int(1 / fill_scale)
+
+def _reduce_pil_image(pil_image, fit_to):
+    '''
+    Reduces the size of a PIL image that hasn't been loaded yet, so that it's no bigger than needed
+    to fill `fit_to`.
+    '''
+    factor = _reduction_factor(pil_image.size, fit_to)
+
+    if factor == 1:
+        return pil_image
+
+    # For JPEGs, this configures the decoder to scale by 1/2, 1/4 or 1/8 while decoding, to the
+    # smallest size that is at least as big as requested. Other formats ignore it.
+    draft_size = (pil_image.size[0] // factor, pil_image.size[1] // factor)
+    pil_image.draft(pil_image.mode, draft_size)
+
+    # reduce the rest of the way
+    factor = _reduction_factor(pil_image.size, fit_to)
+
+    if factor == 1:
+        return pil_image
+
+    reduced_size = (pil_image.size[0] // factor, pil_image.size[1] // factor)
+
+    if hasattr(pil_image, 'reduce'):
+        return pil_image.reduce(factor)
+    else:
+        # older versions of Pillow don't have reduce(), a BOX resize is the same
+        from PIL import Image as PILImage
+        return pil_image.resize(reduced_size, PILImage.BOX)
+
+def _skip_gif_sub_blocks(data, i):
+    while True:
+        block_size = ord(data[i])
+        i += 1
+        if block_size == 0:
+            return i
+        i += block_size
+
+def _gif_frame_durations(data):
+    '''
+    Reads the duration of each frame from the bytes of a GIF file, without decoding the frames.
+    '''
+    durations = []
+    duration = None
+
+    try:
+        # skip the header, the logical screen descriptor, and the global color table
+        flags = ord(data[10])
+        i = 13
+        if flags & 0x80:
+            i += 3 << ((flags & 7) + 1)
+
+        while i < len(data):
+            block_type = data[i]
+            i += 1
+
+            if block_type == '!':
+                # extension block
+                label = ord(data[i])
+                i += 1
+
+                if label == 0xf9:
+                    # graphic control extension, the delay is in hundredths of a second
+                    delay = ord(data[i+2]) | (ord(data[i+3]) << 8)
+                    duration = delay * 0.01
+
+                i = _skip_gif_sub_blocks(data, i)
+            elif block_type == ',':
+                # image descriptor, followed by an optional local color table and the image data
+                flags = ord(data[i+8])
+                i += 9
+                if flags & 0x80:
+                    i += 3 << ((flags & 7) + 1)
+                # skip the LZW minimum code size
+                i += 1
+                i = _skip_gif_sub_blocks(data, i)
+
+                durations.append(0.1 if duration is None else duration)
+                duration = None
+            else:
+                # trailer, or something unknown
+                break
+    except IndexError:
+        # the file is truncated, return the complete frames
+        pass
+
+    return durations
+
+def _pil_decoder_memory_usage(pil_image):
+    '''
+    The memory PIL uses to decode the frames of a GIF - the last frame it decoded, and a copy of
+    it to restore before drawing the next one.
+    '''
+    width, height = pil_image.size
+    # PIL stores single-band images with a byte per pixel, and others with four
+    bytes_per_pixel = 1 if len(pil_image.getbands()) == 1 else 4
+    return 2 * width * height * bytes_per_pixel
+
+
+class ScratchSurface(object):
+    '''
+    A reusable surface with per-pixel alpha, used to draw translucent shapes before blending
+    them onto the destination. The surface grows to fit the largest area used, and only the top-left
+    area of the requested size should be drawn from.
+    '''
+    def __init__(self):
+        self.surface = None
+        # describes what's currently drawn on the surface, so it can be reused
+        self.contents = None
+
+    def get(self, size, contents, draw):
+        '''
+        Returns the surface, with an area of `size` drawn by `draw(surface)`. `contents` describes
+        what `draw` will draw - if it's the same as last time, the surface is returned as it is.
+        '''
+        if self.surface is None:
+            current_size = (0, 0)
+        else:
+            current_size = self.surface.get_size()
+
+        if size[0] > current_size[0] or size[1] > current_size[1]:
+            new_size = (max(size[0], current_size[0]), max(size[1], current_size[1]))
+            self.surface = pygame.Surface(new_size, pygame.SRCALPHA, 32)
+            self.contents = None
+
+        contents = (tuple(size), contents)
+
+        if contents != self.contents:
+            draw(self.surface)
+            self.contents = contents
+
+        return self.surface
+
+    def filled(self, size, color):
+        '''
+        Returns the surface, with an area of `size` filled with `color`.
+        '''
+        def draw(surface):
+            surface.fill(color, pygame.Rect((0, 0), size))
+
+        return self.get(size, ('fill', tuple(color)), draw)
+
+    def with_oval(self, size, oval_rect, color):
+        '''
+        Returns the surface, with an area of `size` cleared, and an oval drawn in `oval_rect`.
+        '''
+        def draw(surface):
+            surface.fill((0, 0, 0, 0), pygame.Rect((0, 0), size))
+            pygame.draw.ellipse(surface, color, oval_rect, 0)
+
+        return self.get(size, ('oval', tuple(oval_rect), tuple(color)), draw)
+
+scratch_surface = ScratchSurface()
+
 image_cache = cache.ImageCache()
+font_cache = cache.FontCache()
+text_cache = cache.RenderCache()
+glyph_atlas_cache = cache.GlyphAtlasCache()
+font_metrics_cache = cache.FontMetricsCache()
+transformed_image_cache = cache.RenderCache()
+
+def _image_cache_did_delete(location):
+    transformed_image_cache.del_images_where(lambda key: key[0] == location)
+
+image_cache.delete_callbacks.append(_image_cache_did_delete)
 
 class Surface(object):
     """
@@ -161,13 +570,27 @@ class Surface(object):
     def height(self):
         return self.size[1]
 
+    def _mark_dirty(self, rect):
+        '''
+        Called by the drawing methods with the area of the surface that was drawn to. Subclasses
+        can override this to keep track of changes.
+        '''
+        pass
+
     def _fill(self, color, rect=None):
         if len(color) <= 3:
-            self.surface.fill(color, rect)
+            dirty_rect = self.surface.fill(color, rect)
         elif len(color) >= 4:
-            tmp_surface = pygame.Surface(rect.size, pygame.SRCALPHA)
-            tmp_surface.fill(color)
-            self.surface.blit(tmp_surface, rect)
+            rect = rect.clip(self.surface.get_rect())
+
+            if rect.width == 0 or rect.height == 0:
+                # nothing to draw, it's off the surface
+                return
+
+            tmp_surface = scratch_surface.filled(rect.size, color)
+            dirty_rect = self.surface.blit(tmp_surface, rect, pygame.Rect((0, 0), rect.size))
+
+        self._mark_dirty(dirty_rect)
 
     def fill(self, color):
         """
@@ -175,8 +598,22 @@ class Surface(object):
         """
         self._fill(_color(color), self.surface.get_rect())
 
+    def scroll(self, dx=0, dy=0):
+        """
+        Moves everything drawn on the surface by `dx` pixels to the right and `dy` pixels down.
+        This is much quicker than drawing it all again in the new place. The area that's
+        uncovered keeps what was drawn there before, ready to be drawn over.
+
+        Args:
+            dx (int): The distance to move right. Negative numbers move left.
+            dy (int): The distance to move down. Negative numbers move up.
+        """
+        self.surface.scroll(int(dx), int(dy))
+        self._mark_dirty(self.surface.get_rect())
+
     def text(self, string, xy=None, color='grey', align='center', font=None, font_size=32, 
-             antialias=None, max_width=sys.maxsize, max_height=sys.maxsize, max_lines=sys.maxsize):
+             antialias=None, max_width=sys.maxsize, max_height=sys.maxsize, max_lines=sys.maxsize,
+             cache=True):
         """
         Draws text to the surface.
 
@@ -197,6 +634,10 @@ class Surface(object):
                 defaults to unlimited.
             max_lines (int): The maximum number of lines to use. Set to 1 to draw a single line
                 of text. By default, unlimited.
+            cache (bool or str): Whether to keep the rendered text, so drawing the same text again
+                is quicker. Set to False for text that is unlikely to be drawn again. Set to
+                'glyphs' for text that changes often, like a clock - each character is rendered
+                once and kept, and the text is drawn from those. Defaults to True.
         """
         if xy is None:
             if max_width == sys.maxsize:
@@ -204,19 +645,144 @@ class Surface(object):
             if max_height == sys.maxsize:
                 max_height = self.height
 
-        text_image = Image.from_text(
-            string,
-            color=color,
-            font=font,
-            font_size=font_size,
-            antialias=antialias,
-            max_lines=max_lines,
-            max_width=max_width,
-            max_height=max_height,
-            align=_anchor(align)[0])
+        if cache == 'glyphs':
+            self._text_from_glyphs(string, xy, color, align, font, font_size, antialias,
+                                   max_width, max_height, max_lines)
+            return
+
+        text_image = None
+
+        if cache:
+            cache_key = (unicode(string), tuple(_color(color)), font, font_size, antialias,
+                         max_width, max_height, max_lines, align)
+
+            try:
+                text_image = text_cache.get_image(cache_key)
+            except TypeError:
+                # font is unhashable (maybe a file-like object), so the text can't be cached
+                cache = False
+
+        if text_image is None:
+            text_image = Image.from_text(
+                string,
+                color=color,
+                font=font,
+                font_size=font_size,
+                antialias=antialias,
+                max_lines=max_lines,
+                max_width=max_width,
+                max_height=max_height,
+                align=_anchor(align)[0])
+
+            if cache:
+                text_cache.add_image(cache_key, text_image)
 
         self.image(text_image, xy=xy, align=align, scale=1)
 
+    def rich_text(self, spans, xy=None, color='grey', align='center', font=None, font_size=32,
+                  antialias=None, max_width=sys.maxsize, max_height=sys.maxsize,
+                  max_lines=sys.maxsize, cache=True):
+        """
+        Draws a paragraph of text made of spans in different colors, fonts and sizes. The text
+        wraps across the spans like a single string.
+
+        Args:
+            spans (list): The text to draw. Each item is a string, or a tuple (string, style)
+                where style is a dict that can contain 'color', 'font', 'font_size' and
+                'antialias'. Anything not in the style is taken from the arguments below.
+            xy (tuple): The position (x, y) to draw the text, as measured from the top-left.
+            color (tuple or str): The color (r, g, b) or color name.
+            align (str): How to align the text relative to `xy`, or relative to the drawing surface
+                if `xy` is None. Defaults to 'center'.
+            font (str): The filename of the font to use.
+            font_size (int): The size to render the font.
+            antialias (bool): Set to false to draw pixel fonts.
+            max_width (int): The maximum width of the text in pixels.
+                If `xy` is not specified, defaults to the width of the drawing surface. Otherwise,
+                defaults to unlimited.
+            max_height (int): The maximum height of the text in pixels.
+                If `xy` is not specified, defaults to the width of the drawing surface. Otherwise,
+                defaults to unlimited.
+            max_lines (int): The maximum number of lines to use. By default, unlimited.
+            cache (bool): Whether to keep the rendered text, so drawing the same text again is
+                quicker. Defaults to True.
+        """
+        if xy is None:
+            if max_width == sys.maxsize:
+                max_width = self.width
+            if max_height == sys.maxsize:
+                max_height = self.height
+
+        text_image = None
+
+        if cache:
+            cache_key = ('rich_text', _spans_cache_key(spans), tuple(_color(color)), font,
+                         font_size, antialias, max_width, max_height, max_lines, align)
+
+            try:
+                text_image = text_cache.get_image(cache_key)
+            except TypeError:
+                # a font is unhashable (maybe a file-like object), so the text can't be cached
+                cache = False
+
+        if text_image is None:
+            text_image = Image.from_spans(
+                spans,
+                color=color,
+                font=font,
+                font_size=font_size,
+                antialias=antialias,
+                max_lines=max_lines,
+                max_width=max_width,
+                max_height=max_height,
+                align=_anchor(align)[0])
+
+            if cache:
+                text_cache.add_image(cache_key, text_image)
+
+        self.image(text_image, xy=xy, align=align, scale=1)
+
+    def _text_from_glyphs(self, string, xy, color, align, font, font_size, antialias,
+                          max_width, max_height, max_lines):
+        font, antialias = _font(font, font_size, antialias)
+        font_metrics = font_metrics_cache.get_metrics(font)
+        atlas = glyph_atlas_cache.get_atlas(font, antialias, _color(color), font_metrics)
+
+        lines = font_metrics.lines(
+            unicode(string), _max_lines(font, max_lines, max_height), max_width)
+        size = font_metrics.size(lines)
+
+        topleft = _topleft_from_aligned_xy(xy, align, size, self.size)
+        dirty_rect = atlas.draw(self.surface, lines, topleft, align=_anchor(align)[0])
+        self._mark_dirty(dirty_rect)
+
+    def text_size(self, string, font=None, font_size=32, antialias=None, max_width=sys.maxsize,
+                  max_height=sys.maxsize, max_lines=sys.maxsize):
+        """
+        Measures text without drawing it. Useful for laying out text, or drawing a background
+        behind it.
+
+        Args:
+            string: The text to measure.
+            font (str): The filename of the font to use.
+            font_size (int): The size to render the font.
+            antialias (bool): Set to false to draw pixel fonts.
+            max_width (int): The maximum width of the text in pixels. Defaults to unlimited.
+            max_height (int): The maximum height of the text in pixels. Defaults to unlimited.
+            max_lines (int): The maximum number of lines to use. By default, unlimited.
+
+        Returns:
+            The size (width, height) that the text would take up when drawn with :py:meth:`text`
+            using the same arguments.
+        """
+        font, antialias = _font(font, font_size, antialias)
+        font_metrics = font_metrics_cache.get_metrics(font)
+
+        lines = font_metrics.lines(
+            unicode(string), _max_lines(font, max_lines, max_height), max_width)
+
+        return font_metrics.size(lines)
+
     def oval(self, xy=None, size=(150,100), color='grey', align='center'):
         """
         Draws an oval.
@@ -246,12 +812,21 @@ class Surface(object):
         rect = pygame.Rect(xy, size)
 
         if len(color) == 4 and color[3] < 255:
-            # need to draw to a second buffer then blit to have transparency
-            draw_surface = pygame.Surface(rect.size, pygame.SRCALPHA)
-            pygame.draw.ellipse(draw_surface, color, pygame.Rect((0, 0), rect.size), 0)
-            self.surface.blit(draw_surface, rect)
+            # need to draw to a second buffer then blit to have transparency. Only the part of the
+            # oval that's on this surface is drawn.
+            visible_rect = rect.clip(self.surface.get_rect())
+
+            if visible_rect.width == 0 or visible_rect.height == 0:
+                # nothing to draw, it's off the surface
+                return
+
+            oval_rect = rect.move(-visible_rect.x, -visible_rect.y)
+            draw_surface = scratch_surface.with_oval(visible_rect.size, oval_rect, color)
+            dirty_rect = self.surface.blit(draw_surface, visible_rect, pygame.Rect((0, 0), visible_rect.size))
         else:
-            pygame.draw.ellipse(self.surface, color, rect, 0)
+            dirty_rect = pygame.draw.ellipse(self.surface, color, rect, 0)
+
+        self._mark_dirty(dirty_rect)
 
     def circle(self, xy=None, size=100, color='grey', align='center'):
         """
@@ -309,7 +884,7 @@ class Surface(object):
         # http://stackoverflow.com/q/24208783/382749) so antialiasing isn't currently supported.
 
         if width == 1:
-            pygame.draw.line(self.surface, _color(color), start_xy, end_xy, width)
+            dirty_rect = pygame.draw.line(self.surface, _color(color), start_xy, end_xy, width)
         else:
             # we use a polygon to draw thick lines because the pygame line function has a very
             # strange line cap
@@ -330,11 +905,107 @@ class Surface(object):
                 _xy_subtract(start_xy, perpendicular_offset),
             )
 
-            pygame.draw.polygon(self.surface, _color(color), points)
+            dirty_rect = pygame.draw.polygon(self.surface, _color(color), points)
+
+        self._mark_dirty(dirty_rect)
+
+    def points(self, xy, color='grey'):
+        """
+        Draws many single-pixel points in one go. This is much quicker than drawing each point
+        separately. Needs NumPy.
+
+        Args:
+            xy: The positions (x, y) of the points. Either a list of tuples, or a NumPy array with
+                the shape (n, 2).
+            color (tuple or str): The color (r, g, b) or color name. Points are drawn opaque.
+        """
+        import numpy, pygame.surfarray
+
+        xy = numpy.asarray(xy).reshape(-1, 2).astype(int)
+        x, y = xy[:, 0], xy[:, 1]
+
+        width, height = self.size
+        on_surface = (x >= 0) & (x < width) & (y >= 0) & (y < height)
+        x, y = x[on_surface], y[on_surface]
+
+        if len(x) == 0:
+            return
+
+        color = _color(color)
+
+        if self.surface.get_bytesize() == 3:
+            # pixels2d doesn't support 24-bit surfaces
+            pixels = pygame.surfarray.pixels3d(self.surface)
+            pixels[x, y] = color[:3]
+        else:
+            pixels = pygame.surfarray.pixels2d(self.surface)
+            pixels[x, y] = self.surface.map_rgb(color)
+
+        # release the lock on the surface
+        del pixels
+
+        left, top = x.min(), y.min()
+        self._mark_dirty(pygame.Rect(left, top, x.max() - left + 1, y.max() - top + 1))
+
+    def polyline(self, xy, width=1, color='grey', closed=False):
+        """
+        Draws a line through a sequence of points in one go.
+
+        Args:
+            xy: The positions (x, y) of the points. Either a list of tuples, or a NumPy array with
+                the shape (n, 2).
+            width (int): The thickness of the line in pixels. Defaults to 1.
+            color (tuple or str): The color (r, g, b) or color name.
+            closed (bool): If True, the last point is joined to the first. Defaults to False.
+        """
+        if hasattr(xy, 'tolist'):
+            # convert NumPy arrays to a list in one go
+            xy = xy.tolist()
+
+        if len(xy) < 2:
+            return
+
+        dirty_rect = pygame.draw.lines(self.surface, _color(color), closed, xy, width)
+        self._mark_dirty(dirty_rect)
+
+    @contextlib.contextmanager
+    def pixels(self):
+        """
+        Gives direct access to the surface's pixels as a NumPy array, for use in a ``with``
+        statement. The array shares memory with the surface, so changes to it are shown straight
+        away. It's indexed [x, y, channel], where the channels are red, green and blue. Needs NumPy.
+
+        On 16-bit surfaces, like the Tingbot's screen, the array is a copy of the pixels that is
+        written back to the surface when the ``with`` block ends.
+
+        The array can only be used inside the ``with`` block.
+
+        Example:
+
+            with screen.pixels() as pixels:
+                pixels[:, 100] = (255, 0, 0)
+        """
+        import pygame.surfarray
+
+        if self.surface.get_bytesize() == 2:
+            # pygame can't give a 3D view of packed 16-bit pixels
+            pixels = PackedPixelView(self.surface)
+        elif self.surface.get_bytesize() == 1:
+            raise ValueError('pixels() does not support 8-bit surfaces')
+        else:
+            pixels = PixelView(pygame.surfarray.pixels3d(self.surface))
+
+        try:
+            yield pixels
+        finally:
+            # release the lock on the surface, even if the caller keeps a reference
+            pixels.close()
+            self._mark_dirty(self.surface.get_rect())
 
     def image(self, image, xy=None, scale='shrinkToFit', alpha=1.0, align='center',
-              max_width=sys.maxsize, max_height=sys.maxsize, raise_error=True):
-        """screen.image(image, xy=None, scale='shrinkToFit', alpha=1.0, align='center', max_width=sys.maxsize, max_height=sys.maxsize, raise_error=True)
+              max_width=sys.maxsize, max_height=sys.maxsize, raise_error=True,
+              async_load=False, placeholder=None):
+        """screen.image(image, xy=None, scale='shrinkToFit', alpha=1.0, align='center', max_width=sys.maxsize, max_height=sys.maxsize, raise_error=True, async_load=False, placeholder=None)
 
         Draws an image to the screen.
 
@@ -353,6 +1024,10 @@ class Surface(object):
             max_height (int): When `scale` is 'fit', 'fill', 'shrinkToFit' used to size the image.
             raise_error (bool): When loading an image from a URL, whether to raise an error if
                 loading fails. Defaults to True. If false, a placeholder image will be substituted.
+            async_load (bool): When `image` is a filename or URL, load it in the background
+                rather than waiting for it. Until it's loaded, `placeholder` is drawn instead.
+            placeholder (str or Image): What to draw while the image is loading, when
+                `async_load` is True. Defaults to None, which draws nothing.
 
         Images can be animated GIFs. Draw them in a draw() function to see them animate.
 
@@ -363,14 +1038,32 @@ class Surface(object):
             requests.exceptions.RequestException: The image couldn't be loaded from URL.
         """
 
+        location = None
+
         if isinstance(image, basestring):
+            location = image
             try:
-                image = image_cache.get_image(image)
+                if async_load:
+                    image = image_cache.get_image_async(location)
+                else:
+                    image = image_cache.get_image(location)
             except IOError:
                 if raise_error:
                     raise
                 else:
-                    image = image_cache.get_image(broken_image_file)
+                    location = broken_image_file
+                    image = image_cache.get_image(location)
+
+            if image is None:
+                # still loading in the background
+                if placeholder is None:
+                    return
+                elif isinstance(placeholder, basestring):
+                    location = placeholder
+                    image = image_cache.get_image(location)
+                else:
+                    location = None
+                    image = placeholder
 
         if hasattr(image, 'surface'):
             image_size = image.size
@@ -401,39 +1094,149 @@ class Surface(object):
 
         scale = _scale(scale)
 
-        # blit_surface is a temporary variable to minimise copying on each tranformation
-        blit_surface = surface
-
         if scale != (1, 1):
             image_size = _xy_multiply(image_size, scale)
             image_size = tuple(int(d) for d in image_size)
-            try:
-                blit_surface = pygame.transform.smoothscale(surface, image_size)
-            except ValueError:
-                blit_surface = pygame.transform.scale(surface, image_size)
 
-        if alpha < 1.0:
-            # only copy the surface if required
-            if blit_surface is surface:
-                blit_surface = surface.copy()
+        if image_size == surface.get_size() and alpha >= 1.0:
+            blit_surface = surface
+        elif location is not None and isinstance(image, Image):
+            # images in the image cache don't change, so the transformed surface can be reused
+            # until the image is removed from the cache
+            cache_key = (location, image_size, alpha)
+            transformed_image = transformed_image_cache.get_image(cache_key)
 
-            # multipling the pixels' color components with white does nothing, so this only
-            # changes the alpha of the image
-            blit_surface.fill((255, 255, 255, alpha*255), None, pygame.BLEND_RGBA_MULT)
+            if transformed_image is None:
+                transformed_image = Image(surface=_transform(surface, image_size, alpha))
+                transformed_image_cache.add_image(cache_key, transformed_image)
+
+            blit_surface = transformed_image.surface
+        else:
+            blit_surface = _transform(surface, image_size, alpha)
 
         xy = _topleft_from_aligned_xy(xy, align, image_size, self.size)
 
-        self.surface.blit(blit_surface, xy)
+        self._mark_dirty(self.surface.blit(blit_surface, xy))
+
+    def record(self):
+        """
+        Returns a :py:class:`DisplayList` that records drawing calls, so they can be drawn to this
+        surface again with a single blit. Use it in a ``with`` statement - the drawing is shown
+        on this surface when the block ends.
+
+        Translucent drawing is blended the same as when drawing directly, as long as NumPy is
+        installed. Without it, overlapping translucent shapes in a recording come out darker.
+
+        Example:
+
+            with screen.record() as background:
+                background.fill(color='black')
+                background.text('Weather', xy=(160, 20), color='white')
+
+            def loop():
+                background.draw()
+                screen.text(temperature)
+        """
+        return DisplayList(self)
+
+
+class PixelView(object):
+    """
+    The object given by :py:meth:`Surface.pixels`. It can be used like the NumPy array of the
+    pixels until it's closed.
+    """
+    def __init__(self, array):
+        self._array = array
+
+    @property
+    def array(self):
+        if self._array is None:
+            raise ValueError('pixels can only be used inside the with block')
+        return self._array
+
+    def close(self):
+        self._array = None
+
+    def __getitem__(self, index):
+        return self.array[index]
+
+    def __setitem__(self, index, value):
+        self.array[index] = value
+
+    def __len__(self):
+        return len(self.array)
+
+    def __array__(self, dtype=None):
+        return self.array if dtype is None else self.array.astype(dtype)
+
+    def __getattr__(self, name):
+        # pass through other attributes (e.g. 'shape') to the array
+        return getattr(self.array, name)
+
+
+class PackedPixelView(PixelView):
+    """
+    A PixelView of a 16-bit surface. The pixels are unpacked into an [x, y, channel] array, which
+    is packed back into the surface when it's closed.
+    """
+    def __init__(self, surface):
+        import numpy, pygame.surfarray
+
+        self._packed = pygame.surfarray.pixels2d(surface)
+        self._channels = list(zip(surface.get_masks()[:3], surface.get_shifts()[:3],
+                                  surface.get_losses()[:3]))
+
+        packed = self._packed.astype(numpy.uint32)
+        array = numpy.empty(packed.shape + (3,), numpy.uint8)
+
+        for i, (mask, shift, loss) in enumerate(self._channels):
+            # scale each channel up to the full 0-255 range
+            max_value = 0xff >> loss
+            array[..., i] = ((packed & mask) >> shift) * 255 // max_value
+
+        super(PackedPixelView, self).__init__(array)
+
+    def close(self):
+        import numpy
+
+        if self._array is not None:
+            array = self._array.astype(numpy.uint32)
+            rgb_mask = 0
+            packed = numpy.zeros(array.shape[:2], numpy.uint32)
+
+            for i, (mask, shift, loss) in enumerate(self._channels):
+                packed |= ((array[..., i] >> loss) << shift) & mask
+                rgb_mask |= mask
+
+            # keep any other bits, like alpha
+            packed |= self._packed.astype(numpy.uint32) & numpy.uint32(~rgb_mask & 0xffff)
+            self._packed[...] = packed
+            # release the lock on the surface
+            self._packed = None
+
+        super(PackedPixelView, self).close()
 
 
 class Screen(Surface):
     """
     The class of the singleton :py:data:`screen` object.
     """
+    # if the changed area is more than this fraction of the screen, the whole screen is updated
+    # in one go, rather than piece-by-piece
+    full_update_threshold = 0.5
+
+    # if more than this many separate areas are changed, the whole screen is updated instead.
+    # Merging each new area into a long list gets slow, and so does updating lots of small areas
+    max_dirty_rects = 32
+
     def __init__(self):
         super(Screen, self).__init__()
         self.needs_update = False
         self.has_surface = False
+        self.dirty_rects = []
+        # functions called as listener(surface, rects) after each update, see add_update_listener
+        self.update_listeners = []
+        self.recorder = None
         self._brightness = 75
 
     def _create_surface(self):
@@ -446,37 +1249,104 @@ class Screen(Surface):
         # setup pygame.display by calling the self.surface getter
         self.surface
 
+    def _mark_dirty(self, rect):
+        rect = rect.clip(self.surface.get_rect())
+
+        if rect.width == 0 or rect.height == 0:
+            return
+
+        # merge the new rect with any that it overlaps, so no area is updated twice
+        overlapping_index = rect.collidelist(self.dirty_rects)
+
+        while overlapping_index != -1:
+            rect.union_ip(self.dirty_rects.pop(overlapping_index))
+            overlapping_index = rect.collidelist(self.dirty_rects)
+
+        if len(self.dirty_rects) >= self.max_dirty_rects:
+            # the whole screen is marked, and anything drawn after merges into it straight away
+            self.dirty_rects = [self.surface.get_rect()]
+        else:
+            self.dirty_rects.append(rect)
+
+        self.needs_update = True
+
+    def _pop_dirty_rects(self):
+        '''
+        Returns the list of changed rects since the last update, or None if the whole screen
+        should be updated.
+        '''
+        dirty_rects = self.dirty_rects
+        self.dirty_rects = []
+
+        if len(dirty_rects) == 0:
+            # nothing has been drawn through the drawing methods, but update has been called, so
+            # the surface might have been changed directly.
+            return None
+
+        dirty_area = sum(r.width * r.height for r in dirty_rects)
+        screen_area = self.width * self.height
+
+        if dirty_area > screen_area * self.full_update_threshold:
+            return None
+
+        return dirty_rects
+
     def update(self):
-        pygame.display.update()
+        """
+        Pushes the changes made since the last update to the display. Only the areas that have been
+        drawn to are updated.
+        """
+        from . import platform_specific
+
+        dirty_rects = self._pop_dirty_rects()
+        platform_specific.update_display(self.surface, dirty_rects)
         self.needs_update = False
 
-    def fill(self, *args, **kwargs):
-        super(Screen, self).fill(*args, **kwargs)
-        self.needs_update = True
+        for listener in self.update_listeners:
+            listener(self.surface, dirty_rects)
 
-    def text(self, *args, **kwargs):
-        super(Screen, self).text(*args, **kwargs)
-        self.needs_update = True
+    def add_update_listener(self, listener):
+        """
+        Calls `listener(surface, rects)` after every update of the screen, where `rects` is the
+        list of areas that were updated, or None if the whole screen was.
+        """
+        self.update_listeners.append(listener)
 
-    def oval(self, *args, **kwargs):
-        super(Screen, self).oval(*args, **kwargs)
-        self.needs_update = True
+    def remove_update_listener(self, listener):
+        self.update_listeners.remove(listener)
 
-    def circle(self, *args, **kwargs):
-        super(Screen, self).circle(*args, **kwargs)
-        self.needs_update = True
+    def start_recording(self, path, fps=10):
+        """
+        Starts recording what's shown on the screen. Frames are saved in the background, so the
+        app doesn't slow down - if the saving can't keep up, some frames are skipped.
 
-    def rectangle(self, *args, **kwargs):
-        super(Screen, self).rectangle(*args, **kwargs)
-        self.needs_update = True
+        Args:
+            path (str): If this ends with '.gif', the recording is saved as an animated GIF,
+                written as the frames are captured. Otherwise, it's a directory that each frame
+                is saved to as a PNG.
+            fps (number): The maximum number of frames to record per second.
+        """
+        from .recording import Recorder
 
-    def line(self, *args, **kwargs):
-        super(Screen, self).line(*args, **kwargs)
-        self.needs_update = True
+        if self.recorder is not None:
+            raise RuntimeError('The screen is already being recorded')
 
-    def image(self, *args, **kwargs):
-        super(Screen, self).image(*args, **kwargs)
-        self.needs_update = True
+        self.recorder = Recorder(path, fps=fps)
+        self.recorder.start()
+        self.add_update_listener(self.recorder.capture)
+
+    def stop_recording(self):
+        """
+        Stops recording, and waits for the recording to be saved.
+        """
+        recorder = self.recorder
+
+        if recorder is None:
+            return
+
+        self.remove_update_listener(recorder.capture)
+        self.recorder = None
+        recorder.stop()
 
     def update_if_needed(self):
         if self.needs_update:
@@ -511,22 +1381,25 @@ class Image(Surface):
     An image that can be loaded from a file, or created and drawn to separately from the screen.
     """
     @classmethod
-    def load(cls, filename):
+    def load(cls, filename, fit_to=None):
         """
         Open a local file as an Image.
 
         Args:
             filename (str): The filename of the image.
+            fit_to (tuple): If given, large JPEGs are decoded at a lower resolution, that is still
+                big enough to fill a (width, height) area of this size. This is much quicker and
+                uses less memory than loading the full image.
         """
-        return cls.load_filename(filename)
+        return cls.load_filename(filename, fit_to=fit_to)
 
     @classmethod
-    def load_filename(cls, filename):
+    def load_filename(cls, filename, fit_to=None):
         with open(filename, 'rb') as image_file:
-            return cls.load_file(image_file, name_hint=filename)
+            return cls.load_file(image_file, name_hint=filename, fit_to=fit_to)
 
     @classmethod
-    def load_url(cls, url):
+    def load_url(cls, url, fit_to=None):
         """
         Loads an image from a URL.
 
@@ -539,10 +1412,10 @@ class Image(Surface):
         response = requests.get(url)
         response.raise_for_status()
         image_file = io.BytesIO(response.content)
-        return cls.load_file(image_file, name_hint=url)
+        return cls.load_file(image_file, name_hint=url, fit_to=fit_to)
 
     @classmethod
-    def load_file(cls, file_object, name_hint='', loader='auto'):
+    def load_file(cls, file_object, name_hint='', loader='auto', fit_to=None):
         """
         Loads a file-like object as an image.
 
@@ -552,6 +1425,9 @@ class Image(Surface):
             loader (str): How to load the image, either 'gif', 'pil', 'pygame', or 'auto'.
                 If 'gif', a GIFImage will be returned. If 'auto', the name_hint is used to
                 choose the best loader.
+            fit_to (tuple): If given, images loaded with PIL are reduced by a whole number factor,
+                to near the smallest size that still fills (width, height). JPEGs are decoded
+                straight to the reduced size.
 
         Returns:
             An Image or GIFImage object, that can be used with screen.image() for example.
@@ -569,6 +1445,9 @@ class Image(Surface):
                 # https://bitbucket.org/pygame/pygame/issues/284/max-osx-el-capitan-using-the-deprecated
                 # Working around by loading with PIL instead.
                 loader = 'pil'
+            elif extension.lower() in ['.jpg', '.jpeg'] and fit_to is not None:
+                # PIL can decode JPEGs at a lower resolution
+                loader = 'pil'
             else:
                 loader = 'pygame'
 
@@ -576,13 +1455,18 @@ class Image(Surface):
             return GIFImage(image_file=file_object)
         elif loader == 'pil':
             from PIL import Image as PILImage
-            return cls.from_pil_image(PILImage.open(file_object))
+            pil_image = PILImage.open(file_object)
+
+            if fit_to is not None:
+                pil_image = _reduce_pil_image(pil_image, fit_to)
+
+            return cls.from_pil_image(pil_image)
         elif loader == 'pygame':
             # ensure the screen surface has been created (otherwise pygame doesn't know the 'video mode')
             screen.ensure_display_setup()
 
             surface = pygame.image.load(file_object)
-            surface = surface.convert_alpha()
+            surface = _convert_to_display_format(surface)
         else:
             raise ValueError('Unknown image loader: %r' % loader)
 
@@ -616,17 +1500,45 @@ class Image(Surface):
 
         from .typesetter import render_text
 
-        if max_height != sys.maxsize:
-            line_height = font.get_linesize()
-            max_lines_by_height = int(max_height//line_height)
+        max_lines = _max_lines(font, max_lines, max_height)
+
+        surface = render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u'…', align=align,
+                              font_metrics=font_metrics_cache.get_metrics(font))
+
+        return cls(surface=surface)
+
+    @classmethod
+    def from_spans(cls, spans, color='grey', font=None, font_size=32, antialias=None,
+                   max_lines=sys.maxsize, max_width=sys.maxsize, max_height=sys.maxsize, align=0):
+        """
+        Draws a paragraph of text made of spans in different styles to a new image.
+
+        Args:
+            spans (list): The text to draw. Each item is a string, or a tuple (string, style)
+                where style is a dict that can contain 'color', 'font', 'font_size' and
+                'antialias'. Anything not in the style is taken from the arguments below.
+            color (tuple or str): The color (r, g, b) or color name.
+            font (str): The filename of the font to use.
+            font_size (int): The size to render the font.
+            antialias (bool): Set to `False` to draw pixel fonts.
+            max_lines (int): The maximum number of lines to use. By default, unlimited.
+            max_width (int): The maximum width of the text in pixels.
+                Defaults to unlimited.
+            max_height (int): The maximum height of the text in pixels.
+                Defaults to unlimited.
+            align (number): A number specifying the horizontal alignment of the text. 0.0 is left
+                aligned, 0.5 is centered, 1.0 is right.
+        """
+        from .typesetter import render_spans
 
-            if max_lines_by_height < 1:
-                # never collapse the text to zero lines because of the height restriction
-                max_lines_by_height = 1
+        spans = _spans(spans, color, font, font_size, antialias)
 
-            max_lines = min(max_lines, max_lines_by_height)
+        if spans:
+            # lines are at most as tall as the tallest font
+            tallest_font = max((span.font for span in spans), key=lambda f: f.get_linesize())
+            max_lines = _max_lines(tallest_font, max_lines, max_height)
 
-        surface = render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u'…', align=align)
+        surface = render_spans(spans, max_lines, max_width, ellipsis=u'…', align=align)
 
         return cls(surface=surface)
 
@@ -635,16 +1547,7 @@ class Image(Surface):
         """
         Loads an image from a PIL Image.
         """
-        screen.ensure_display_setup()
-
-        try:  # account for different versions of Pillow
-            pygame_image = pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
-        except AttributeError:
-            pygame_image = pygame.image.fromstring(pil_image.tostring(), pil_image.size, pil_image.mode)
-
-        pygame_image.convert_alpha()
-
-        return cls(surface=pygame_image)
+        return cls(surface=_surface_from_pil_image(pil_image))
 
     def __init__(self, surface=None, size=None):
         pygame.init()
@@ -654,34 +1557,475 @@ class Image(Surface):
     def get_memory_usage(self):
         return self.surface.get_buffer().length
 
+def _alpha_over(destination, source, rect):
+    '''
+    Composites the `rect` area of `source` over the same area of `destination`, both 32-bit
+    surfaces with per-pixel alpha. Unlike a pygame blit, this is correct when the destination is
+    partly transparent.
+    '''
+    import numpy, pygame.surfarray
+
+    source = source.subsurface(rect)
+    destination = destination.subsurface(rect)
+
+    source_rgb = pygame.surfarray.array3d(source).astype(numpy.float32)
+    source_alpha = pygame.surfarray.array_alpha(source).astype(numpy.float32) / 255
+    destination_rgb = pygame.surfarray.pixels3d(destination)
+    destination_alpha = pygame.surfarray.pixels_alpha(destination)
+
+    destination_weight = destination_alpha.astype(numpy.float32) / 255 * (1 - source_alpha)
+    alpha = source_alpha + destination_weight
+
+    rgb = (source_rgb * source_alpha[..., numpy.newaxis]
+           + destination_rgb.astype(numpy.float32) * destination_weight[..., numpy.newaxis])
+    # fully transparent pixels stay black
+    rgb /= numpy.maximum(alpha, 1e-6)[..., numpy.newaxis]
+
+    destination_rgb[...] = numpy.rint(rgb)
+    destination_alpha[...] = numpy.rint(alpha * 255)
+
+def _recorded(method_name, composited=True):
+    surface_method = getattr(Surface, method_name)
+
+    def recorded_method(self, *args, **kwargs):
+        if self._is_recording:
+            self.calls.append((method_name, args, kwargs))
+
+        # stop recording while the method runs, in case it calls other drawing methods (e.g.
+        # circle calls oval)
+        was_recording = self._is_recording
+        self._is_recording = False
+
+        try:
+            if composited and self._drawn_rects is None:
+                return self._draw_composited(surface_method, args, kwargs)
+            else:
+                return surface_method(self, *args, **kwargs)
+        finally:
+            self._is_recording = was_recording
+
+    recorded_method.__name__ = method_name
+    recorded_method.__doc__ = surface_method.__doc__
+    return recorded_method
+
+class DisplayList(Image):
+    """
+    A layer the size of a target surface, that records the drawing calls made to it. Once
+    recorded, :py:meth:`draw` draws the layer to the target with a single blit.
+
+    Create one with :py:meth:`Surface.record`.
+    """
+    # these methods work with what's already on the layer, so they aren't composited
+    uncomposited_methods = ('scroll',)
+
+    def __init__(self, target):
+        self.target = target
+        self.calls = []
+        self.needs_redraw = False
+        self._is_recording = True
+        # while a call is being composited, the areas it drew to
+        self._drawn_rects = None
+        self._call_layer = None
+        super(DisplayList, self).__init__(surface=self._create_layer())
+
+    def _create_layer(self):
+        return pygame.Surface(self.target.size, pygame.SRCALPHA, 32)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.finish()
+            self.draw()
+
+    def finish(self):
+        '''
+        Stops recording, and prepares the layer for drawing.
+        '''
+        self._is_recording = False
+        self.surface = _convert_to_display_format(self.surface, self.target.surface)
+        # only the area that has been drawn to needs to be blitted
+        self.bounds = self.surface.get_bounding_rect()
+
+    def draw(self):
+        '''
+        Draws the recorded layer to the target surface.
+        '''
+        if self._is_recording:
+            self.finish()
+
+        if self.needs_redraw:
+            self._redraw()
+
+        dirty_rect = self.target.surface.blit(self.surface, self.bounds.topleft, self.bounds)
+        self.target._mark_dirty(dirty_rect)
+
+    def invalidate(self):
+        '''
+        Marks the layer to be redrawn from the recorded calls the next time it's drawn. Call this
+        if something that the drawing depends on has changed, like an image file or the size of
+        the target.
+        '''
+        self.needs_redraw = True
+
+    def clear(self):
+        '''
+        Forgets the recorded calls, and starts recording again.
+        '''
+        self.calls = []
+        self.surface = self._create_layer()
+        self.needs_redraw = False
+        self._is_recording = True
+
+    def _mark_dirty(self, rect):
+        if self._drawn_rects is not None:
+            self._drawn_rects.append(rect)
+
+    def _draw_composited(self, surface_method, args, kwargs):
+        '''
+        Calls `surface_method` to draw onto a clear layer of its own, then composites that over
+        this layer. Blitting translucent drawing straight onto the layer would give the wrong
+        colors where it overlaps other translucent drawing, because pygame's blending assumes an
+        opaque destination.
+        '''
+        layer = self.surface
+
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+
+        if numpy is None or not layer.get_flags() & pygame.SRCALPHA or layer.get_bitsize() != 32:
+            return surface_method(self, *args, **kwargs)
+
+        if self._call_layer is None or self._call_layer.get_size() != layer.get_size():
+            self._call_layer = pygame.Surface(layer.get_size(), pygame.SRCALPHA, 32)
+
+        self.surface = self._call_layer
+        self._drawn_rects = []
+
+        try:
+            result = surface_method(self, *args, **kwargs)
+        except:
+            self._call_layer = None
+            raise
+        finally:
+            self.surface = layer
+            drawn_rects, self._drawn_rects = self._drawn_rects, None
+
+        for rect in drawn_rects:
+            rect = rect.clip(layer.get_rect())
+
+            if rect.width > 0 and rect.height > 0:
+                _alpha_over(layer, self._call_layer, rect)
+                self._call_layer.fill((0, 0, 0, 0), rect)
+
+        return result
+
+    def _redraw(self):
+        self.surface = self._create_layer()
+
+        for method_name, args, kwargs in self.calls:
+            surface_method = getattr(Surface, method_name)
+
+            if method_name in self.uncomposited_methods:
+                surface_method(self, *args, **kwargs)
+            else:
+                self._draw_composited(surface_method, args, kwargs)
+
+        self.needs_redraw = False
+        self.finish()
+
+    fill = _recorded('fill')
+    scroll = _recorded('scroll', composited=False)
+    text = _recorded('text')
+    rich_text = _recorded('rich_text')
+    oval = _recorded('oval')
+    circle = _recorded('circle')
+    rectangle = _recorded('rectangle')
+    line = _recorded('line')
+    points = _recorded('points')
+    polyline = _recorded('polyline')
+    image = _recorded('image')
+
+
+class Console(Image):
+    """
+    A block of text that scrolls up as lines are added to the bottom, like a terminal. Useful for
+    logs and chat messages. Draw it with :py:meth:`Surface.image`.
+
+    Only the text that's added is laid out and rendered - the rest is scrolled up. The most recent
+    `scrollback` lines are kept, to be scrolled back to with :py:meth:`scroll_up`.
+    """
+    def __init__(self, size=(320, 240), color='white', background_color='black', font=None,
+                 font_size=14, antialias=None, scrollback=1000):
+        if background_color is None:
+            surface = pygame.Surface(size, pygame.SRCALPHA, 32)
+            self.background_color = (0, 0, 0, 0)
+        else:
+            surface = pygame.Surface(size, 0, 32)
+            self.background_color = _color(background_color)
+
+        super(Console, self).__init__(surface=surface)
+
+        self.color = _color(color)
+        self.font, self.antialias = _font(font, font_size, antialias)
+        self.font_metrics = font_metrics_cache.get_metrics(self.font)
+        self.row_height = self.font.get_height()
+        self.visible_rows = max(1, self.height // self.row_height)
+
+        # the wrapped text of each row, oldest first
+        self.rows = collections.deque(maxlen=scrollback)
+        # the number of rows ever added, so rows have an index that doesn't change as old ones
+        # are dropped
+        self.row_count = 0
+        # the text of the last line, which doesn't end in a newline yet
+        self.partial_line = u''
+        self.partial_line_row_count = 0
+        # the number of rows scrolled back from the bottom
+        self.scroll_offset = 0
+        # the index of the row at the top of the surface
+        self.first_row = 0
+
+        self._redraw()
+
+    def write(self, string):
+        """
+        Adds `string` to the end of the text. Lines must be ended with a newline character.
+
+        Args:
+            string: The text to add.
+        """
+        string = unicode(string)
+
+        # the last line could wrap differently now, so it's laid out again
+        removed_row_count = self.partial_line_row_count
+
+        for i in xrange(min(removed_row_count, len(self.rows))):
+            self.rows.pop()
+
+        self.row_count -= removed_row_count
+        changed_row = self.row_count
+
+        lines = (self.partial_line + string).split(u'\n')
+        self.partial_line = lines.pop()
+        new_rows = []
+
+        for line in lines:
+            new_rows.extend(self._wrap(line))
+
+        partial_rows = self._wrap(self.partial_line) if self.partial_line else []
+        new_rows.extend(partial_rows)
+
+        self.partial_line_row_count = len(partial_rows)
+        self.rows.extend(new_rows)
+        self.row_count += len(new_rows)
+
+        if self.scroll_offset > 0:
+            # keep showing the same rows, unless they've been dropped from the scrollback
+            max_offset = max(0, len(self.rows) - self.visible_rows)
+            self.scroll_offset = min(self.scroll_offset + len(new_rows) - removed_row_count,
+                                     max_offset)
+
+        first_row = self._first_row_for_offset()
+        shift = first_row - self.first_row
+
+        if 0 <= shift < self.visible_rows:
+            if shift > 0:
+                self._scroll_rows(shift)
+            self.first_row = first_row
+
+            if shift > 0:
+                # the rows moved up into view at the bottom
+                changed_row = min(changed_row, first_row + self.visible_rows - shift)
+
+            self._draw_rows(max(changed_row, first_row), first_row + self.visible_rows)
+        else:
+            self.first_row = first_row
+            self._redraw()
+
+    def writeline(self, string=u''):
+        """
+        Adds `string` to the end of the text, followed by a newline.
+        """
+        self.write(unicode(string) + u'\n')
+
+    def clear(self):
+        """
+        Removes all the text.
+        """
+        self.rows.clear()
+        self.partial_line = u''
+        self.partial_line_row_count = 0
+        self.scroll_offset = 0
+        self.first_row = self.row_count
+        self._redraw()
+
+    def scroll_up(self, lines=1):
+        """
+        Scrolls back to show older text.
+
+        Args:
+            lines (int): The number of rows to scroll by.
+        """
+        self._scroll_to_offset(self.scroll_offset + lines)
+
+    def scroll_down(self, lines=1):
+        """
+        Scrolls forward to show newer text.
+
+        Args:
+            lines (int): The number of rows to scroll by.
+        """
+        self._scroll_to_offset(self.scroll_offset - lines)
+
+    def scroll_to_bottom(self):
+        """
+        Scrolls forward to show the most recent text.
+        """
+        self._scroll_to_offset(0)
+
+    def _scroll_to_offset(self, offset):
+        max_offset = max(0, len(self.rows) - self.visible_rows)
+        self.scroll_offset = min(max(offset, 0), max_offset)
+
+        first_row = self._first_row_for_offset()
+        shift = first_row - self.first_row
+
+        if shift == 0:
+            return
+        elif abs(shift) < self.visible_rows:
+            self._scroll_rows(shift)
+            self.first_row = first_row
+
+            if shift > 0:
+                self._draw_rows(first_row + self.visible_rows - shift,
+                                first_row + self.visible_rows)
+            else:
+                self._draw_rows(first_row, first_row - shift)
+        else:
+            self.first_row = first_row
+            self._redraw()
+
+    def _scroll_rows(self, shift):
+        self.scroll(dy=-shift * self.row_height)
+
+        # rows aren't drawn in the gap at the bottom that's less than a row high
+        rows_bottom = self.visible_rows * self.row_height
+        self.surface.fill(self.background_color,
+                          pygame.Rect(0, rows_bottom, self.width, self.height - rows_bottom))
+
+    def _first_row_for_offset(self):
+        oldest_row = self.row_count - len(self.rows)
+        return max(oldest_row, self.row_count - self.visible_rows - self.scroll_offset)
+
+    def _wrap(self, line):
+        line = line.expandtabs(4)
+
+        if not line:
+            return [line]
+
+        return [l.string for l in self.font_metrics.lines(line, sys.maxsize, self.width)]
+
+    def _draw_rows(self, start, end):
+        '''
+        Draws the rows with indexes from `start` to `end`, in their place on the surface.
+        '''
+        start = max(start, self.first_row)
+        end = min(end, self.first_row + self.visible_rows)
+
+        if start >= end:
+            return
+
+        top = (start - self.first_row) * self.row_height
+        self.surface.fill(self.background_color,
+                          pygame.Rect(0, top, self.width, (end - start) * self.row_height))
+
+        oldest_row = self.row_count - len(self.rows)
+
+        for row in xrange(start, min(end, self.row_count)):
+            string = self.rows[row - oldest_row]
+
+            if string:
+                rendered = self.font.render(string, self.antialias, self.color)
+                self.surface.blit(rendered, (0, (row - self.first_row) * self.row_height))
+
+    def _redraw(self):
+        self.surface.fill(self.background_color)
+        self._draw_rows(self.first_row, self.first_row + self.visible_rows)
+
+
 class GIFImage(Surface):
-    def __init__(self, image_file): # image_file can be either a file-like object or filename
+    """
+    An animated GIF. When drawn, the frame that is shown depends on the time.
+
+    By default, the animation starts when it's first drawn and plays according to the system
+    clock. To control it, set `clock` to a function that returns the current time in seconds, for
+    example ``gif.clock = main_run_loop.time``, so that all the GIFs drawn by an action use the same
+    time. The animation can also be paused, or moved to a different position.
+    """
+    # GIFs that would use more than this many bytes once decoded are decoded a few frames at a
+    # time, as they are shown, rather than all at once.
+    streaming_threshold = 2*10**6
+
+    # the number of decoded frames that are kept in memory when streaming
+    streaming_frame_window = 8
+
+    def __init__(self, image_file, streaming='auto'): # image_file can be either a file-like object or filename
         pygame.init()
         from PIL import Image as PILImage
-        self.frames = self._get_frames(PILImage.open(image_file))
-        self.total_duration = sum(f[1] for f in self.frames)
 
-    def _get_frames(self, pil_image):
-        result = []
+        if isinstance(image_file, basestring):
+            with open(image_file, 'rb') as f:
+                data = f.read()
+        else:
+            data = image_file.read()
+
+        pil_image = PILImage.open(io.BytesIO(data))
+        durations = _gif_frame_durations(data)
+
+        if streaming == 'auto':
+            width, height = pil_image.size
+            streaming = len(durations) * width * height * 4 > self.streaming_threshold
+
+        if streaming and len(durations) > 0:
+            # keep the PIL image, which holds the compressed data, and decode frames when they're
+            # needed
+            self.pil_image = pil_image
+            self.pil_image_memory_usage = len(data) + _pil_decoder_memory_usage(pil_image)
+            self.frames = None
+            self.decoded_frames = collections.OrderedDict()
+        else:
+            self.pil_image = None
+            self.frames = self._get_frames(pil_image)
+            durations = [duration for _, duration in self.frames]
 
-        pal = pil_image.getpalette()
-        base_palette = []
-        for i in range(0, len(pal), 3):
-            rgb = pal[i:i+3]
-            base_palette.append(rgb)
+        self.durations = durations
 
-        all_tiles = []
-        try:
-            while 1:
-                if not pil_image.tile:
-                    pil_image.seek(0)
-                if pil_image.tile:
-                    all_tiles.append(pil_image.tile[0][3][0])
-                pil_image.seek(pil_image.tell() + 1)
-        except EOFError:
-            pil_image.seek(0)
+        # the time that each frame finishes, from the start of the animation
+        self.frame_end_times = []
+        frame_end_time = 0
+
+        for duration in durations:
+            frame_end_time += duration
+            self.frame_end_times.append(frame_end_time)
+
+        self.total_duration = frame_end_time
+        self.clock = time.time
+        self.start_time = None
+        self.paused_position = None
+
+        if self.is_streaming:
+            # decode the first frame now, to find out how much memory each frame uses
+            self.frame_memory_usage = self._get_frame(0).get_buffer().length
 
-        all_tiles = tuple(set(all_tiles))
+    @property
+    def is_streaming(self):
+        return self.frames is None
+
+    def _get_frames(self, pil_image):
+        result = []
 
         while 1:
             try:
@@ -689,35 +2033,8 @@ class GIFImage(Surface):
             except KeyError:
                 duration = 0.1
 
-            if all_tiles:
-                if all_tiles in ((6,), (7,)):
-                    pal = pil_image.getpalette()
-                    palette = []
-                    for i in range(0, len(pal), 3):
-                        rgb = pal[i:i+3]
-                        palette.append(rgb)
-                elif all_tiles in ((7, 8), (8, 7)):
-                    pal = pil_image.getpalette()
-                    palette = []
-                    for i in range(0, len(pal), 3):
-                        rgb = pal[i:i+3]
-                        palette.append(rgb)
-                else:
-                    palette = base_palette
-            else:
-                palette = base_palette
-            try:  # account for different versions of Pillow
-                pygame_image = pygame.image.fromstring(pil_image.tobytes(), pil_image.size, pil_image.mode)
-            except AttributeError:
-                pygame_image = pygame.image.fromstring(pil_image.tostring(), pil_image.size, pil_image.mode)
-
-            screen.ensure_display_setup()
-            pygame_image.set_palette(palette)
+            result.append([self._surface_from_frame(pil_image), duration])
 
-            if "transparency" in pil_image.info:
-                pygame_image.set_colorkey(pil_image.info["transparency"])
-
-            result.append([pygame_image, duration])
             try:
                 pil_image.seek(pil_image.tell() + 1)
             except EOFError:
@@ -725,25 +2042,102 @@ class GIFImage(Surface):
 
         return result
 
+    def _surface_from_frame(self, pil_image):
+        return _surface_from_pil_image(pil_image)
+
+    def _get_frame(self, frame_index):
+        if not self.is_streaming:
+            return self.frames[frame_index][0]
+
+        try:
+            surface = self.decoded_frames.pop(frame_index)
+        except KeyError:
+            try:
+                # PIL decodes the frames in between, or rewinds if going backwards
+                self.pil_image.seek(frame_index)
+            except EOFError:
+                # the file has fewer frames than were counted. Show the last frame instead.
+                pass
+            surface = self._surface_from_frame(self.pil_image)
+
+        # (re)insert the frame at the end, so the least recently shown frames are at the start
+        self.decoded_frames[frame_index] = surface
+
+        while len(self.decoded_frames) > self.streaming_frame_window:
+            self.decoded_frames.popitem(last=False)
+
+        return surface
+
     @property
     def surface(self):
-        current_time = time.time()
+        return self.frame_at(self.position)
+
+    def frame_at(self, position):
+        """
+        Returns the frame shown at `position` seconds into the animation, as a pygame Surface.
+        """
+        try:
+            position = position % self.total_duration
+        except ZeroDivisionError:
+            position = 0
+
+        frame_index = bisect.bisect_left(self.frame_end_times, position)
+        # guard against floating point rounding at the end of the animation
+        frame_index = min(frame_index, len(self.durations) - 1)
+
+        return self._get_frame(frame_index)
 
-        if not hasattr(self, 'start_time'):
+    @property
+    def position(self):
+        """
+        The current position in the animation, in seconds. Set this to move to a different part of
+        the animation.
+        """
+        if self.paused_position is not None:
+            return self.paused_position
+
+        current_time = self.clock()
+
+        if self.start_time is None:
             self.start_time = current_time
 
         try:
-            gif_time = (current_time - self.start_time) % self.total_duration
+            return (current_time - self.start_time) % self.total_duration
         except ZeroDivisionError:
-            gif_time = 0
+            return 0
+
+    @position.setter
+    def position(self, position):
+        if self.paused_position is not None:
+            self.paused_position = position
+        else:
+            self.start_time = self.clock() - position
 
-        frame_time = 0
+    @property
+    def is_playing(self):
+        return self.paused_position is None
 
-        for surface, duration in self.frames:
-            frame_time += duration
+    def pause(self):
+        """
+        Stops the animation at the current frame.
+        """
+        if self.is_playing:
+            self.paused_position = self.position
 
-            if frame_time >= gif_time:
-                return surface
+    def play(self):
+        """
+        Continues the animation from where it was paused.
+        """
+        if not self.is_playing:
+            position = self.paused_position
+            self.paused_position = None
+            self.position = position
 
     def get_memory_usage(self):
+        if self.is_streaming:
+            # report the most memory this GIF will use, so the image cache's total stays the same
+            # as frames are decoded and discarded
+            decoded_frame_count = min(len(self.durations), self.streaming_frame_window)
+            return self.pil_image_memory_usage + decoded_frame_count * self.frame_memory_usage
+
         return sum(x[0].get_buffer().length for x in self.frames)
@@ -2,6 +2,7 @@ import pygame
 import sys
 from collections import namedtuple
 from .utils import call_with_optional_arguments
+from . import platform_specific
 from .graphics import screen, _topleft_from_aligned_xy, _xy_add, _xy_subtract
 
 mouse_down = False
@@ -34,13 +35,13 @@ class EventHandler(object):
 
 def handle_events(event):
     if event.type == pygame.MOUSEBUTTONDOWN:
-        mouse_down(pygame.mouse.get_pos())
+        mouse_down(platform_specific.from_window_coordinates(pygame.mouse.get_pos()))
 
     elif event.type == pygame.MOUSEMOTION:
-        mouse_move(pygame.mouse.get_pos())
+        mouse_move(platform_specific.from_window_coordinates(pygame.mouse.get_pos()))
 
     elif event.type == pygame.MOUSEBUTTONUP:
-        mouse_up(pygame.mouse.get_pos())
+        mouse_up(platform_specific.from_window_coordinates(pygame.mouse.get_pos()))
 
 
 def mouse_down(pos):
@@ -0,0 +1,321 @@
+'''
+Streams the screen to viewers over TCP or a Unix socket, so a Tingbot can be watched from another
+computer.
+
+The screen is split into tiles. After each screen update, only the tiles that changed are sent,
+compressed with zlib. Slow viewers don't hold up the app - they skip to the latest version of
+each tile.
+
+To start the server in an app:
+
+    from tingbot import mirror
+    mirror.MirrorServer(('', 4242)).start()
+
+And to watch it:
+
+    python -m tingbot.mirror tingbot.local:4242
+
+The protocol is a header, struct '>4sHHH' (b'TBMR', version, width, height), followed by frames.
+Each frame is a '>I' length followed by that many bytes of zlib-compressed data. The data is a
+'>H' count of tiles, and then for each tile a '>HHHH' (x, y, width, height) rect followed by its
+pixels as RGB bytes.
+'''
+import os, select, socket, stat, struct, threading, zlib
+import pygame
+
+protocol_version = 1
+header_format = '>4sHHH'
+frame_length_format = '>I'
+tile_count_format = '>H'
+tile_rect_format = '>HHHH'
+
+
+def _create_socket(address):
+    if isinstance(address, basestring):
+        return socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        return socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+
+
+def _is_socket_file(path):
+    try:
+        return stat.S_ISSOCK(os.stat(path).st_mode)
+    except OSError:
+        return False
+
+
+class _Client(object):
+    def __init__(self, connection):
+        self.connection = connection
+        # the indexes of the tiles that have changed since they were last sent to this client
+        self.dirty_tiles = set()
+
+
+class MirrorServer(object):
+    def __init__(self, address=('', 4242), tile_size=32, compression_level=6):
+        '''
+        `address` is a (host, port) tuple to listen on TCP, or a filename to listen on a Unix
+        socket.
+        '''
+        self.address = address
+        self.tile_size = tile_size
+        self.compression_level = compression_level
+
+        self.screen = None
+        self.server_socket = None
+        self.running = False
+        self.size = None
+        self.tile_rects = []
+        # the last seen pixels of each tile, by index
+        self.tiles = {}
+        self.clients = []
+        self.condition = threading.Condition()
+
+    def start(self, screen=None):
+        if screen is None:
+            from .graphics import screen
+
+        self.screen = screen
+        self.size = screen.surface.get_size()
+        self.tile_rects = [
+            pygame.Rect(x, y, self.tile_size, self.tile_size).clip(screen.surface.get_rect())
+            for y in range(0, self.size[1], self.tile_size)
+            for x in range(0, self.size[0], self.tile_size)]
+
+        if isinstance(self.address, basestring) and _is_socket_file(self.address):
+            # left over from a previous run
+            os.remove(self.address)
+
+        self.server_socket = _create_socket(self.address)
+        self.server_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.server_socket.bind(self.address)
+        self.server_socket.listen(5)
+        # the actual address, in case the port was chosen by the OS
+        self.address = self.server_socket.getsockname()
+        self.running = True
+
+        self.update(screen.surface)
+        screen.add_update_listener(self.update)
+
+        thread = threading.Thread(target=self._accept_thread_main, name='MirrorServer')
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.screen.remove_update_listener(self.update)
+
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+
+        try:
+            # wakes up the accept thread
+            self.server_socket.shutdown(socket.SHUT_RDWR)
+        except socket.error:
+            pass
+
+        self.server_socket.close()
+
+        if isinstance(self.address, basestring) and os.path.exists(self.address):
+            os.remove(self.address)
+
+    def update(self, surface, rects=None):
+        '''
+        Called after each screen update. Finds the tiles that changed, and passes them to the
+        client threads.
+        '''
+        if rects is None:
+            indexes = range(len(self.tile_rects))
+        else:
+            indexes = set()
+            for rect in rects:
+                indexes.update(rect.collidelistall(self.tile_rects))
+
+        changed_tiles = []
+
+        for index in indexes:
+            data = pygame.image.tostring(surface.subsurface(self.tile_rects[index]), 'RGB')
+
+            if self.tiles.get(index) != data:
+                changed_tiles.append((index, data))
+
+        if not changed_tiles:
+            return
+
+        with self.condition:
+            for index, data in changed_tiles:
+                self.tiles[index] = data
+
+            for client in self.clients:
+                client.dirty_tiles.update(index for index, _ in changed_tiles)
+
+            self.condition.notify_all()
+
+    def _accept_thread_main(self):
+        while self.running:
+            try:
+                connection, _ = self.server_socket.accept()
+            except socket.error:
+                # the socket was closed by stop()
+                break
+
+            client = _Client(connection)
+
+            with self.condition:
+                # a new viewer needs the whole screen
+                client.dirty_tiles.update(self.tiles)
+                self.clients.append(client)
+
+            thread = threading.Thread(target=self._client_thread_main, args=(client,),
+                                      name='MirrorServer client')
+            thread.daemon = True
+            thread.start()
+
+    def _client_thread_main(self, client):
+        try:
+            client.connection.sendall(struct.pack(
+                header_format, b'TBMR', protocol_version, self.size[0], self.size[1]))
+
+            while True:
+                with self.condition:
+                    while self.running and not client.dirty_tiles:
+                        self.condition.wait()
+
+                    if not self.running:
+                        break
+
+                    tiles = [(self.tile_rects[index], self.tiles[index])
+                             for index in sorted(client.dirty_tiles)]
+                    client.dirty_tiles.clear()
+
+                client.connection.sendall(self._encode_frame(tiles))
+        except socket.error:
+            # the viewer disconnected
+            pass
+        finally:
+            with self.condition:
+                self.clients.remove(client)
+            client.connection.close()
+
+    def _encode_frame(self, tiles):
+        parts = [struct.pack(tile_count_format, len(tiles))]
+
+        for rect, data in tiles:
+            parts.append(struct.pack(tile_rect_format, *rect))
+            parts.append(data)
+
+        payload = zlib.compress(b''.join(parts), self.compression_level)
+        return struct.pack(frame_length_format, len(payload)) + payload
+
+
+class MirrorClient(object):
+    '''
+    Connects to a MirrorServer, and keeps a copy of its screen in `surface`.
+    '''
+    def __init__(self, address):
+        self.socket = _create_socket(address)
+        self.socket.connect(address)
+
+        magic, version, width, height = struct.unpack(
+            header_format, self._read(struct.calcsize(header_format)))
+
+        if magic != b'TBMR' or version != protocol_version:
+            raise IOError('Not a tingbot mirror server, or a different version')
+
+        self.surface = pygame.Surface((width, height), 0, 24)
+
+    def close(self):
+        self.socket.close()
+
+    def read_frame(self, timeout=None):
+        '''
+        Waits for the next frame, and draws it to `surface`. Returns the list of rects that
+        changed. If `timeout` is given and no frame starts arriving in that many seconds, returns
+        an empty list.
+        '''
+        if timeout is not None:
+            readable, _, _ = select.select([self.socket], [], [], timeout)
+
+            if not readable:
+                return []
+
+        length, = struct.unpack(frame_length_format,
+                                self._read(struct.calcsize(frame_length_format)))
+        data = zlib.decompress(self._read(length))
+
+        offset = struct.calcsize(tile_count_format)
+        tile_count, = struct.unpack_from(tile_count_format, data)
+        rects = []
+
+        for i in range(tile_count):
+            rect = pygame.Rect(struct.unpack_from(tile_rect_format, data, offset))
+            offset += struct.calcsize(tile_rect_format)
+
+            pixels_length = rect.width * rect.height * 3
+            tile = pygame.image.frombuffer(data[offset:offset + pixels_length], rect.size, 'RGB')
+            offset += pixels_length
+
+            self.surface.blit(tile, rect)
+            rects.append(rect)
+
+        return rects
+
+    def _read(self, length):
+        chunks = []
+
+        while length > 0:
+            chunk = self.socket.recv(min(length, 65536))
+
+            if not chunk:
+                raise IOError('The mirror server closed the connection')
+
+            chunks.append(chunk)
+            length -= len(chunk)
+
+        return b''.join(chunks)
+
+
+def parse_address(string):
+    '''
+    'host:port' is a TCP address, anything else is the filename of a Unix socket.
+    '''
+    host, _, port = string.rpartition(':')
+
+    if host and port.isdigit():
+        return (host, int(port))
+
+    return string
+
+
+def main():
+    import sys
+
+    if len(sys.argv) != 2:
+        print 'Usage: python -m tingbot.mirror HOST:PORT|SOCKET_PATH'
+        sys.exit(1)
+
+    client = MirrorClient(parse_address(sys.argv[1]))
+
+    pygame.display.init()
+    window = pygame.display.set_mode(client.surface.get_size())
+    pygame.display.set_caption('Tingbot mirror - %s' % sys.argv[1])
+
+    try:
+        while True:
+            # don't wait long for a frame, so the window keeps responding when the screen isn't
+            # changing
+            rects = client.read_frame(timeout=0.05)
+
+            if rects:
+                window.blit(client.surface, (0, 0))
+                pygame.display.update(rects)
+
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    return
+    finally:
+        client.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -15,6 +15,26 @@ def no_op_returning(return_value):
         return return_value
     return inner
 
+def update_display(surface, rects=None):
+    """
+    Pushes `rects` (or everything, if rects is None) of the screen surface to the display.
+    """
+    import pygame
+
+    if rects is None:
+        pygame.display.update()
+    else:
+        # the screen might be a subsurface of the display (e.g. in the simulator), so
+        # translate the rects to display coordinates
+        offset = surface.get_abs_offset()
+        pygame.display.update([r.move(offset) for r in rects])
+
+def from_window_coordinates(xy):
+    """
+    Converts a mouse position from the window to the coordinates that things are drawn in.
+    """
+    return xy
+
 # set fallback functions (some of these will be replaced by the real versions below)
 set_backlight = no_op
 mouse_attached = no_op_returning(True)
@@ -23,11 +43,17 @@ joystick_attached = no_op_returning(False)
 get_wifi_cell = no_op_returning(None)
 setup_audio = no_op
 
-if sys.platform == 'darwin':
+if os.environ.get('TB_DISPLAY') == 'headless':
+    from headless import fixup_env, create_main_surface, update_display, register_button_callback
+elif sys.platform == 'darwin':
     from osx import fixup_env, create_main_surface, register_button_callback
 elif is_running_on_tingbot():
     from tingbot import (fixup_env, create_main_surface, register_button_callback,
                          set_backlight, mouse_attached, keyboard_attached, joystick_attached,
                          get_wifi_cell, setup_audio)
+
+    if os.environ.get('TB_DISPLAY') == 'framebuffer':
+        from framebuffer import create_main_surface, update_display
 else:
-    from sdl_wrapper import fixup_env, create_main_surface, register_button_callback
+    from sdl_wrapper import (fixup_env, create_main_surface, update_display,
+                             register_button_callback, from_window_coordinates)
@@ -0,0 +1,95 @@
+'''
+A display backend for the Tingbot that writes straight into the memory-mapped framebuffer device,
+rather than going through SDL's fbcon driver. Only the areas of the screen that have changed are
+written.
+
+It's used when the environment variable TB_DISPLAY is 'framebuffer'. TB_FRAMEBUFFER sets the
+device to use, it defaults to /dev/fb1.
+
+SDL runs with its dummy video driver in this mode, so touch input through SDL isn't available.
+'''
+import os, mmap
+
+framebuffer = None
+
+
+class Framebuffer(object):
+    '''
+    A memory-mapped 16-bit (RGB565) framebuffer. `path` is usually a device like /dev/fb1, but
+    it can be any file that's big enough.
+    '''
+    def __init__(self, path, size=(320, 240)):
+        import numpy
+
+        width, height = size
+        self.size = size
+        self.file = open(path, 'r+b')
+        self.mmap = mmap.mmap(self.file.fileno(), width * height * 2)
+        # rows first, like the memory
+        self.pixels = numpy.frombuffer(self.mmap, dtype=numpy.uint16).reshape((height, width))
+
+    def close(self):
+        del self.pixels
+        self.mmap.close()
+        self.file.close()
+
+    def update(self, surface, rects=None):
+        '''
+        Copies `rects` (or the whole surface, if rects is None) from `surface` to the framebuffer.
+        The surface must be 16-bit RGB565 or 32-bit.
+        '''
+        import pygame, pygame.surfarray
+
+        surface_rect = surface.get_rect()
+
+        if rects is None:
+            rects = [surface_rect]
+
+        # columns first
+        surface_pixels = pygame.surfarray.pixels2d(surface)
+
+        try:
+            for rect in rects:
+                rect = pygame.Rect(rect).clip(surface_rect)
+                area = surface_pixels[rect.left:rect.right, rect.top:rect.bottom].T
+
+                self.pixels[rect.top:rect.bottom, rect.left:rect.right] = _to_rgb565(area, surface)
+        finally:
+            # unlock the surface
+            del surface_pixels
+
+
+def _to_rgb565(pixels, surface):
+    '''
+    Converts an array of mapped pixels from `surface` to RGB565.
+    '''
+    if surface.get_bitsize() == 16 and surface.get_masks()[:3] == (0xf800, 0x07e0, 0x001f):
+        return pixels
+
+    if surface.get_bitsize() != 32:
+        raise ValueError('Unsupported surface format: %i-bit' % surface.get_bitsize())
+
+    r_shift, g_shift, b_shift = surface.get_shifts()[:3]
+
+    return (((pixels >> r_shift) & 0xf8) << 8
+            | ((pixels >> g_shift) & 0xfc) << 3
+            | ((pixels >> b_shift) & 0xff) >> 3)
+
+
+def create_main_surface():
+    global framebuffer
+    import pygame
+
+    # SDL isn't used for the display, but pygame.display still has to be set up to convert images
+    if pygame.display.get_init():
+        pygame.display.quit()
+
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    pygame.init()
+
+    framebuffer = Framebuffer(os.environ.get('TB_FRAMEBUFFER', '/dev/fb1'))
+    return pygame.display.set_mode(framebuffer.size, 0, 16)
+
+
+def update_display(surface, rects=None):
+    framebuffer.update(surface, rects)
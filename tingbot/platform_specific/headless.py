@@ -0,0 +1,51 @@
+'''
+A backend with no display, for running apps on servers - e.g. for tests, benchmarks, or making
+screenshots. The screen is an offscreen 320x240 surface.
+
+It's used when the environment variable TB_DISPLAY is 'headless'. Other settings are:
+
+    TB_HEADLESS_DEPTH - the bit depth of the screen surface, defaults to 32. Use 16 to match the
+                        Tingbot's LCD.
+    TB_CAPTURE_DIR    - if set, every screen update is saved to this directory as a numbered
+                        PNG file.
+'''
+import os
+
+button_callback = None
+frame_count = 0
+
+
+def fixup_env():
+    os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+
+def create_main_surface(depth=None):
+    import pygame
+
+    fixup_env()
+    pygame.init()
+
+    if depth is None:
+        depth = int(os.environ.get('TB_HEADLESS_DEPTH', 32))
+
+    # the dummy driver doesn't have a natural depth, so it has to be given
+    return pygame.display.set_mode((320, 240), 0, depth)
+
+
+def update_display(surface, rects=None):
+    global frame_count
+    capture_dir = os.environ.get('TB_CAPTURE_DIR')
+
+    if capture_dir:
+        import pygame
+        frame_count += 1
+        pygame.image.save(surface, os.path.join(capture_dir, 'frame-%05i.png' % frame_count))
+
+
+def register_button_callback(callback):
+    '''
+    There are no buttons, but the callback can be called by test code to simulate presses.
+    '''
+    global button_callback
+    button_callback = callback
@@ -16,11 +16,18 @@ button_color = (170, 170, 170)
 simulator = None
 
 class Simulator(object):
-    def __init__(self):
+    def __init__(self, scale=1):
         pygame.init()
         height = top_margin + bot_height + bottom_margin
         width = bot_width + left_margin
-        self.surface = pygame.display.set_mode((width, height))
+        self.scale = scale
+        self.window = pygame.display.set_mode((width * scale, height * scale))
+
+        if scale == 1:
+            self.surface = self.window
+        else:
+            # everything is drawn at 1x, and scaled up when it's shown
+            self.surface = pygame.Surface((width, height), 0, self.window)
 
         self.screen = self.surface.subsurface((86, 54, 320, 240))
         bot_image = pygame.image.load(os.path.join(os.path.dirname(__file__), 'bot.png'))
@@ -34,7 +41,29 @@ class Simulator(object):
             button = Button(button_surface, button_index)
             self.buttons.append(button)
 
-        pygame.display.update()
+        self.present([self.surface.get_rect()])
+
+    def present(self, rects):
+        '''
+        Shows `rects` of the simulator surface in the window.
+        '''
+        if self.scale != 1:
+            surface_rect = self.surface.get_rect()
+            window_rects = []
+
+            for rect in rects:
+                rect = pygame.Rect(rect).clip(surface_rect)
+                window_rect = pygame.Rect(rect.x * self.scale, rect.y * self.scale,
+                                          rect.width * self.scale, rect.height * self.scale)
+
+                # nearest-neighbour scaling, straight into the window
+                pygame.transform.scale(self.surface.subsurface(rect), window_rect.size,
+                                       self.window.subsurface(window_rect))
+                window_rects.append(window_rect)
+
+            rects = window_rects
+
+        pygame.display.update(rects)
 
 
 class Button(object):
@@ -58,7 +87,7 @@ class Button(object):
             self.surface.fill(button_color)
             if button_callback:
                 button_callback(self.number, 'up')
-        pygame.display.update((self.surface.get_abs_offset(), self.surface.get_size()))
+        simulator.present([pygame.Rect(self.surface.get_abs_offset(), self.surface.get_size())])
 
 def ensure_setup():
     if simulator is None:
@@ -66,12 +95,27 @@ def ensure_setup():
 
 def setup():
     global simulator
-    simulator = Simulator()
+    # TB_SIMULATOR_SCALE=2 or 3 makes the window bigger, for high resolution displays
+    simulator = Simulator(scale=int(os.environ.get('TB_SIMULATOR_SCALE', 1)))
 
 def create_main_surface():
     ensure_setup()
     return simulator.screen
 
+def update_display(surface, rects=None):
+    # only the screen is updated, the rest of the window doesn't change
+    if rects is None:
+        rects = [surface.get_rect()]
+
+    offset = surface.get_abs_offset()
+    simulator.present([r.move(offset) for r in rects])
+
+def from_window_coordinates(xy):
+    if simulator is None:
+        return xy
+
+    return (xy[0] // simulator.scale, xy[1] // simulator.scale)
+
 def fixup_env():
     pass
 
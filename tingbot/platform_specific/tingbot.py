@@ -21,7 +21,8 @@ def fixup_env():
 def create_main_surface():
     import pygame
     pygame.init()
-    surface = pygame.display.set_mode((320, 240))
+    # the LCD is 16-bit, graphics stores images in this format so they're quick to draw
+    surface = pygame.display.set_mode((320, 240), 0, 16)
     import pygame.mouse
     pygame.mouse.set_visible(0)
     return surface
@@ -0,0 +1,195 @@
+import os, time, threading, Queue
+import pygame
+
+
+class Recorder(object):
+    '''
+    Records the frames shown on the screen to a PNG sequence or an animated GIF.
+
+    Frames are captured on the main thread after each screen update, by copying only the areas
+    that changed, and saved on a background thread. If the background thread falls behind, frames
+    are dropped rather than making the app wait.
+    '''
+    def __init__(self, path, fps=10, queue_size=30, clock=time.time):
+        '''
+        If `path` ends with '.gif', an animated GIF is saved there, a frame at a time as they're
+        captured, so a long recording doesn't fill up memory. Otherwise, `path` is a directory
+        that each frame is saved to as it's captured, named frame-00001.png, frame-00002.png...
+        '''
+        self.path = path
+        self.is_gif = path.lower().endswith('.gif')
+        self.frame_interval = 1.0 / fps
+        self.clock = clock
+        self.queue = Queue.Queue(maxsize=queue_size)
+        self.thread = None
+        self.error = None
+
+        self.next_frame_time = None
+        # the areas changed since the last captured frame, None means everything
+        self.changed_rects = None
+        self.frame_count = 0
+        self.dropped_frames = 0
+
+    def start(self):
+        if not self.is_gif and not os.path.isdir(self.path):
+            os.makedirs(self.path)
+
+        self.thread = threading.Thread(target=self._encode_thread_main, name='Recorder')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def stop(self):
+        '''
+        Waits for the captured frames to be saved. Raises any error from saving them.
+        '''
+        self.queue.put(None)
+        self.thread.join()
+
+        if self.error is not None:
+            raise self.error
+
+    def capture(self, surface, rects=None):
+        '''
+        Called after a screen update, with the rects that were updated (None if the whole screen
+        was updated).
+        '''
+        if self.changed_rects is not None:
+            if rects is None:
+                self.changed_rects = None
+            else:
+                self.changed_rects.extend(rects)
+
+        now = self.clock()
+
+        if self.next_frame_time is not None and now < self.next_frame_time:
+            # too soon for the next frame, the changes are kept for when it's captured
+            return
+
+        if self.changed_rects is None:
+            patches = [((0, 0), surface.copy())]
+        else:
+            patches = [(rect.topleft, surface.subsurface(rect).copy())
+                       for rect in self.changed_rects]
+
+        try:
+            self.queue.put_nowait((now, patches))
+        except Queue.Full:
+            # the encoder would miss these changes, so the next frame has to be all of it
+            self.dropped_frames += 1
+            self.changed_rects = None
+        else:
+            self.frame_count += 1
+            self.changed_rects = []
+
+        if self.next_frame_time is None:
+            self.next_frame_time = now
+        # don't try to catch up if frames were missed
+        self.next_frame_time = max(self.next_frame_time + self.frame_interval, now)
+
+    def _encode_thread_main(self):
+        canvas = None
+        gif_writer = _GIFWriter(self.path) if self.is_gif else None
+        frame_number = 0
+
+        while True:
+            item = self.queue.get()
+
+            if item is None:
+                break
+
+            if self.error is not None:
+                # keep taking frames from the queue, so stop() doesn't block
+                continue
+
+            timestamp, patches = item
+
+            try:
+                if canvas is None:
+                    # the first frame is always the whole screen
+                    (_, canvas), patches = patches[0], patches[1:]
+
+                for position, patch in patches:
+                    canvas.blit(patch, position)
+
+                frame_number += 1
+
+                if self.is_gif:
+                    gif_writer.add_frame(timestamp, _pil_image_from_surface(canvas))
+                else:
+                    filename = os.path.join(self.path, 'frame-%05i.png' % frame_number)
+                    pygame.image.save(canvas, filename)
+            except Exception as e:
+                self.error = e
+
+        if self.is_gif:
+            if self.error is None:
+                try:
+                    gif_writer.close(self.frame_interval)
+                except Exception as e:
+                    self.error = e
+
+            if self.error is not None:
+                gif_writer.discard()
+
+
+def _pil_image_from_surface(surface):
+    from PIL import Image as PILImage
+
+    pil_image = PILImage.frombytes('RGB', surface.get_size(),
+                                   pygame.image.tostring(surface, 'RGB'))
+    # a palettized frame takes a third of the memory
+    return pil_image.convert('P', palette=PILImage.ADAPTIVE)
+
+
+class _GIFWriter(object):
+    '''
+    Writes an animated GIF a frame at a time, so only one frame is kept in memory. Each frame is
+    written when the next one arrives, because it's shown until then.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.pending_frame = None
+
+    def add_frame(self, timestamp, image):
+        if self.pending_frame is not None:
+            previous_timestamp, previous_image = self.pending_frame
+            self._write_frame(previous_image, timestamp - previous_timestamp)
+
+        self.pending_frame = (timestamp, image)
+
+    def close(self, last_frame_duration):
+        if self.pending_frame is not None:
+            _, image = self.pending_frame
+            self._write_frame(image, last_frame_duration)
+            self.pending_frame = None
+
+        if self.file is not None:
+            self.file.write(b';')
+            self.file.close()
+            self.file = None
+
+    def discard(self):
+        '''
+        Removes a partly written GIF, after an error.
+        '''
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+            os.remove(self.path)
+
+    def _write_frame(self, image, duration):
+        from PIL import GifImagePlugin
+
+        params = {'duration': int(round(duration * 1000)), 'include_color_table': True}
+
+        if self.file is None:
+            self.file = open(self.path, 'wb')
+            params['loop'] = 0
+            header, _ = GifImagePlugin.getheader(image, info=dict(params))
+
+            for data in header:
+                self.file.write(data)
+
+        for data in GifImagePlugin.getdata(image, **params):
+            self.file.write(data)
@@ -54,6 +54,7 @@ class RunLoop(object):
         self._before_action_callbacks = CallbackList()
         self._after_action_callbacks = CallbackList()
         self.timers = []
+        self._action_time = None
 
         # add screen update callbacks
         self.add_after_action_callback(screen.update_if_needed)
@@ -89,6 +90,7 @@ class RunLoop(object):
 
                 if next_timer.active:
                     before_action_time = time.time()
+                    self._action_time = before_action_time
 
                     try:
                         self._before_action_callbacks()
@@ -97,6 +99,7 @@ class RunLoop(object):
                     except Exception as e:
                         self._error(e)
                     finally:
+                        self._action_time = None
                         if next_timer.repeating and next_timer.active:
                             next_timer.next_fire_time = before_action_time + next_timer.period
                             self.schedule(next_timer)
@@ -110,6 +113,15 @@ class RunLoop(object):
     def stop(self):
         self.running = False
 
+    def time(self):
+        '''
+        Returns the time that the current action started, or the current time if no action is
+        running. Everything drawn in one action can use this, so it all shows the same moment.
+        '''
+        if self._action_time is not None:
+            return self._action_time
+        return time.time()
+
     def add_wait_callback(self, callback):
         self._wait_callbacks.add(callback)
 
@@ -1,33 +1,101 @@
 # coding: utf8
 
+import bisect, re
+
+# a line can be broken before a non-whitespace character that follows one of ' ', '-' or '\t'
+split_point_pattern = re.compile(r'(?<=[ \-\t])\S', re.UNICODE)
+non_space_pattern = re.compile(r'\S', re.UNICODE)
+
+
+class CumulativeAdvances(object):
+    '''
+    The total advance (width) of the characters of a string up to each index, so the width of a
+    range of characters is a subtraction, and finding where a width is reached is a bisect.
+
+    The totals are added up only as far as they're needed, so a long string that's truncated to a
+    couple of lines isn't measured all the way to the end.
+    '''
+    def __init__(self, string_metrics):
+        self.string_metrics = string_metrics
+        self.totals = [0]
+
+    def __getitem__(self, i):
+        ''' Returns the width of the first `i` characters. '''
+        self._extend(lambda totals: len(totals) > i)
+        return self.totals[i]
+
+    def bisect(self, width, lo, hi):
+        '''
+        Returns the first index between `lo` and `hi` whose total is more than `width`, or `hi`
+        if there isn't one.
+        '''
+        self._extend(lambda totals: totals[-1] > width or len(totals) >= hi)
+        return bisect.bisect_right(self.totals, width, lo, min(hi, len(self.totals)))
+
+    def _extend(self, is_done):
+        totals = self.totals
+
+        if is_done(totals):
+            return
+
+        append = totals.append
+        total = totals[-1]
+
+        # add the rest in chunks, to keep the checks out of the inner loop
+        for chunk_start in xrange(len(totals) - 1, len(self.string_metrics), 64):
+            for char_metrics in self.string_metrics[chunk_start:chunk_start + 64]:
+                # [4] refers to the 'advance' metric
+                total += char_metrics[4]
+                append(total)
+
+            if is_done(totals):
+                break
+
+
 class Line(object):
-    def __init__(self, string, string_metrics):
+    def __init__(self, string, string_metrics, advances=None, start=0):
+        '''
+        `advances` can be the cumulative advances of a longer string that this line is part of,
+        starting at index `start`. If it's not given, it's calculated from `string_metrics`.
+        '''
         self.string = string
         self.string_metrics = string_metrics
 
+        if advances is None:
+            advances = CumulativeAdvances(string_metrics)
+            start = 0
+
+        self.advances = advances
+        self.start = start
+
+    @property
+    def width(self):
+        return self.advances[self.start + len(self.string)] - self.advances[self.start]
+
     def truncate(self, max_width, ellipsis, ellipsis_metrics):
         '''
         Returns a copy of the line, truncated so the width is less than 'max_width' if necessary.
         If truncated, 'ellipsis' is added at the end.
         '''
-        # do we need to truncate?
-        string_width = sum(char_metric[4] for char_metric in self.string_metrics)
+        start_width = self.advances[self.start]
+        end = self.start + len(self.string) + 1
 
-        if string_width <= max_width:
-            return Line(self.string, self.string_metrics)
+        # do we need to truncate?
+        if self.advances.bisect(start_width + max_width, self.start + 1, end) == end:
+            return Line(self.string, self.string_metrics, self.advances, self.start)
 
         ellipsis_width = sum(char_metric[4] for char_metric in ellipsis_metrics)
         string_max_width = max_width - ellipsis_width
-        line_width = 0
 
-        for string_i in xrange(len(self.string)):
-            # [4] refers to the 'advance' metric
-            line_width += self.string_metrics[string_i][4]
+        # the first character that takes the line past string_max_width is replaced by the
+        # ellipsis, along with everything after it
+        string_i = self.advances.bisect(
+            start_width + string_max_width, self.start + 1, end) - self.start - 1
 
-            if line_width > string_max_width:
-                return Line(
-                    string=self.string[:string_i] + ellipsis,
-                    string_metrics=self.string_metrics[:string_i] + ellipsis_metrics)
+        if string_i < len(self.string):
+            return Line(
+                string=self.string[:string_i] + ellipsis,
+                string_metrics=self.string_metrics[:string_i] + ellipsis_metrics)
 
     def __repr__(self):
         return 'Line(string=%r)' % self.string
@@ -38,46 +106,49 @@ class Typesetter(object):
         self.string_metrics = string_metrics
         self.line_start = 0
 
+        self.advances = CumulativeAdvances(string_metrics)
+
     def suggest_line_break(self, start_i, max_width):
-        line_width = 0
-        last_split_point = None
+        length = len(self.string)
 
-        string_i = start_i
-        char = None
+        if start_i >= length:
+            return length
 
-        for string_i in xrange(start_i, len(self.string)):
-            prev_char = char
-            char = self.string[string_i]
+        # the first character that takes the line past max_width. Whitespace is allowed to
+        # overflow, so only non-whitespace characters count
+        overflow_i = self.advances.bisect(
+            self.advances[start_i] + max_width, start_i + 1, length + 1) - 1
+        match = non_space_pattern.search(self.string, overflow_i)
+        overflow_i = match.start() if match else length
 
-            # handle newlines
-            if char == '\n':
-                # '+ 1' means break after the newline character
-                return string_i + 1
+        # handle newlines
+        newline_i = self.string.find('\n', start_i, overflow_i)
 
-            # [4] refers to the 'advance' metric
-            line_width += self.string_metrics[string_i][4]
+        if newline_i != -1:
+            # '+ 1' means break after the newline character
+            return newline_i + 1
 
-            # always break at the end of a string of whitespace
-            if char.isspace():
-                continue
+        if overflow_i == length:
+            # got to the end of the string without wrapping
+            return length
 
-            if prev_char in (' ', '-', '\t'):
-                last_split_point = string_i
+        # the last split point up to and including the overflowing character. A split point at
+        # the start of the line doesn't count
+        last_split_point = None
 
-            if line_width > max_width:
-                if last_split_point is None:
-                    # there wasn't a split point before the line was too big. Break here
-                    if string_i == start_i:
-                        # don't return zero character line
-                        return string_i + 1
-                    else:
-                        return string_i
-                else:
-                    # there was a possible split point back there. Return up to that split point
-                    return last_split_point
+        for match in split_point_pattern.finditer(self.string, start_i + 1, overflow_i + 1):
+            last_split_point = match.start()
 
-        # got to the end of the string without wrapping
-        return len(self.string)
+        if last_split_point is not None:
+            # there was a possible split point back there. Return up to that split point
+            return last_split_point
+
+        # there wasn't a split point before the line was too big. Break here
+        if overflow_i == start_i:
+            # don't return zero character line
+            return overflow_i + 1
+        else:
+            return overflow_i
 
     def create_line(self, start_i, end_i, remove_trailing_whitespace=False):
         if remove_trailing_whitespace:
@@ -87,7 +158,7 @@ class Typesetter(object):
             string = self.string[start_i:end_i]
             string_metrics = self.string_metrics[start_i:end_i]
 
-        return Line(string, string_metrics)
+        return Line(string, string_metrics, self.advances, start_i)
 
     def lines(self, max_lines, max_width, ellipsis, ellipsis_metrics):
         lines = []
@@ -118,7 +189,84 @@ class Typesetter(object):
 
         return lines
 
-def render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u'…', align=0):
+class FontMetrics(object):
+    '''
+    The metrics of each character in a font, measured the first time they're needed. Apps draw
+    the same few characters over and over, so after the first few strings, breaking a string into
+    lines is just dictionary lookups.
+    '''
+    def __init__(self, font):
+        self.font = font
+        self.line_height = font.get_height()
+        # maps each character to its metrics, as returned by Font.metrics
+        self.chars = {}
+
+    def metrics(self, string):
+        chars = self.chars
+
+        try:
+            return [chars[char] for char in string]
+        except KeyError:
+            pass
+
+        missing_chars = list(set(string).difference(chars))
+
+        for char, char_metrics in zip(missing_chars, self.font.metrics(u''.join(missing_chars))):
+            if char_metrics is None:
+                # the font doesn't have this character, it's drawn as whatever the font renders
+                width, height = self.font.size(char)
+                char_metrics = (0, width, 0, height, width)
+
+            chars[char] = char_metrics
+
+        return [chars[char] for char in string]
+
+    def lines(self, string, max_lines, max_width, ellipsis=u'…'):
+        '''
+        Breaks `string` into a list of Line objects, in the same way as render_text.
+        '''
+        return Typesetter(string, self.metrics(string)).lines(
+            max_lines=max_lines,
+            max_width=max_width,
+            ellipsis=ellipsis,
+            ellipsis_metrics=self.metrics(ellipsis))
+
+    def line_left(self, line):
+        '''
+        Returns where the rendered surface of `line` starts, from the origin of its first
+        character. This is negative when a character reaches back past its origin, like 'j' in
+        some fonts.
+        '''
+        x = 0
+        left = 0
+
+        for minx, maxx, miny, maxy, advance in line.string_metrics:
+            left = min(left, x + minx)
+            x += advance
+
+        return left
+
+    def line_width(self, line):
+        '''
+        Returns the width of `line` when it's rendered. This is measured by the font, because
+        the font places characters at fractional positions and applies kerning, so adding up the
+        character metrics can be a few pixels out, especially in italic fonts. Measuring doesn't
+        render anything, so it's still quick.
+        '''
+        return self.font.size(line.string)[0]
+
+    def size(self, lines):
+        '''
+        Returns the size (width, height) of a block of text made of `lines`, as rendered by
+        render_text.
+        '''
+        if len(lines) == 0:
+            return (0, 0)
+
+        return (max(self.line_width(line) for line in lines), self.line_height * len(lines))
+
+def render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u'…', align=0,
+                font_metrics=None):
     ''' Render a multiline string to a pygame surface.
 
     Arguments:
@@ -130,17 +278,15 @@ def render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u
       max_width - the maximum width of each line
       ellipsis - the string used to indicate more text wasn't displayed
       align - horizontal alignment - 0=left, 0.5=center, 1=right
+      font_metrics - a FontMetrics for `font`, kept between calls so characters are only
+                     measured once
     '''
     import pygame
 
-    string_metrics = font.metrics(string)
-    ellipsis_metrics = font.metrics(ellipsis)
+    if font_metrics is None:
+        font_metrics = FontMetrics(font)
 
-    lines = Typesetter(string, string_metrics).lines(
-        max_lines=max_lines,
-        max_width=max_width,
-        ellipsis=ellipsis,
-        ellipsis_metrics=ellipsis_metrics)
+    lines = font_metrics.lines(string, max_lines, max_width, ellipsis)
 
     line_surfaces = []
 
@@ -154,7 +300,7 @@ def render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u
         width = 0
         height = 0
 
-    surface = pygame.Surface((width, height), flags=pygame.SRCALPHA)
+    surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
 
     y = 0
     for line_surface in line_surfaces:
@@ -163,3 +309,252 @@ def render_text(string, font, antialias, color, max_lines, max_width, ellipsis=u
         y += line_surface.get_height()
 
     return surface
+
+class Span(object):
+    '''
+    A piece of text drawn in one font and color, as part of a paragraph of several spans.
+    '''
+    def __init__(self, string, font, antialias, color, font_metrics=None):
+        self.string = string
+        self.font = font
+        self.antialias = antialias
+        self.color = color
+        self.font_metrics = font_metrics or FontMetrics(font)
+
+    def __repr__(self):
+        return 'Span(string=%r)' % self.string
+
+class SpanLine(object):
+    '''
+    A line of text laid out from spans. `runs` is a list of (span, string, x) tuples, where x is
+    where the run's rendered surface goes, from the left edge of the line.
+    '''
+    def __init__(self, runs, width, ascent, height):
+        self.runs = runs
+        self.width = width
+        # the distance from the top of the line to the baseline
+        self.ascent = ascent
+        self.height = height
+
+    def __repr__(self):
+        return 'SpanLine(string=%r)' % u''.join(string for _, string, _ in self.runs)
+
+def layout_spans(spans, max_lines, max_width, ellipsis=u'…'):
+    '''
+    Breaks a paragraph made of `spans` into a list of SpanLine objects. The lines are broken in one
+    pass over all the spans, in the same way as render_text, so a line break can happen within a
+    span or between them.
+    '''
+    string = u''.join(span.string for span in spans)
+    string_metrics = []
+    span_starts = []
+
+    for span in spans:
+        span_starts.append(len(string_metrics))
+        string_metrics.extend(span.font_metrics.metrics(span.string))
+
+    def span_at(string_i):
+        return spans[max(0, bisect.bisect_right(span_starts, string_i) - 1)]
+
+    # measure the ellipsis in the widest font, so it always fits
+    ellipsis_metrics = max(
+        (span.font_metrics.metrics(ellipsis) for span in spans),
+        key=lambda metrics: sum(char_metrics[4] for char_metrics in metrics))
+
+    typesetter = Typesetter(string, string_metrics)
+    lines = typesetter.lines(
+        max_lines=max_lines,
+        max_width=max_width,
+        ellipsis=ellipsis,
+        ellipsis_metrics=ellipsis_metrics)
+
+    span_lines = []
+
+    for line_i, line in enumerate(lines):
+        if line_i < len(lines) - 1:
+            start = line.start
+        elif line_i > 0:
+            # the last line might be truncated, which makes a new Line
+            start = typesetter.suggest_line_break(lines[line_i - 1].start, max_width)
+        else:
+            start = 0
+
+        if string.startswith(line.string, start):
+            end = start + len(line.string)
+            truncated = False
+        else:
+            end = start + len(line.string) - len(ellipsis)
+            truncated = True
+
+        runs = []
+        string_i = start
+
+        while string_i < end:
+            span_i = bisect.bisect_right(span_starts, string_i) - 1
+            span = spans[span_i]
+            run_end = min(end, span_starts[span_i] + len(span.string))
+            x = typesetter.advances[string_i] - typesetter.advances[start]
+            runs.append((span, string[string_i:run_end], x))
+            string_i = run_end
+
+        if truncated:
+            # the ellipsis is in the style of the text before it
+            span = span_at(max(start, end - 1))
+            x = typesetter.advances[end] - typesetter.advances[start]
+            runs.append((span, ellipsis, x))
+
+        if runs:
+            fonts = [span.font for span, _, _ in runs]
+        else:
+            # an empty line is as tall as the text around it
+            fonts = [span_at(start).font]
+
+        ascent = max(font.get_ascent() for font in fonts)
+        height = max(ascent - font.get_ascent() + font.get_height() for font in fonts)
+
+        # each run is rendered separately, so a run that reaches back past its first character's
+        # origin is moved left, the same as that part of the line in render_text
+        left = 0
+        right = 0
+
+        for run_i, (span, run_string, x) in enumerate(runs):
+            run_line = Line(run_string, span.font_metrics.metrics(run_string))
+            run_left = x + span.font_metrics.line_left(run_line)
+            left = min(left, run_left)
+            right = max(right, run_left + span.font_metrics.line_width(run_line))
+            runs[run_i] = (span, run_string, run_left)
+
+        runs = [(span, run_string, x - left) for span, run_string, x in runs]
+        span_lines.append(SpanLine(runs, right - left, ascent, height))
+
+    return span_lines
+
+def render_spans(spans, max_lines, max_width, ellipsis=u'…', align=0):
+    ''' Render a multiline paragraph made of Span objects with different fonts and colors to a
+    single pygame surface.
+
+    Arguments:
+      spans - a list of Span objects
+      max_lines - the maximum lines to use before truncating the text
+      max_width - the maximum width of each line
+      ellipsis - the string used to indicate more text wasn't displayed
+      align - horizontal alignment - 0=left, 0.5=center, 1=right
+    '''
+    import pygame
+
+    lines = layout_spans(spans, max_lines, max_width, ellipsis) if spans else []
+
+    width = max([line.width for line in lines] or [0])
+    height = sum(line.height for line in lines)
+
+    surface = pygame.Surface((width, height), pygame.SRCALPHA, 32)
+
+    y = 0
+    for line in lines:
+        line_x = (width - line.width) * align
+
+        for span, string, x in line.runs:
+            if not string:
+                continue
+
+            run_surface = span.font.render(string, span.antialias, span.color)
+            surface.blit(run_surface, (line_x + x, y + line.ascent - span.font.get_ascent()))
+
+        y += line.height
+
+    return surface
+
+class GlyphAtlas(object):
+    '''
+    Keeps each character drawn in a font and color, rendered once into a shared surface. Text can
+    then be laid out using FontMetrics and drawn with one blit per character, without rendering
+    anything with the font. This is much quicker for text that changes all the time, like clocks
+    and counters, which a cache of whole strings never helps.
+    '''
+    def __init__(self, font, antialias, color, font_metrics=None, width=512):
+        self.font = font
+        self.antialias = antialias
+        self.color = color
+        self.font_metrics = font_metrics or FontMetrics(font)
+        self.width = width
+        self.line_height = font.get_height()
+        self.surface = None
+        # maps each character to a tuple (rect, metrics)
+        self.glyphs = {}
+        self.next_position = (0, 0)
+
+    def glyph(self, char):
+        '''
+        Returns a tuple (rect, metrics) where rect is the area of the atlas surface containing
+        `char`, and metrics are as returned by Font.metrics.
+        '''
+        try:
+            return self.glyphs[char]
+        except KeyError:
+            pass
+
+        import pygame
+
+        rendered = self.font.render(char, self.antialias, self.color)
+        metrics = self.font_metrics.metrics(char)[0]
+
+        x, y = self.next_position
+
+        if x + rendered.get_width() > self.width:
+            # start a new row
+            x, y = 0, y + self.line_height
+
+        rect = pygame.Rect((x, y), rendered.get_size())
+        self._ensure_height(rect.bottom)
+        self.surface.blit(rendered, rect)
+
+        self.next_position = (rect.right, y)
+        self.glyphs[char] = (rect, metrics)
+        return rect, metrics
+
+    def _ensure_height(self, height):
+        import pygame
+
+        if self.surface is not None and self.surface.get_height() >= height:
+            return
+
+        new_height = max(height, self.line_height * 4)
+
+        if self.surface is not None:
+            new_height = max(new_height, self.surface.get_height() * 2)
+
+        surface = pygame.Surface((self.width, new_height), pygame.SRCALPHA, 32)
+        surface.fill((0, 0, 0, 0))
+
+        if self.surface is not None:
+            surface.blit(self.surface, (0, 0))
+
+        self.surface = surface
+
+    def draw(self, surface, lines, topleft, align=0):
+        '''
+        Draws `lines` (from FontMetrics.lines) to `surface`, with the top-left of the text at
+        `topleft`. `align` is the horizontal alignment - 0=left, 0.5=center, 1=right. Returns the
+        rect that was drawn to.
+        '''
+        import pygame
+
+        width, height = self.font_metrics.size(lines)
+        left, y = topleft
+
+        for line in lines:
+            x = left + int((width - self.font_metrics.line_width(line)) * align)
+
+            if line.string_metrics:
+                # like Font.render, the line starts at the left edge of the first character
+                x -= min(0, line.string_metrics[0][0])
+
+            for char in line.string:
+                rect, metrics = self.glyph(char)
+                # a rendered character starts at its left edge, which can be left of the pen
+                surface.blit(self.surface, (x + min(0, metrics[0]), y), rect)
+                x += metrics[4]
+
+            y += self.line_height
+
+        return pygame.Rect(topleft, (width, height)).clip(surface.get_rect())